@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import re
+import statistics
+import subprocess
+import sys
+
+import click
+
+IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+LAZY_MODULES = ("yt_dlp", "pywidevine", "mutagen", "Crypto", "httpx")
+
+
+def get_import_times(module: str) -> dict[str, tuple[int, int]]:
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match is None:
+            continue
+        import_times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return import_times
+
+
+@click.command()
+@click.option(
+    "--module",
+    default="spotify_web_downloader.cli",
+    help="Module to import.",
+)
+@click.option(
+    "--runs",
+    type=int,
+    default=5,
+    help="Number of cold imports to run.",
+)
+@click.option(
+    "--top",
+    type=int,
+    default=15,
+    help="Number of slowest modules to show.",
+)
+@click.option(
+    "--max-ms",
+    type=float,
+    default=None,
+    help="Fail if the median cumulative import time exceeds this value.",
+)
+def main(module: str, runs: int, top: int, max_ms: float):
+    runs_import_times = [get_import_times(module) for _ in range(runs)]
+    cumulative_times = [
+        import_times[module][1] / 1000 for import_times in runs_import_times
+    ]
+    median_cumulative_time = statistics.median(cumulative_times)
+    click.echo(
+        f"{module}: median {median_cumulative_time:.1f} ms, "
+        f"min {min(cumulative_times):.1f} ms, max {max(cumulative_times):.1f} ms "
+        f"over {runs} run(s)"
+    )
+    import_times = runs_import_times[-1]
+    click.echo("Slowest modules by self time (last run):")
+    for name, (self_time, cumulative_time) in sorted(
+        import_times.items(),
+        key=lambda item: item[1][0],
+        reverse=True,
+    )[:top]:
+        click.echo(
+            f"  {self_time / 1000:8.1f} ms self {cumulative_time / 1000:8.1f} ms cumulative  {name}"
+        )
+    eager_modules = [
+        lazy_module for lazy_module in LAZY_MODULES if lazy_module in import_times
+    ]
+    if eager_modules:
+        click.echo(
+            f"Lazily loaded modules imported eagerly: {', '.join(eager_modules)}"
+        )
+    if eager_modules or (max_ms is not None and median_cumulative_time > max_ms):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import contextlib
+import queue
+import typing
+
+from pywidevine import Cdm, Device
+
+
+class CdmPool:
+    def __init__(
+        self,
+        device: Device,
+        max_sessions: int = Cdm.MAX_NUM_OF_SESSIONS,
+    ):
+        self.device = device
+        self.max_sessions = max_sessions
+        self._set_slots()
+
+    def _set_slots(self):
+        self._slots = queue.Queue()
+        for slot_index in range(self.max_sessions):
+            if slot_index % Cdm.MAX_NUM_OF_SESSIONS == 0:
+                cdm = Cdm.from_device(self.device)
+            self._slots.put(cdm)
+
+    @contextlib.contextmanager
+    def session(self) -> typing.Generator[tuple[Cdm, bytes], None, None]:
+        cdm = self._slots.get()
+        try:
+            cdm_session = cdm.open()
+            try:
+                yield cdm, cdm_session
+            finally:
+                cdm.close(cdm_session)
+        finally:
+            self._slots.put(cdm)
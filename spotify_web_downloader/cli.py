@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import collections
+import importlib.util
 import inspect
+import itertools
 import json
 import logging
+import threading
 import time
+import typing
 from enum import Enum
 from pathlib import Path
 
@@ -11,11 +16,21 @@ import click
 
 from . import __version__
 from .constants import *
+from .cover_cache import CoverCache
 from .downloader import Downloader
 from .downloader_music_video import DownloaderMusicVideo
 from .downloader_song import DownloaderSong
-from .enums import DownloadModeSong, DownloadModeVideo, RemuxMode
-from .models import Lyrics
+from .enums import DownloadModeSong, DownloadModeVideo, JobState, RemuxMode
+from .job_journal import JobJournal
+from .key_store import KeyStore
+from .library_index import LibraryIndex
+from .metrics import Metrics
+from .models import Lyrics, TrackJob, UrlJob
+from .pipeline import Pipeline, PipelineStage
+from .playlist_sync import PlaylistSync
+from .playlist_writer import PlaylistWriter
+from .profiler import Profiler, Tracer
+from .response_cache import SqliteResponseCache
 from .spotify_api import SpotifyApi
 
 spotify_api_sig = inspect.signature(SpotifyApi.__init__)
@@ -77,9 +92,46 @@ def load_config_file(
     "--wait-interval",
     "-w",
     type=float,
-    default=10,
+    default=0,
     help="Wait interval between downloads in seconds.",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of tracks to download concurrently.",
+)
+@click.option(
+    "--metadata-jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of concurrent metadata workers (defaults to --jobs).",
+)
+@click.option(
+    "--key-jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of concurrent decryption key batch workers (defaults to --jobs).",
+)
+@click.option(
+    "--key-lookahead",
+    type=click.IntRange(min=1),
+    default=100,
+    help="Number of tracks whose decryption keys are acquired ahead of downloads.",
+)
+@click.option(
+    "--download-jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of concurrent download workers (defaults to --jobs).",
+)
+@click.option(
+    "--remux-jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of concurrent remux workers (defaults to --jobs).",
+)
 @click.option(
     "--download-music-video",
     is_flag=True,
@@ -113,6 +165,16 @@ def load_config_file(
     is_flag=True,
     help="Save a M3U8 playlist file when downloading a playlist.",
 )
+@click.option(
+    "--extended-playlist",
+    is_flag=True,
+    help="Write #EXTINF lines with durations and titles to M3U8 playlist files.",
+)
+@click.option(
+    "--stream-queue",
+    is_flag=True,
+    help="Start downloading before all the tracks of an album/playlist are fetched.",
+)
 @click.option(
     "--lrc-only",
     "-l",
@@ -141,6 +203,35 @@ def load_config_file(
     is_flag=True,
     help="Print exceptions.",
 )
+@click.option(
+    "--print-metrics",
+    is_flag=True,
+    help="Print per-stage timings and throughput at the end of the run.",
+)
+@click.option(
+    "--metrics-path",
+    type=Path,
+    default=None,
+    help="Path to a JSON lines file where per-stage timings are appended.",
+)
+@click.option(
+    "--metrics-prometheus-path",
+    type=Path,
+    default=None,
+    help="Path to a Prometheus textfile where per-stage timings are written.",
+)
+@click.option(
+    "--profile",
+    type=Path,
+    default=None,
+    help="Path where cProfile stats of the download loop are saved.",
+)
+@click.option(
+    "--trace-path",
+    type=Path,
+    default=None,
+    help="Path to a Chrome trace file with the duration of each method call.",
+)
 # API specific options
 @click.option(
     "--cookies-path",
@@ -149,6 +240,34 @@ def load_config_file(
     default=spotify_api_sig.parameters["cookies_path"].default,
     help="Path to .txt cookies file.",
 )
+@click.option(
+    "--requests-per-second",
+    type=click.FloatRange(min=0, min_open=True),
+    default=spotify_api_sig.parameters["requests_per_second"].default,
+    help="Maximum number of requests per second to Spotify's servers.",
+)
+@click.option(
+    "--cache-dir",
+    type=Path,
+    default=Path.home() / ".spotify-web-downloader" / "cache",
+    help="Path to the directory where API responses, covers and tokens are cached.",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Don't cache API responses, covers and tokens on disk.",
+)
+@click.option(
+    "--cover-cache-size",
+    type=click.FloatRange(min=0),
+    default=CoverCache.MAX_DISK_BYTES / 1024 / 1024,
+    help="Maximum size of the cover cache on disk in MiB.",
+)
+@click.option(
+    "--async-prefetch",
+    is_flag=True,
+    help="Prefetch track metadata concurrently over HTTP/2 (requires httpx).",
+)
 # Downloader specific options
 @click.option(
     "--output-path",
@@ -169,6 +288,56 @@ def load_config_file(
     default=downloader_sig.parameters["wvd_path"].default,
     help="Path to .wvd file.",
 )
+@click.option(
+    "--key-store-path",
+    type=Path,
+    default=Path.home() / ".spotify-web-downloader" / "keys.db",
+    help="Path to the decryption key store.",
+)
+@click.option(
+    "--key-store-expiry",
+    type=float,
+    default=None,
+    help="Number of days after which stored decryption keys expire.",
+)
+@click.option(
+    "--no-key-store",
+    is_flag=True,
+    help="Don't store decryption keys on disk.",
+)
+@click.option(
+    "--journal-path",
+    type=Path,
+    default=None,
+    help="Path to a job journal used to resume interrupted runs.",
+)
+@click.option(
+    "--library-index-path",
+    type=Path,
+    default=Path.home() / ".spotify-web-downloader" / "library.db",
+    help="Path to the index of downloaded tracks.",
+)
+@click.option(
+    "--no-library-index",
+    is_flag=True,
+    help="Don't use an index of downloaded tracks.",
+)
+@click.option(
+    "--rebuild-library-index",
+    is_flag=True,
+    help="Rebuild the index of downloaded tracks from the files in the output path.",
+)
+@click.option(
+    "--sync-playlists",
+    is_flag=True,
+    help="Only download tracks added to playlists since the last sync.",
+)
+@click.option(
+    "--playlist-sync-path",
+    type=Path,
+    default=Path.home() / ".spotify-web-downloader" / "playlists.db",
+    help="Path to the playlist sync state.",
+)
 @click.option(
     "--ffmpeg-path",
     type=str,
@@ -286,6 +455,30 @@ def load_config_file(
     default=downloader_music_video_sig.parameters["download_mode"].default,
     help="Download mode for videos.",
 )
+@click.option(
+    "--concurrent-download-video",
+    is_flag=True,
+    default=downloader_music_video_sig.parameters["concurrent_download"].default,
+    help="Download the video and audio streams of music videos concurrently.",
+)
+@click.option(
+    "--video-max-height",
+    type=int,
+    default=downloader_music_video_sig.parameters["video_max_height"].default,
+    help="Maximum height of the video stream in pixels.",
+)
+@click.option(
+    "--video-max-bitrate",
+    type=int,
+    default=downloader_music_video_sig.parameters["video_max_bitrate"].default,
+    help="Maximum combined video and audio bitrate in kbps.",
+)
+@click.option(
+    "--video-max-size",
+    type=int,
+    default=downloader_music_video_sig.parameters["video_max_size"].default,
+    help="Maximum estimated size of each music video in MB.",
+)
 # This option should always be last
 @click.option(
     "--no-config-file",
@@ -297,21 +490,48 @@ def load_config_file(
 def main(
     urls: list[str],
     wait_interval: float,
+    jobs: int,
+    metadata_jobs: int,
+    key_jobs: int,
+    key_lookahead: int,
+    download_jobs: int,
+    remux_jobs: int,
     download_music_video: bool,
     force_premium: bool,
     save_cover: bool,
     overwrite: bool,
     read_urls_as_txt: bool,
     save_playlist: bool,
+    extended_playlist: bool,
+    stream_queue: bool,
     lrc_only: bool,
     no_lrc: bool,
     config_path: Path,
     log_level: str,
     print_exceptions: bool,
+    print_metrics: bool,
+    metrics_path: Path,
+    metrics_prometheus_path: Path,
+    profile: Path,
+    trace_path: Path,
     cookies_path: Path,
+    requests_per_second: float,
+    cache_dir: Path,
+    no_cache: bool,
+    cover_cache_size: float,
+    async_prefetch: bool,
     output_path: Path,
     temp_path: Path,
     wvd_path: Path,
+    key_store_path: Path,
+    key_store_expiry: float,
+    no_key_store: bool,
+    journal_path: Path,
+    library_index_path: Path,
+    no_library_index: bool,
+    rebuild_library_index: bool,
+    sync_playlists: bool,
+    playlist_sync_path: Path,
     ffmpeg_path: str,
     mp4box_path: str,
     mp4decrypt_path: str,
@@ -331,6 +551,10 @@ def main(
     download_mode_song: DownloadModeSong,
     premium_quality: bool,
     download_mode_video: DownloadModeVideo,
+    concurrent_download_video: bool,
+    video_max_height: int,
+    video_max_bitrate: int,
+    video_max_size: int,
     no_config_file: bool,
 ) -> None:
     logging.basicConfig(
@@ -343,7 +567,22 @@ def main(
     if not cookies_path.exists():
         logger.critical(X_NOT_FOUND_STRING.format("Cookies file", cookies_path))
         return
-    spotify_api = SpotifyApi(cookies_path)
+    if async_prefetch and importlib.util.find_spec("httpx") is None:
+        logger.critical(
+            'httpx is not installed, install the "async" extra to use --async-prefetch'
+        )
+        return
+    response_cache = (
+        SqliteResponseCache(cache_dir / "responses.db") if not no_cache else None
+    )
+    metrics = Metrics(metrics_path)
+    spotify_api = SpotifyApi(
+        cookies_path,
+        requests_per_second,
+        response_cache,
+        cache_dir / "session.json" if not no_cache else None,
+        metrics,
+    )
     downloader = Downloader(
         spotify_api,
         output_path,
@@ -365,7 +604,38 @@ def main(
         date_tag_template,
         exclude_tags,
         truncate,
+        key_store=(
+            KeyStore(
+                key_store_path,
+                key_store_expiry * 24 * 60 * 60 if key_store_expiry else None,
+            )
+            if not no_key_store
+            else None
+        ),
+        cover_cache=CoverCache(
+            cache_dir / "covers" if not no_cache else None,
+            max_disk_bytes=int(cover_cache_size * 1024 * 1024),
+        ),
+    )
+    job_journal = JobJournal(journal_path) if journal_path else None
+    library_index = (
+        LibraryIndex(
+            library_index_path,
+            LibraryIndex.get_profile(
+                template_folder_album,
+                template_folder_compilation,
+                template_file_single_disc,
+                template_file_multi_disc,
+                template_folder_no_album,
+                template_file_no_album,
+                truncate,
+                premium_quality,
+            ),
+        )
+        if not no_library_index
+        else None
     )
+    playlist_sync = PlaylistSync(playlist_sync_path) if sync_playlists else None
     downloader_song = DownloaderSong(
         downloader,
         download_mode_song,
@@ -374,16 +644,34 @@ def main(
     downloader_music_video = DownloaderMusicVideo(
         downloader,
         download_mode_video,
+        concurrent_download_video,
+        video_max_height,
+        video_max_bitrate,
+        video_max_size,
     )
+    profiler = Profiler() if profile else None
+    tracer = Tracer() if trace_path else None
+    if tracer is not None:
+        for obj in (spotify_api, downloader, downloader_song, downloader_music_video):
+            tracer.instrument(obj)
     if not lrc_only:
         if wvd_path and not wvd_path.exists():
             logger.critical(X_NOT_FOUND_STRING.format(".wvd file", wvd_path))
             return
         logger.debug("Setting up CDM")
         downloader.set_cdm()
-        if not downloader.ffmpeg_path_full and remux_mode == RemuxMode.FFMPEG:
+        if (
+            not downloader.ffmpeg_path_full
+            and remux_mode == RemuxMode.FFMPEG
+            and download_mode_song != DownloadModeSong.STREAM
+        ):
             logger.critical(X_NOT_FOUND_STRING.format("FFmpeg", ffmpeg_path))
             return
+        if not downloader.ffmpeg_path_full and remux_mode != RemuxMode.MP4BOX:
+            logger.warning(
+                X_NOT_FOUND_STRING.format("FFmpeg", ffmpeg_path)
+                + ", music videos will fail to remux"
+            )
         if (
             download_mode_song == DownloadModeSong.ARIA2C
             and not downloader.aria2c_path_full
@@ -414,268 +702,786 @@ def main(
         if not spotify_api.config_info["isPremium"] and download_music_video:
             logger.critical("Cannot download music videos with a free account")
             return
+    if library_index is not None and rebuild_library_index:
+        logger.info(f'Rebuilding library index from "{output_path}"')
+        indexed_count = library_index.rebuild(output_path)
+        logger.info(f"Indexed {indexed_count} file(s)")
     error_count = 0
-    if read_urls_as_txt:
-        _urls = []
-        for url in urls:
-            if Path(url).exists():
-                _urls.extend(Path(url).read_text(encoding="utf-8").splitlines())
-        urls = _urls
-    for url_index, url in enumerate(urls, start=1):
-        url_progress = f"URL {url_index}/{len(urls)}"
-        logger.info(f'({url_progress}) Checking "{url}"')
-        try:
-            url_info = downloader.get_url_info(url)
-            download_queue = downloader.get_download_queue(url_info)
-        except Exception as e:
+    error_count_lock = threading.Lock()
+    playlist_file_lock = threading.Lock()
+    playlist_writers = {}
+    url_job_lock = threading.Lock()
+    track_locks = collections.defaultdict(threading.Lock)
+
+    def has_journal_state(job: TrackJob, state: JobState) -> bool:
+        return JobJournal.has_state(job.journal_state, state)
+
+    def save_journal_state(job: TrackJob, state: JobState) -> None:
+        if job_journal is None:
+            return
+        job.journal_state = state
+        job_journal.set(job.track_metadata["id"], state, job)
+
+    def has_missing_sidecars(
+        indexed_path: Path,
+        has_synced_lyrics: bool | None,
+    ) -> bool:
+        is_video = indexed_path.suffix == ".m4v"
+        if (
+            save_cover
+            and not (downloader_music_video if is_video else downloader_song)
+            .get_cover_path(indexed_path)
+            .exists()
+        ):
+            return True
+        if is_video or no_lrc or has_synced_lyrics is False:
+            return False
+        return (
+            has_synced_lyrics is None
+            or not downloader_song.get_lrc_path(indexed_path).exists()
+        )
+
+    def get_indexed_path(job: TrackJob) -> Path | None:
+        if library_index is None or overwrite or lrc_only or download_music_video:
+            return None
+        index_entry = library_index.get(
+            job.track_metadata["id"],
+            job.track_metadata.get("external_ids", {}).get("isrc"),
+            output_path,
+        )
+        if index_entry is None:
+            return None
+        indexed_path, has_synced_lyrics = index_entry
+        indexed_path = output_path / indexed_path.relative_to(output_path.absolute())
+        if has_missing_sidecars(indexed_path, has_synced_lyrics):
+            logger.debug(
+                f'Cover or synced lyrics missing for "{indexed_path}", '
+                "resolving track"
+            )
+            job.indexed_path = indexed_path
+            return None
+        return indexed_path
+
+    def get_final_path(job: TrackJob, file_extension: str) -> Path:
+        if job.indexed_path is not None:
+            return job.indexed_path
+        return downloader.get_final_path(job.tags, file_extension)
+
+    def add_to_library_index(job: TrackJob) -> None:
+        if library_index is None or not job.final_path.exists():
+            return
+        track_ids = {LibraryIndex.get_track_id_from_url(job.tags["url"])}
+        if not download_music_video:
+            track_ids.add(job.track_metadata["id"])
+        has_synced_lyrics = (
+            bool(job.lyrics.synced) if job.lyrics is not None and not no_lrc else None
+        )
+        for track_id in track_ids:
+            library_index.add(
+                track_id,
+                job.tags.get("isrc"),
+                job.final_path,
+                has_synced_lyrics,
+            )
+
+    def get_playlist_writer(playlist_file_path: Path) -> PlaylistWriter:
+        with playlist_file_lock:
+            if playlist_file_path not in playlist_writers:
+                playlist_writers[playlist_file_path] = PlaylistWriter(
+                    playlist_file_path,
+                    output_path,
+                    extended_playlist,
+                )
+            return playlist_writers[playlist_file_path]
+
+    def update_playlist_file(job: TrackJob) -> None:
+        playlist_file_path = downloader.get_playlist_file_path(job.tags)
+        with url_job_lock:
+            job.url_job.playlist_file_paths.add(playlist_file_path)
+        logger.debug(f'Updating M3U8 playlist "{playlist_file_path}"')
+        get_playlist_writer(playlist_file_path).set_entry(
+            job.index,
+            job.final_path,
+            job.track_metadata["duration_ms"] // 1000,
+            " - ".join(
+                (
+                    ", ".join(
+                        artist["name"] for artist in job.track_metadata["artists"]
+                    ),
+                    job.track_metadata["name"],
+                )
+            ),
+        )
+
+    def resolve_track(job: TrackJob) -> TrackJob | None:
+        track_id = job.track_metadata["id"]
+        track_locks[track_id].acquire()
+        logger.info(
+            f'({job.queue_progress}) Downloading "{job.track_metadata["name"]}"'
+        )
+        indexed_path = get_indexed_path(job)
+        if indexed_path is not None:
+            logger.warning(
+                f'({job.queue_progress}) Track already exists at "{indexed_path}", skipping'
+            )
+            if save_playlist and job.playlist_metadata:
+                job.tags = downloader.get_playlist_tags(
+                    job.playlist_metadata,
+                    job.index,
+                )
+                job.final_path = indexed_path
+                update_playlist_file(job)
+            return None
+        if job_journal is not None and not overwrite and not lrc_only:
+            job.journal_state = job_journal.restore(job)
+        if (
+            has_journal_state(job, JobState.TAGGED)
+            and not job.final_path.exists()
+            and not (job.remuxed_path and job.remuxed_path.exists())
+        ):
+            job.journal_state = None
+        if job.journal_state is not None:
+            if job.playlist_metadata:
+                job.tags = {
+                    **job.tags,
+                    **downloader.get_playlist_tags(
+                        job.playlist_metadata,
+                        job.index,
+                    ),
+                }
+            if has_journal_state(job, JobState.TAGGED) and not (
+                job.remuxed_path and job.remuxed_path.exists()
+            ):
+                logger.warning(
+                    f'({job.queue_progress}) Already downloaded to "{job.final_path}", skipping'
+                )
+                job.download = False
+            else:
+                logger.debug(f'Resuming from journal state "{job.journal_state.value}"')
+            return job
+        logger.debug("Getting GID metadata")
+        gid = spotify_api.track_id_to_gid(track_id)
+        job.metadata_gid = spotify_api.get_gid_metadata(gid)
+        if download_music_video and not job.metadata_gid.get("original_video"):
+            music_video_id = downloader_music_video.get_music_video_id_from_song_id(
+                track_id, job.track_metadata["artists"][0]["id"]
+            )
+            if not music_video_id:
+                logger.warning(
+                    f"({job.queue_progress}) No music video alternative found, skipping"
+                )
+                return None
+            job.metadata_gid = spotify_api.get_gid_metadata(
+                spotify_api.track_id_to_gid(music_video_id)
+            )
+            logger.warning(
+                f"({job.queue_progress}) Switching to download music video "
+                f"with title \"{job.metadata_gid['name']}\""
+            )
+        if not job.metadata_gid.get("original_video"):
+            if job.metadata_gid.get("has_lyrics"):
+                logger.debug("Getting lyrics")
+                job.lyrics = downloader_song.get_lyrics(track_id)
+            else:
+                job.lyrics = Lyrics()
+            logger.debug("Getting album metadata")
+            album_metadata = spotify_api.get_album(
+                spotify_api.gid_to_track_id(job.metadata_gid["album"]["gid"])
+            )
+            logger.debug("Getting track credits")
+            track_credits = spotify_api.get_track_credits(track_id)
+            job.tags = downloader_song.get_tags(
+                job.metadata_gid,
+                album_metadata,
+                track_credits,
+                job.lyrics.unsynced,
+            )
+            if job.playlist_metadata:
+                job.tags = {
+                    **job.tags,
+                    **downloader.get_playlist_tags(
+                        job.playlist_metadata,
+                        job.index,
+                    ),
+                }
+            job.final_path = get_final_path(job, ".m4a")
+            job.lrc_path = downloader_song.get_lrc_path(job.final_path)
+            job.cover_path = downloader_song.get_cover_path(job.final_path)
+            job.cover_url = downloader.get_cover_url(job.metadata_gid, "LARGE")
+            if lrc_only:
+                pass
+            elif job.final_path.exists() and not overwrite:
+                logger.warning(
+                    f'({job.queue_progress}) Track already exists at "{job.final_path}", skipping'
+                )
+            else:
+                logger.debug("Getting file info")
+                job.file_id = downloader_song.get_file_id(job.metadata_gid)
+                if not job.file_id:
+                    logger.error(
+                        f"({job.queue_progress}) Track not available on Spotify's "
+                        "servers and no alternative found, skipping"
+                    )
+                    return None
+                job.download = True
+        elif not spotify_api.config_info["isPremium"]:
+            logger.error(
+                f"({job.queue_progress}) Cannot download music videos with a free account, skipping"
+            )
+            return None
+        elif lrc_only:
+            logger.warn(
+                f"({job.queue_progress}) Music videos are not downloadable with "
+                "current settings, skipping"
+            )
+            return None
+        else:
+            job.cover_url = downloader.get_cover_url(job.metadata_gid, "XXLARGE")
+            logger.debug("Getting album metadata")
+            album_metadata = spotify_api.get_album(
+                spotify_api.gid_to_track_id(job.metadata_gid["album"]["gid"])
+            )
+            logger.debug("Getting track credits")
+            track_credits = spotify_api.get_track_credits(track_id)
+            job.tags = downloader_music_video.get_tags(
+                job.metadata_gid,
+                album_metadata,
+                track_credits,
+            )
+            if job.playlist_metadata:
+                job.tags = {
+                    **job.tags,
+                    **downloader.get_playlist_tags(
+                        job.playlist_metadata,
+                        job.index,
+                    ),
+                }
+            job.final_path = get_final_path(job, ".m4v")
+            job.cover_path = downloader_music_video.get_cover_path(job.final_path)
+            if job.final_path.exists() and not overwrite:
+                logger.warning(
+                    f'({job.queue_progress}) Music video already exists at "{job.final_path}", skipping'
+                )
+            else:
+                job.download = True
+        if job.download:
+            save_journal_state(job, JobState.RESOLVED)
+        return job
+
+    def acquire_key(job: TrackJob) -> TrackJob:
+        if not job.download or has_journal_state(job, JobState.KEYED):
+            return job
+        if not job.metadata_gid.get("original_video"):
+            if job.decryption_key is None:
+                logger.debug("Getting decryption key")
+                job.decryption_key = downloader_song.get_decryption_key_from_file_id(
+                    job.file_id
+                )
+        else:
+            logger.debug("Getting video manifest")
+            manifest = downloader_music_video.get_manifest(job.metadata_gid)
+            job.stream_info = downloader_music_video.get_video_stream_info(manifest)
+            estimated_size = downloader_music_video.get_estimated_size(job.stream_info)
+            logger.info(
+                f"({job.queue_progress}) Selected video profile "
+                f"{job.stream_info.profile_id_video} at "
+                f"{(job.stream_info.bitrate_video + job.stream_info.bitrate_audio) // 1000} kbps, "
+                f"estimated size {estimated_size / 1024 / 1024:.1f} MB"
+            )
+            logger.debug("Getting decryption key")
+            job.decryption_key = downloader_music_video.get_decryption_key(
+                job.stream_info.pssh
+            )
+        save_journal_state(job, JobState.KEYED)
+        return job
+
+    def acquire_keys(jobs: list[TrackJob]) -> list[TrackJob | Exception]:
+        song_jobs = [
+            job
+            for job in jobs
+            if job.download
+            and not has_journal_state(job, JobState.KEYED)
+            and not job.metadata_gid.get("original_video")
+            and job.decryption_key is None
+        ]
+        key_errors = {}
+        if song_jobs:
+            logger.debug(f"Getting {len(song_jobs)} decryption key(s)")
+            for job, decryption_key in zip(
+                song_jobs,
+                downloader_song.get_decryption_keys_from_file_ids(
+                    [job.file_id for job in song_jobs],
+                    return_exceptions=True,
+                ),
+            ):
+                if isinstance(decryption_key, Exception):
+                    key_errors[id(job)] = decryption_key
+                else:
+                    job.decryption_key = decryption_key
+        results = []
+        for job in jobs:
+            if id(job) in key_errors:
+                results.append(key_errors[id(job)])
+                continue
+            try:
+                results.append(acquire_key(job))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def get_downloaded_paths(job: TrackJob) -> list[Path]:
+        track_id = job.track_metadata["id"]
+        if job.metadata_gid.get("original_video"):
+            return [
+                downloader.get_encrypted_path(track_id, "_video.ts"),
+                downloader.get_encrypted_path(track_id, "_audio.ts"),
+            ]
+        if download_mode_song == DownloadModeSong.STREAM:
+            return [job.final_path]
+        return [downloader.get_encrypted_path(track_id, ".m4a")]
+
+    def get_paths_size(paths: list[Path]) -> int:
+        return sum(path.stat().st_size for path in paths if path.exists())
+
+    def fetch_media(job: TrackJob) -> TrackJob:
+        if not job.download:
+            return job
+        if has_journal_state(job, JobState.DOWNLOADED) and all(
+            path.exists() for path in get_downloaded_paths(job)
+        ):
+            logger.debug("Already downloaded, skipping")
+            return job
+        with metrics.measure("download") as metric_record:
+            download_media(job)
+            metric_record.bytes = get_paths_size(get_downloaded_paths(job))
+        save_journal_state(job, JobState.DOWNLOADED)
+        return job
+
+    def download_media(job: TrackJob) -> None:
+        track_id = job.track_metadata["id"]
+        if not job.metadata_gid.get("original_video"):
+            logger.debug("Getting stream URL")
+            stream_url = spotify_api.get_stream_url(job.file_id)
+            if download_mode_song == DownloadModeSong.STREAM:
+                logger.debug(f'Downloading and decrypting to "{job.final_path}"')
+                downloader_song.download_stream(
+                    job.decryption_key,
+                    stream_url,
+                    job.final_path,
+                    job.tags,
+                    job.cover_url,
+                )
+                return
+            encrypted_path = downloader.get_encrypted_path(track_id, ".m4a")
+            logger.debug(f'Downloading to "{encrypted_path}"')
+            downloader_song.download(encrypted_path, stream_url)
+        elif download_mode_video == DownloadModeVideo.NATIVE:
+            encrypted_path_video = downloader.get_encrypted_path(track_id, "_video.ts")
+            encrypted_path_audio = downloader.get_encrypted_path(track_id, "_audio.ts")
+            logger.debug(
+                f'Downloading video/audio to "{encrypted_path_video}"/"{encrypted_path_audio}"'
+            )
+            downloader_music_video.download_native(
+                job.stream_info,
+                encrypted_path_video,
+                encrypted_path_audio,
+            )
+        else:
+            m3u8 = downloader_music_video.get_m3u8(
+                job.stream_info.base_url,
+                job.stream_info.initialization_template_url,
+                job.stream_info.segment_template_url,
+                job.stream_info.end_time_millis,
+                job.stream_info.segment_length,
+                job.stream_info.profile_id_video,
+                job.stream_info.profile_id_audio,
+                job.stream_info.file_type_video,
+                job.stream_info.file_type_audio,
+            )
+            m3u8_path_video = downloader_music_video.get_m3u8_path(track_id, "video")
+            encrypted_path_video = downloader.get_encrypted_path(track_id, "_video.ts")
+            downloader_music_video.save_m3u8(m3u8.video, m3u8_path_video)
+            m3u8_path_audio = downloader_music_video.get_m3u8_path(track_id, "audio")
+            encrypted_path_audio = downloader.get_encrypted_path(track_id, "_audio.ts")
+            downloader_music_video.save_m3u8(m3u8.audio, m3u8_path_audio)
+            logger.debug(
+                f'Downloading video/audio to "{encrypted_path_video}"/"{encrypted_path_audio}"'
+            )
+            downloader_music_video.download_video_audio(
+                m3u8_path_video,
+                encrypted_path_video,
+                m3u8_path_audio,
+                encrypted_path_audio,
+            )
+
+    def finalize_track(job: TrackJob) -> TrackJob:
+        track_id = job.track_metadata["id"]
+        is_video = bool(job.metadata_gid.get("original_video"))
+        if (
+            has_journal_state(job, JobState.REMUXED)
+            and job.remuxed_path is not None
+            and job.remuxed_path.exists()
+        ):
+            logger.debug(f'Already remuxed to "{job.remuxed_path}", skipping')
+        elif (
+            job.download
+            and not is_video
+            and download_mode_song != DownloadModeSong.STREAM
+        ):
+            encrypted_path = downloader.get_encrypted_path(track_id, ".m4a")
+            decrypted_path = downloader.get_decrypted_path(track_id, ".m4a")
+            job.remuxed_path = downloader.get_remuxed_path(track_id, ".m4a")
+            logger.debug(
+                f'Decrypting/Remuxing to "{decrypted_path}"/"{job.remuxed_path}"'
+            )
+            with metrics.measure("remux") as metric_record:
+                downloader_song.remux(
+                    encrypted_path,
+                    decrypted_path,
+                    job.remuxed_path,
+                    job.decryption_key,
+                    job.tags,
+                    job.cover_url,
+                )
+                metric_record.bytes = get_paths_size([job.remuxed_path])
+            save_journal_state(job, JobState.REMUXED)
+        elif job.download and is_video:
+            encrypted_path_video = downloader.get_encrypted_path(track_id, "_video.ts")
+            decrypted_path_video = downloader.get_decrypted_path(track_id, "_video.ts")
+            encrypted_path_audio = downloader.get_encrypted_path(track_id, "_audio.ts")
+            decrypted_path_audio = downloader.get_decrypted_path(track_id, "_audio.ts")
+            job.remuxed_path = downloader.get_remuxed_path(track_id, ".m4v")
+            logger.debug(
+                f'Decrypting video/audio to "{decrypted_path_video}"/"{decrypted_path_audio}" '
+                f'and remuxing to "{job.remuxed_path}"'
+            )
+            with metrics.measure("remux") as metric_record:
+                downloader_music_video.remux(
+                    job.decryption_key,
+                    encrypted_path_video,
+                    encrypted_path_audio,
+                    decrypted_path_video,
+                    decrypted_path_audio,
+                    job.remuxed_path,
+                )
+                metric_record.bytes = get_paths_size([job.remuxed_path])
+            save_journal_state(job, JobState.REMUXED)
+        if is_video or no_lrc or not job.lyrics.synced:
+            pass
+        elif job.lrc_path.exists() and not overwrite:
+            logger.debug(f'Synced lyrics already exists at "{job.lrc_path}", skipping')
+        else:
+            logger.debug(f'Saving synced lyrics to "{job.lrc_path}"')
+            downloader_song.save_lrc(job.lrc_path, job.lyrics.synced)
+        if (not is_video and lrc_only) or not save_cover:
+            pass
+        elif job.cover_path.exists() and not overwrite:
+            logger.debug(f'Cover already exists at "{job.cover_path}", skipping')
+        elif job.cover_url is not None:
+            logger.debug(f'Saving cover to "{job.cover_path}"')
+            with metrics.measure("cover") as metric_record:
+                downloader.save_cover(job.cover_path, job.cover_url)
+                metric_record.bytes = get_paths_size([job.cover_path])
+        if job.download and job.remuxed_path:
+            if not has_journal_state(job, JobState.TAGGED):
+                if is_video or remux_mode != RemuxMode.NATIVE:
+                    logger.debug("Applying tags")
+                    with metrics.measure("tag") as metric_record:
+                        downloader.apply_tags(
+                            job.remuxed_path,
+                            job.tags,
+                            job.cover_url,
+                        )
+                        metric_record.bytes = get_paths_size([job.remuxed_path])
+                save_journal_state(job, JobState.TAGGED)
+            logger.debug(f'Moving to "{job.final_path}"')
+            with metrics.measure("move") as metric_record:
+                downloader.move_to_final_path(job.remuxed_path, job.final_path)
+                metric_record.bytes = get_paths_size([job.final_path])
+        if not lrc_only and save_playlist and job.playlist_metadata:
+            update_playlist_file(job)
+        if not lrc_only:
+            add_to_library_index(job)
+            save_journal_state(job, JobState.DONE)
+        return job
+
+    def add_error(url_job: UrlJob = None) -> None:
+        nonlocal error_count
+        with error_count_lock:
             error_count += 1
+            if url_job is not None:
+                url_job.error_count += 1
+
+    def finish_url_job(url_job: UrlJob) -> None:
+        try:
+            for playlist_file_path in url_job.playlist_file_paths:
+                logger.debug(f'Writing M3U8 playlist to "{playlist_file_path}"')
+                playlist_writers[playlist_file_path].flush()
+            if url_job.track_ids is not None and url_job.error_count == 0:
+                playlist_sync.set(
+                    url_job.url_info.id,
+                    url_job.download_queue.playlist_metadata["snapshot_id"],
+                    url_job.track_ids,
+                )
+        except Exception:
+            add_error(url_job)
             logger.error(
-                f'({url_progress}) Failed to check "{url}"',
+                f'(URL {url_job.index}/{len(urls)}) Failed to save playlist for "{url_job.url}"',
                 exc_info=print_exceptions,
             )
-            continue
-        tracks_metadata = download_queue.tracks_metadata
-        playlist_metadata = download_queue.playlist_metadata
-        for index, track_metadata in enumerate(tracks_metadata, start=1):
-            queue_progress = (
-                f"Track {index}/{len(tracks_metadata)} from URL {url_index}/{len(urls)}"
+
+    def update_url_job(
+        url_job: UrlJob,
+        jobs_pending_change: int = 0,
+        is_queued: bool = False,
+    ) -> None:
+        with url_job_lock:
+            url_job.jobs_pending += jobs_pending_change
+            url_job.is_queued = url_job.is_queued or is_queued
+            is_finished = url_job.is_queued and url_job.jobs_pending == 0
+        if is_finished:
+            finish_url_job(url_job)
+
+    def on_track_error(job: TrackJob, exception: Exception) -> None:
+        add_error(job.url_job)
+        logger.error(
+            f'({job.queue_progress}) Failed to download "{job.track_metadata["name"]}"',
+            exc_info=exception if print_exceptions else False,
+        )
+
+    def on_track_finish(job: TrackJob) -> None:
+        track_id = job.track_metadata["id"]
+        if (
+            job.journal_state is not None
+            and job.journal_state != JobState.DONE
+            and downloader.get_temp_path(track_id).exists()
+        ):
+            logger.debug(
+                f'Keeping "{downloader.get_temp_path(track_id)}" to resume from journal'
+            )
+        elif track_id and downloader.get_temp_path(track_id).exists():
+            logger.debug(f'Cleaning up "{downloader.get_temp_path(track_id)}"')
+            downloader.cleanup_temp_path(track_id)
+        track_locks[track_id].release()
+        update_url_job(job.url_job, -1)
+
+    def get_prefetched_tracks(
+        tracks: typing.Iterator[tuple[int, dict]],
+    ) -> typing.Generator[tuple[int, dict], None, None]:
+        while True:
+            tracks_batch = list(
+                itertools.islice(tracks, SpotifyApi.GID_METADATA_PREFETCH_BATCH_SIZE)
             )
+            if not tracks_batch:
+                return
+            logger.debug(f"Prefetching GID metadata for {len(tracks_batch)} track(s)")
             try:
-                logger.info(
-                    f'({queue_progress}) Downloading "{track_metadata["name"]}"'
+                spotify_api.prefetch_gid_metadata(
+                    [
+                        spotify_api.track_id_to_gid(track_metadata["id"])
+                        for _, track_metadata in tracks_batch
+                        if track_metadata.get("id")
+                    ]
                 )
-                remuxed_path = None
-                track_id = track_metadata["id"]
-                logger.debug("Getting GID metadata")
-                gid = spotify_api.track_id_to_gid(track_id)
-                metadata_gid = spotify_api.get_gid_metadata(gid)
-                if download_music_video and not metadata_gid.get("original_video"):
-                    music_video_id = (
-                        downloader_music_video.get_music_video_id_from_song_id(
-                            track_id, track_metadata["artists"][0]["id"]
-                        )
-                    )
-                    if not music_video_id:
-                        logger.warning(
-                            f"({queue_progress}) No music video alternative found, skipping"
+            except Exception:
+                logger.warning(
+                    "Failed to prefetch GID metadata",
+                    exc_info=print_exceptions,
+                )
+            yield from tracks_batch
+
+    def get_track_jobs(
+        url_job: UrlJob,
+        urls_total: int,
+        track_indices: set[int] = None,
+    ) -> typing.Generator[TrackJob, None, None]:
+        download_queue = url_job.download_queue
+        tracks_total = download_queue.tracks_total
+        tracks = (
+            (index, track_metadata)
+            for index, track_metadata in enumerate(
+                download_queue.tracks_metadata, start=1
+            )
+            if track_indices is None or index in track_indices
+        )
+        if async_prefetch:
+            tracks = get_prefetched_tracks(tracks)
+        is_first_track = True
+        for index, track_metadata in tracks:
+            if wait_interval > 0 and not is_first_track:
+                logger.debug(f"Waiting for {wait_interval} second(s) before continuing")
+                time.sleep(wait_interval)
+            is_first_track = False
+            yield TrackJob(
+                index=index,
+                tracks_total=tracks_total,
+                track_metadata=track_metadata,
+                playlist_metadata=download_queue.playlist_metadata,
+                queue_progress=(
+                    f"Track {index}/{tracks_total} from URL {url_job.index}/{urls_total}"
+                ),
+                url_job=url_job,
+            )
+
+    def get_playlist_sync_track_indices(
+        url_job: UrlJob,
+        snapshot_id_old: str,
+        track_ids_old: list[str],
+    ) -> set[int] | None:
+        download_queue = url_job.download_queue
+        track_ids = url_job.track_ids
+        playlist_writer = None
+        if save_playlist:
+            playlist_file_path = downloader.get_playlist_file_path(
+                downloader.get_playlist_tags(download_queue.playlist_metadata, 1)
+            )
+            if not playlist_file_path.exists():
+                return None
+            logger.debug(f'Reordering M3U8 playlist "{playlist_file_path}"')
+            playlist_writer = get_playlist_writer(playlist_file_path)
+            playlist_writer.reorder(track_ids_old, track_ids)
+            playlist_writer.flush()
+            playlist_sync.set(
+                download_queue.playlist_metadata["id"],
+                snapshot_id_old,
+                track_ids,
+            )
+        track_ids_old = set(track_ids_old)
+        return {
+            index
+            for index, track_id in enumerate(track_ids, start=1)
+            if track_id not in track_ids_old
+            or (playlist_writer is not None and not playlist_writer.has_entry(index))
+        }
+
+    def get_url_track_jobs(
+        urls: list[str],
+    ) -> typing.Generator[TrackJob, None, None]:
+        for url_index, url in enumerate(urls, start=1):
+            url_progress = f"URL {url_index}/{len(urls)}"
+            logger.info(f'({url_progress}) Checking "{url}"')
+            url_job = UrlJob(index=url_index, url=url)
+            playlist_sync_entry = None
+            try:
+                url_job.url_info = url_infos.get(url) or downloader.get_url_info(url)
+                is_playlist_sync = (
+                    playlist_sync is not None and url_job.url_info.type == "playlist"
+                )
+                if is_playlist_sync:
+                    playlist_sync_entry = playlist_sync.get(url_job.url_info.id)
+                    if playlist_sync_entry is not None and (
+                        playlist_sync_entry[0]
+                        == spotify_api.get_playlist_snapshot_id(url_job.url_info.id)
+                    ):
+                        logger.info(
+                            f"({url_progress}) Playlist unchanged since last sync, skipping"
                         )
                         continue
-                    metadata_gid = spotify_api.get_gid_metadata(
-                        spotify_api.track_id_to_gid(music_video_id)
-                    )
-                    logger.warning(
-                        f"({queue_progress}) Switching to download music video "
-                        f"with title \"{metadata_gid['name']}\""
-                    )
-                if not metadata_gid.get("original_video"):
-                    if metadata_gid.get("has_lyrics"):
-                        logger.debug("Getting lyrics")
-                        lyrics = downloader_song.get_lyrics(track_id)
-                    else:
-                        lyrics = Lyrics()
-                    logger.debug("Getting album metadata")
-                    album_metadata = spotify_api.get_album(
-                        spotify_api.gid_to_track_id(metadata_gid["album"]["gid"])
-                    )
-                    logger.debug("Getting track credits")
-                    track_credits = spotify_api.get_track_credits(track_id)
-                    tags = downloader_song.get_tags(
-                        metadata_gid,
-                        album_metadata,
-                        track_credits,
-                        lyrics.unsynced,
-                    )
-                    if playlist_metadata:
-                        tags = {
-                            **tags,
-                            **downloader.get_playlist_tags(
-                                playlist_metadata,
-                                index,
-                            ),
-                        }
-                    final_path = downloader.get_final_path(tags, ".m4a")
-                    lrc_path = downloader_song.get_lrc_path(final_path)
-                    cover_path = downloader_song.get_cover_path(final_path)
-                    cover_url = downloader.get_cover_url(metadata_gid, "LARGE")
-                    if lrc_only:
-                        pass
-                    elif final_path.exists() and not overwrite:
-                        logger.warning(
-                            f'({queue_progress}) Track already exists at "{final_path}", skipping'
-                        )
-                    else:
-                        logger.debug("Getting file info")
-                        file_id = downloader_song.get_file_id(metadata_gid)
-                        if not file_id:
-                            logger.error(
-                                f"({queue_progress}) Track not available on Spotify's "
-                                "servers and no alternative found, skipping"
-                            )
-                            continue
-                        logger.debug("Getting PSSH")
-                        pssh = spotify_api.get_pssh(file_id)
-                        logger.debug("Getting decryption key")
-                        decryption_key = downloader_song.get_decryption_key(pssh)
-                        logger.debug("Getting stream URL")
-                        stream_url = spotify_api.get_stream_url(file_id)
-                        encrypted_path = downloader.get_encrypted_path(track_id, ".m4a")
-                        decrypted_path = downloader.get_decrypted_path(track_id, ".m4a")
-                        logger.debug(f'Downloading to "{encrypted_path}"')
-                        downloader_song.download(encrypted_path, stream_url)
-                        remuxed_path = downloader.get_remuxed_path(track_id, ".m4a")
-                        logger.debug(
-                            f'Decrypting/Remuxing to "{decrypted_path}"/"{remuxed_path}"'
-                        )
-                        downloader_song.remux(
-                            encrypted_path,
-                            decrypted_path,
-                            remuxed_path,
-                            decryption_key,
-                        )
-                    if no_lrc or not lyrics.synced:
-                        pass
-                    elif lrc_path.exists() and not overwrite:
-                        logger.debug(
-                            f'Synced lyrics already exists at "{lrc_path}", skipping'
-                        )
-                    else:
-                        logger.debug(f'Saving synced lyrics to "{lrc_path}"')
-                        downloader_song.save_lrc(lrc_path, lyrics.synced)
-                elif not spotify_api.config_info["isPremium"]:
-                    logger.error(
-                        f"({queue_progress}) Cannot download music videos with a free account, skipping"
-                    )
-                elif lrc_only:
-                    logger.warn(
-                        f"({queue_progress}) Music videos are not downloadable with "
-                        "current settings, skipping"
-                    )
-                else:
-                    cover_url = downloader.get_cover_url(metadata_gid, "XXLARGE")
-                    logger.debug("Getting album metadata")
-                    album_metadata = spotify_api.get_album(
-                        spotify_api.gid_to_track_id(metadata_gid["album"]["gid"])
-                    )
-                    logger.debug("Getting track credits")
-                    track_credits = spotify_api.get_track_credits(track_id)
-                    tags = downloader_music_video.get_tags(
-                        metadata_gid,
-                        album_metadata,
-                        track_credits,
-                    )
-                    if playlist_metadata:
-                        tags = {
-                            **tags,
-                            **downloader.get_playlist_tags(
-                                playlist_metadata,
-                                index,
-                            ),
-                        }
-                    final_path = downloader.get_final_path(tags, ".m4v")
-                    cover_path = downloader_music_video.get_cover_path(final_path)
-                    if final_path.exists() and not overwrite:
-                        logger.warning(
-                            f'({queue_progress}) Music video already exists at "{final_path}", skipping'
-                        )
-                    else:
-                        logger.debug("Getting video manifest")
-                        manifest = downloader_music_video.get_manifest(metadata_gid)
-                        stream_info = downloader_music_video.get_video_stream_info(
-                            manifest
-                        )
-                        logger.debug("Getting decryption key")
-                        decryption_key = downloader_music_video.get_decryption_key(
-                            stream_info.pssh
-                        )
-                        m3u8 = downloader_music_video.get_m3u8(
-                            stream_info.base_url,
-                            stream_info.initialization_template_url,
-                            stream_info.segment_template_url,
-                            stream_info.end_time_millis,
-                            stream_info.segment_length,
-                            stream_info.profile_id_video,
-                            stream_info.profile_id_audio,
-                            stream_info.file_type_video,
-                            stream_info.file_type_audio,
-                        )
-                        m3u8_path_video = downloader_music_video.get_m3u8_path(
-                            track_id, "video"
-                        )
-                        encrypted_path_video = downloader.get_encrypted_path(
-                            track_id, "_video.ts"
-                        )
-                        decrypted_path_video = downloader.get_decrypted_path(
-                            track_id, "_video.ts"
-                        )
-                        logger.debug(f'Downloading video to "{encrypted_path_video}"')
-                        downloader_music_video.save_m3u8(m3u8.video, m3u8_path_video)
-                        downloader_music_video.download(
-                            m3u8_path_video,
-                            encrypted_path_video,
-                        )
-                        m3u8_path_audio = downloader_music_video.get_m3u8_path(
-                            track_id, "audio"
-                        )
-                        encrypted_path_audio = downloader.get_encrypted_path(
-                            track_id, "_audio.ts"
-                        )
-                        decrypted_path_audio = downloader.get_decrypted_path(
-                            track_id, "_audio.ts"
-                        )
-                        logger.debug(f"Downloading audio to {encrypted_path_audio}")
-                        downloader_music_video.save_m3u8(m3u8.audio, m3u8_path_audio)
-                        downloader_music_video.download(
-                            m3u8_path_audio,
-                            encrypted_path_audio,
-                        )
-                        remuxed_path = downloader.get_remuxed_path(track_id, ".m4v")
-                        logger.debug(
-                            f'Decrypting video/audio to "{decrypted_path_video}"/"{decrypted_path_audio}" '
-                            f'and remuxing to "{remuxed_path}"'
-                        )
-                        downloader_music_video.remux(
-                            decryption_key,
-                            encrypted_path_video,
-                            encrypted_path_audio,
-                            decrypted_path_video,
-                            decrypted_path_audio,
-                            remuxed_path,
+                url_job.download_queue = downloader.get_download_queue(
+                    url_job.url_info,
+                    stream_queue and not is_playlist_sync,
+                    prefetched_metadata.get(
+                        (url_job.url_info.type, url_job.url_info.id)
+                    ),
+                )
+                track_indices = None
+                if is_playlist_sync:
+                    url_job.track_ids = [
+                        track_metadata["id"]
+                        for track_metadata in url_job.download_queue.tracks_metadata
+                    ]
+                    if playlist_sync_entry is not None:
+                        track_indices = get_playlist_sync_track_indices(
+                            url_job,
+                            *playlist_sync_entry,
                         )
-                if (
-                    not metadata_gid.get("original_video") and lrc_only
-                ) or not save_cover:
-                    pass
-                elif cover_path.exists() and not overwrite:
-                    logger.debug(f'Cover already exists at "{cover_path}", skipping')
-                elif cover_url is not None:
-                    logger.debug(f'Saving cover to "{cover_path}"')
-                    downloader.save_cover(cover_path, cover_url)
-                if remuxed_path:
-                    logger.debug("Applying tags")
-                    downloader.apply_tags(remuxed_path, tags, cover_url)
-                    logger.debug(f'Moving to "{final_path}"')
-                    downloader.move_to_final_path(remuxed_path, final_path)
-                if not lrc_only and save_playlist and playlist_metadata:
-                    playlist_file_path = downloader.get_playlist_file_path(tags)
-                    logger.debug(f'Updating M3U8 playlist from "{playlist_file_path}"')
-                    downloader.update_playlist_file(
-                        playlist_file_path,
-                        final_path,
-                        index,
-                    )
-            except Exception as e:
-                error_count += 1
+            except Exception:
+                add_error()
                 logger.error(
-                    f'({queue_progress}) Failed to download "{track_metadata["name"]}"',
+                    f'({url_progress}) Failed to check "{url}"',
                     exc_info=print_exceptions,
                 )
-            finally:
-                if temp_path.exists():
-                    logger.debug(f'Cleaning up "{temp_path}"')
-                    downloader.cleanup_temp_path()
-                if wait_interval > 0 and index != len(tracks_metadata):
-                    logger.debug(
-                        f"Waiting for {wait_interval} second(s) before continuing"
-                    )
-                    time.sleep(wait_interval)
+                continue
+            if track_indices is not None:
+                logger.info(
+                    f"({url_progress}) Syncing {len(track_indices)} new track(s) from playlist"
+                )
+            try:
+                for job in get_track_jobs(url_job, len(urls), track_indices):
+                    update_url_job(url_job, 1)
+                    yield job
+            except Exception:
+                add_error(url_job)
+                logger.error(
+                    f'({url_progress}) Failed to get tracks from "{url}"',
+                    exc_info=print_exceptions,
+                )
+            update_url_job(url_job, is_queued=True)
+
+    pipeline = Pipeline(
+        [
+            PipelineStage(resolve_track, metadata_jobs or jobs),
+            PipelineStage(
+                acquire_keys,
+                key_jobs or jobs,
+                batch_size=downloader.cdm_pool.max_sessions if not lrc_only else 1,
+            ),
+            PipelineStage(fetch_media, download_jobs or jobs, key_lookahead),
+            PipelineStage(finalize_track, remux_jobs or jobs),
+        ],
+        on_error=on_track_error,
+        on_finish=on_track_finish,
+    )
+    if profiler is not None:
+        for stage in pipeline.stages:
+            stage.func = profiler.wrap(stage.func)
+    if read_urls_as_txt:
+        _urls = []
+        for url in urls:
+            if Path(url).exists():
+                _urls.extend(Path(url).read_text(encoding="utf-8").splitlines())
+        urls = _urls
+    url_infos = {}
+    for url in urls:
+        try:
+            url_infos[url] = downloader.get_url_info(url)
+        except Exception:
+            pass
+    try:
+        logger.debug("Prefetching track/album metadata")
+        prefetched_metadata = downloader.get_prefetched_metadata(
+            list(url_infos.values()),
+            stream_queue,
+        )
+    except Exception:
+        prefetched_metadata = {}
+        logger.warning(
+            "Failed to prefetch track/album metadata, falling back to one "
+            "request per URL",
+            exc_info=print_exceptions,
+        )
+    if profiler is not None:
+        profiler.enable()
+    pipeline.run(get_url_track_jobs(urls))
+    if profiler is not None:
+        profiler.disable()
+        logger.debug(f'Saving profile to "{profile}"')
+        profiler.dump(profile)
+        for line in profiler.get_stats_lines():
+            logger.debug(line)
+    if tracer is not None:
+        logger.debug(f'Writing trace to "{trace_path}"')
+        tracer.write(trace_path)
+    if temp_path.exists() and job_journal is None:
+        logger.debug(f'Cleaning up "{temp_path}"')
+        downloader.cleanup_temp_path()
+    elif temp_path.exists() and not any(temp_path.iterdir()):
+        temp_path.rmdir()
+    metrics.close()
+    if metrics_prometheus_path:
+        logger.debug(f'Writing metrics to "{metrics_prometheus_path}"')
+        metrics.write_prometheus(metrics_prometheus_path)
+    if print_metrics:
+        for line in metrics.get_summary_lines():
+            logger.info(line)
     logger.info(f"Done ({error_count} error(s))")
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import collections
+import errno
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from .utils import check_response
+
+
+class CoverCache:
+    MAX_MEMORY_BYTES = 64 * 1024 * 1024
+    MAX_DISK_BYTES = 512 * 1024 * 1024
+    TIMEOUT = 30
+    LINK_UNSUPPORTED_ERRNOS = (
+        errno.EXDEV,
+        errno.EPERM,
+        errno.EMLINK,
+        errno.EOPNOTSUPP,
+    )
+
+    def __init__(
+        self,
+        cover_cache_path: Path = None,
+        max_memory_bytes: int = MAX_MEMORY_BYTES,
+        max_disk_bytes: int = MAX_DISK_BYTES,
+    ):
+        self.cover_cache_path = cover_cache_path
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._url_locks = collections.defaultdict(threading.Lock)
+        self._entries = collections.OrderedDict()
+        self._memory_bytes = 0
+        self.session = requests.Session()
+        self._set_connection()
+
+    def _set_connection(self):
+        if self.cover_cache_path is None:
+            self.connection = None
+            return
+        self.cover_cache_path.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.cover_cache_path / "covers.db",
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS covers ("
+            "url TEXT PRIMARY KEY, "
+            "digest TEXT NOT NULL, "
+            "size INTEGER, "
+            "accessed REAL)"
+        )
+        columns = {
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(covers)").fetchall()
+        }
+        for column, column_type in (("size", "INTEGER"), ("accessed", "REAL")):
+            if column not in columns:
+                self.connection.execute(
+                    f"ALTER TABLE covers ADD COLUMN {column} {column_type}"
+                )
+        for (digest,) in self.connection.execute(
+            "SELECT DISTINCT digest FROM covers WHERE size IS NULL"
+        ).fetchall():
+            content_path = self.get_content_path(digest)
+            self.connection.execute(
+                "UPDATE covers SET size = ?, accessed = 0 WHERE digest = ?",
+                (content_path.stat().st_size if content_path.exists() else 0, digest),
+            )
+
+    def get_content_path(self, digest: str) -> Path:
+        return self.cover_cache_path / digest[:2] / f"{digest}.jpg"
+
+    def _get_memory(self, url: str) -> bytes | None:
+        with self._lock:
+            content = self._entries.get(url)
+            if content is not None:
+                self._entries.move_to_end(url)
+            return content
+
+    def _set_memory(self, url: str, content: bytes) -> None:
+        if len(content) > self.max_memory_bytes:
+            return
+        with self._lock:
+            if url in self._entries:
+                self._memory_bytes -= len(self._entries.pop(url))
+            self._entries[url] = content
+            self._memory_bytes += len(content)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted_content = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted_content)
+
+    def get_path(self, url: str) -> Path | None:
+        if self.connection is None:
+            return None
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT digest FROM covers WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        content_path = self.get_content_path(row[0])
+        if not content_path.exists():
+            return None
+        with self._lock:
+            self.connection.execute(
+                "UPDATE covers SET accessed = ? WHERE digest = ?",
+                (time.time(), row[0]),
+            )
+        return content_path
+
+    def _evict_disk(self, kept_digest: str) -> None:
+        rows = self.connection.execute(
+            "SELECT digest, MAX(size) FROM covers "
+            "GROUP BY digest ORDER BY MAX(accessed)"
+        ).fetchall()
+        disk_bytes = sum(size or 0 for _, size in rows)
+        for digest, size in rows:
+            if disk_bytes <= self.max_disk_bytes:
+                break
+            if digest == kept_digest:
+                continue
+            self.connection.execute("DELETE FROM covers WHERE digest = ?", (digest,))
+            self.get_content_path(digest).unlink(missing_ok=True)
+            disk_bytes -= size or 0
+
+    def _store(self, url: str, content: bytes) -> Path:
+        digest = hashlib.sha256(content).hexdigest()
+        content_path = self.get_content_path(digest)
+        if not content_path.exists():
+            content_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = content_path.with_name(
+                f"{content_path.name}.{threading.get_ident()}.tmp"
+            )
+            temp_path.write_bytes(content)
+            os.replace(temp_path, content_path)
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO covers (url, digest, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (url, digest, len(content), time.time()),
+            )
+            self._evict_disk(digest)
+        return content_path
+
+    def download(self, url: str) -> bytes:
+        response = self.session.get(url, timeout=self.TIMEOUT)
+        check_response(response)
+        return response.content
+
+    def get(self, url: str) -> bytes:
+        content = self._get_memory(url)
+        if content is not None:
+            return content
+        with self._url_locks[url]:
+            content = self._get_memory(url)
+            if content is not None:
+                return content
+            content_path = self.get_path(url)
+            if content_path is not None:
+                content = content_path.read_bytes()
+            else:
+                content = self.download(url)
+                if self.connection is not None:
+                    self._store(url, content)
+            self._set_memory(url, content)
+        return content
+
+    def save(self, cover_path: Path, url: str) -> None:
+        cover_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cover_path.with_name(
+            f"{cover_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        content_path = self.get_path(url)
+        if content_path is None:
+            content = self.get(url)
+            if self.connection is None:
+                temp_path.write_bytes(content)
+                os.replace(temp_path, cover_path)
+                return
+            content_path = self._store(url, content)
+        if cover_path.exists() and os.path.samefile(content_path, cover_path):
+            return
+        temp_path.unlink(missing_ok=True)
+        try:
+            os.link(content_path, temp_path)
+        except OSError as e:
+            if e.errno not in self.LINK_UNSUPPORTED_ERRNOS:
+                raise
+            shutil.copyfile(content_path, temp_path)
+        os.replace(temp_path, cover_path)
+        # Renaming onto a link to the same file is a no-op that keeps the source
+        temp_path.unlink(missing_ok=True)
@@ -1,21 +1,20 @@
 from __future__ import annotations
 
 import datetime
-import functools
 import re
 import shutil
 import subprocess
+import typing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import requests
-from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
-from pywidevine import Cdm, Device
-
 from .constants import *
+from .cover_cache import CoverCache
 from .enums import RemuxMode
+from .http_downloader import HttpDownloader
+from .key_store import KeyStore
 from .models import DownloadQueue, UrlInfo
 from .spotify_api import SpotifyApi
-from .utils import check_response
 
 
 class Downloader:
@@ -46,6 +45,8 @@ class Downloader:
         exclude_tags: str = None,
         truncate: int = None,
         silence: bool = False,
+        key_store: KeyStore = None,
+        cover_cache: CoverCache = None,
     ):
         self.spotify_api = spotify_api
         self.output_path = output_path
@@ -68,10 +69,14 @@ class Downloader:
         self.exclude_tags = exclude_tags
         self.truncate = truncate
         self.silence = silence
+        self.key_store = key_store
+        self.cover_cache = cover_cache
         self._set_binaries_full_path()
         self._set_exclude_tags_list()
         self._set_truncate()
         self._set_subprocess_additional_args()
+        self._set_http_downloader()
+        self._set_cover_cache()
 
     def _set_binaries_full_path(self):
         self.ffmpeg_path_full = shutil.which(self.ffmpeg_path)
@@ -100,8 +105,89 @@ class Downloader:
         else:
             self.subprocess_additional_args = {}
 
-    def set_cdm(self) -> None:
-        self.cdm = Cdm.from_device(Device.load(self.wvd_path))
+    def _set_http_downloader(self):
+        self.http_downloader = HttpDownloader()
+
+    def _set_cover_cache(self):
+        if self.cover_cache is None:
+            self.cover_cache = CoverCache()
+
+    def set_cdm(self, max_sessions: int = None) -> None:
+        from pywidevine import Cdm, Device
+
+        from .cdm_pool import CdmPool
+
+        device = Device.load(self.wvd_path)
+        self.cdm_pool = CdmPool(
+            device,
+            max_sessions if max_sessions is not None else Cdm.MAX_NUM_OF_SESSIONS,
+        )
+
+    def get_decryption_key(
+        self,
+        pssh: str,
+        get_license: typing.Callable[[bytes], bytes],
+    ) -> str:
+        decryption_key = self.get_stored_decryption_key(pssh)
+        if decryption_key is not None:
+            return decryption_key
+        from pywidevine import PSSH
+
+        with self.cdm_pool.session() as (cdm, cdm_session):
+            with self.spotify_api.metrics.measure("license") as metric_record:
+                challenge = cdm.get_license_challenge(cdm_session, PSSH(pssh))
+                license = get_license(challenge)
+                metric_record.bytes = len(license)
+                cdm.parse_license(cdm_session, license)
+            decryption_key = next(
+                i for i in cdm.get_keys(cdm_session) if i.type == "CONTENT"
+            ).key.hex()
+        self.store_decryption_key(pssh, decryption_key)
+        return decryption_key
+
+    def map_cdm_pool(
+        self,
+        func: typing.Callable[[typing.Any], typing.Any],
+        items: list,
+        return_exceptions: bool = False,
+    ) -> list:
+        if not items:
+            return []
+        with ThreadPoolExecutor(
+            max_workers=min(len(items), self.cdm_pool.max_sessions)
+        ) as executor:
+            futures = [executor.submit(func, item) for item in items]
+        results = []
+        for future in futures:
+            exception = future.exception()
+            if exception is None:
+                results.append(future.result())
+            elif return_exceptions:
+                results.append(exception)
+            else:
+                raise exception
+        return results
+
+    def get_decryption_keys(
+        self,
+        psshs: list[str],
+        get_license: typing.Callable[[bytes], bytes],
+        return_exceptions: bool = False,
+    ) -> list[str | Exception]:
+        return self.map_cdm_pool(
+            lambda pssh: self.get_decryption_key(pssh, get_license),
+            psshs,
+            return_exceptions,
+        )
+
+    def get_stored_decryption_key(self, kid: str) -> str | None:
+        if self.key_store is None:
+            return None
+        return self.key_store.get(kid)
+
+    def store_decryption_key(self, kid: str, decryption_key: str) -> None:
+        if self.key_store is not None:
+            self.key_store.set(kid, decryption_key)
 
     def get_url_info(self, url: str) -> UrlInfo:
         url_regex_result = re.search(self.URL_RE, url)
@@ -112,31 +198,79 @@ class Downloader:
     def get_download_queue(
         self,
         url_info: UrlInfo,
+        streaming: bool = False,
+        prefetched_metadata: dict = None,
     ) -> DownloadQueue:
         download_queue = DownloadQueue(tracks_metadata=[])
         if url_info.type == "album":
-            download_queue.tracks_metadata.extend(
+            album = prefetched_metadata or self.spotify_api.get_album(
+                url_info.id, extend=not streaming
+            )
+            download_queue.tracks_total = album["tracks"]["total"]
+            download_queue.tracks_metadata = (
                 track_metadata
-                for track_metadata in self.spotify_api.get_album(url_info.id)["tracks"][
-                    "items"
-                ]
+                for track_metadata in (
+                    self.spotify_api.get_track_collection_items(album)
+                    if streaming
+                    else album["tracks"]["items"]
+                )
                 if track_metadata is not None
             )
         elif url_info.type == "playlist":
-            playlist = self.spotify_api.get_playlist(url_info.id)
+            playlist = self.spotify_api.get_playlist(url_info.id, extend=not streaming)
             download_queue.playlist_metadata = playlist.copy()
             download_queue.playlist_metadata.pop("tracks")
-            download_queue.tracks_metadata.extend(
+            download_queue.tracks_total = playlist["tracks"]["total"]
+            download_queue.tracks_metadata = (
                 track_metadata["track"]
-                for track_metadata in playlist["tracks"]["items"]
+                for track_metadata in (
+                    self.spotify_api.get_track_collection_items(playlist)
+                    if streaming
+                    else playlist["tracks"]["items"]
+                )
                 if track_metadata["track"] is not None
             )
         elif url_info.type == "track":
             download_queue.tracks_metadata.append(
-                self.spotify_api.get_track(url_info.id)
+                prefetched_metadata or self.spotify_api.get_track(url_info.id)
             )
+            download_queue.tracks_total = 1
+        if not streaming:
+            download_queue.tracks_metadata = list(download_queue.tracks_metadata)
+            download_queue.tracks_total = len(download_queue.tracks_metadata)
         return download_queue
 
+    def get_prefetched_metadata(
+        self,
+        url_infos: list[UrlInfo],
+        streaming: bool = False,
+    ) -> dict[tuple[str, str], dict]:
+        track_ids = list(
+            dict.fromkeys(
+                url_info.id for url_info in url_infos if url_info.type == "track"
+            )
+        )
+        album_ids = list(
+            dict.fromkeys(
+                url_info.id for url_info in url_infos if url_info.type == "album"
+            )
+        )
+        prefetched_metadata = {}
+        if len(track_ids) > 1:
+            for track_id, track in zip(
+                track_ids, self.spotify_api.get_tracks(track_ids)
+            ):
+                if track is not None:
+                    prefetched_metadata[("track", track_id)] = track
+        if len(album_ids) > 1:
+            for album_id, album in zip(
+                album_ids,
+                self.spotify_api.get_albums(album_ids, extend=not streaming),
+            ):
+                if album is not None:
+                    prefetched_metadata[("album", album_id)] = album
+        return prefetched_metadata
+
     def get_playlist_tags(self, playlist_metadata: dict, playlist_track: int) -> dict:
         return {
             "playlist_artist": playlist_metadata["owner"]["display_name"],
@@ -189,32 +323,6 @@ class Downloader:
             ),
         )
 
-    def update_playlist_file(
-        self,
-        playlist_file_path: Path,
-        final_path: Path,
-        playlist_track: int,
-    ):
-        playlist_file_path.parent.mkdir(parents=True, exist_ok=True)
-        playlist_file_path_parent_parts_len = len(playlist_file_path.parent.parts)
-        output_path_parts_len = len(self.output_path.parts)
-        final_path_relative = Path(
-            ("../" * (playlist_file_path_parent_parts_len - output_path_parts_len)),
-            *final_path.parts[output_path_parts_len:],
-        )
-        playlist_file_lines = (
-            playlist_file_path.open("r", encoding="utf8").readlines()
-            if playlist_file_path.exists()
-            else []
-        )
-        if len(playlist_file_lines) < playlist_track:
-            playlist_file_lines.extend(
-                "\n" for _ in range(playlist_track - len(playlist_file_lines))
-            )
-        playlist_file_lines[playlist_track - 1] = final_path_relative.as_posix() + "\n"
-        with playlist_file_path.open("w", encoding="utf8") as playlist_file:
-            playlist_file.writelines(playlist_file_lines)
-
     def get_sanitized_string(self, dirty_string: str, is_folder: bool) -> str:
         dirty_string = re.sub(
             self.ILLEGAL_CHARACTERS_REGEX,
@@ -272,26 +380,29 @@ class Downloader:
             if i["size"] == size
         )
 
+    def get_temp_path(self, track_id: str) -> Path:
+        return self.temp_path / track_id
+
     def get_encrypted_path(
         self,
         track_id: str,
         file_extension: str,
     ) -> Path:
-        return self.temp_path / (f"{track_id}_encrypted" + file_extension)
+        return self.get_temp_path(track_id) / (f"{track_id}_encrypted" + file_extension)
 
     def get_decrypted_path(
         self,
         track_id: str,
         file_extension: str,
     ) -> Path:
-        return self.temp_path / (f"{track_id}_decrypted" + file_extension)
+        return self.get_temp_path(track_id) / (f"{track_id}_decrypted" + file_extension)
 
     def get_remuxed_path(
         self,
         track_id: str,
         file_extension: str,
     ) -> Path:
-        return self.temp_path / (f"{track_id}_remuxed" + file_extension)
+        return self.get_temp_path(track_id) / (f"{track_id}_remuxed" + file_extension)
 
     def decrypt_mp4decrypt(
         self,
@@ -311,14 +422,9 @@ class Downloader:
             **self.subprocess_additional_args,
         )
 
-    @staticmethod
-    @functools.lru_cache()
-    def get_response_bytes(url: str) -> bytes:
-        response = requests.get(url)
-        check_response(response)
-        return response.content
+    def get_mp4_tags(self, tags: dict, cover_url: str) -> dict:
+        from mutagen.mp4 import MP4Cover, MP4FreeForm
 
-    def apply_tags(self, fixed_location: Path, tags: dict, cover_url: str):
         to_apply_tags = [
             tag_name
             for tag_name in tags.keys()
@@ -357,23 +463,28 @@ class Downloader:
         if "cover" not in self.exclude_tags_list and cover_url is not None:
             mp4_tags["covr"] = [
                 MP4Cover(
-                    self.get_response_bytes(cover_url), imageformat=MP4Cover.FORMAT_JPEG
+                    self.cover_cache.get(cover_url), imageformat=MP4Cover.FORMAT_JPEG
                 )
             ]
+        return mp4_tags
+
+    def apply_tags(self, fixed_location: Path, tags: dict, cover_url: str):
+        from mutagen.mp4 import MP4
+
         mp4 = MP4(fixed_location)
         mp4.clear()
-        mp4.update(mp4_tags)
+        mp4.update(self.get_mp4_tags(tags, cover_url))
         mp4.save()
 
     def move_to_final_path(self, fixed_path: Path, final_path: Path):
         final_path.parent.mkdir(parents=True, exist_ok=True)
         shutil.move(fixed_path, final_path)
 
-    @functools.lru_cache()
     def save_cover(self, cover_path: Path, cover_url: str):
         if cover_url is not None:
-            cover_path.parent.mkdir(parents=True, exist_ok=True)
-            cover_path.write_bytes(self.get_response_bytes(cover_url))
+            self.cover_cache.save(cover_path, cover_url)
 
-    def cleanup_temp_path(self):
-        shutil.rmtree(self.temp_path)
+    def cleanup_temp_path(self, track_id: str = None):
+        shutil.rmtree(
+            self.get_temp_path(track_id) if track_id is not None else self.temp_path
+        )
@@ -1,11 +1,9 @@
 from __future__ import annotations
 
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from pywidevine import PSSH
-from yt_dlp import YoutubeDL
-
 from .downloader import Downloader
 from .enums import DownloadModeVideo, RemuxMode
 from .models import VideoM3U8, VideoStreamInfo
@@ -22,9 +20,17 @@ class DownloaderMusicVideo:
         self,
         downloader: Downloader,
         download_mode: DownloadModeVideo = DownloadModeVideo.YTDLP,
+        concurrent_download: bool = False,
+        video_max_height: int = None,
+        video_max_bitrate: int = None,
+        video_max_size: int = None,
     ):
         self.downloader = downloader
         self.download_mode = download_mode
+        self.concurrent_download = concurrent_download
+        self.video_max_height = video_max_height
+        self.video_max_bitrate = video_max_bitrate
+        self.video_max_size = video_max_size
 
     def get_music_video_id_from_song_id(
         self,
@@ -57,8 +63,11 @@ class DownloaderMusicVideo:
             for format in manifest["contents"][0]["profiles"]
             if format.get("audio_bitrate") and format["file_type"] == "mp4"
         )
-        best_video_format = max(video_formats, key=lambda x: x["video_bitrate"])
-        best_audio_format = max(audio_formats, key=lambda x: x["audio_bitrate"])
+        best_video_format, best_audio_format = self.get_best_formats(
+            video_formats,
+            audio_formats,
+            manifest["end_time_millis"],
+        )
         base_url = manifest["base_urls"][0]
         initialization_template_url = manifest["initialization_template"]
         segment_template_url = manifest["segment_template"]
@@ -84,26 +93,74 @@ class DownloaderMusicVideo:
             file_type_video,
             file_type_audio,
             pssh,
+            best_video_format["video_bitrate"],
+            best_audio_format["audio_bitrate"],
+        )
+
+    def get_bitrate_cap(self, end_time_millis: int) -> int | None:
+        bitrate_caps = []
+        if self.video_max_bitrate:
+            bitrate_caps.append(self.video_max_bitrate * 1000)
+        if self.video_max_size and end_time_millis:
+            bitrate_caps.append(
+                self.video_max_size * 1024 * 1024 * 8 * 1000 // end_time_millis
+            )
+        return min(bitrate_caps) if bitrate_caps else None
+
+    def get_best_formats(
+        self,
+        video_formats: list[dict],
+        audio_formats: list[dict],
+        end_time_millis: int,
+    ) -> tuple[dict, dict]:
+        if self.video_max_height:
+            video_formats = [
+                format
+                for format in video_formats
+                if (format.get("video_height") or 0) <= self.video_max_height
+            ] or [min(video_formats, key=lambda x: x["video_bitrate"])]
+        format_pairs = [
+            (video_format, audio_format)
+            for video_format in video_formats
+            for audio_format in audio_formats
+        ]
+        bitrate_cap = self.get_bitrate_cap(end_time_millis)
+        if bitrate_cap is None:
+            return max(
+                format_pairs,
+                key=lambda x: (x[0]["video_bitrate"], x[1]["audio_bitrate"]),
+            )
+        format_pairs_under_cap = [
+            (video_format, audio_format)
+            for video_format, audio_format in format_pairs
+            if video_format["video_bitrate"] + audio_format["audio_bitrate"]
+            <= bitrate_cap
+        ]
+        if not format_pairs_under_cap:
+            return min(
+                format_pairs,
+                key=lambda x: x[0]["video_bitrate"] + x[1]["audio_bitrate"],
+            )
+        return max(
+            format_pairs_under_cap,
+            key=lambda x: (x[0]["video_bitrate"], x[1]["audio_bitrate"]),
+        )
+
+    def get_estimated_size(self, stream_info: VideoStreamInfo) -> int:
+        return (
+            (stream_info.bitrate_video + stream_info.bitrate_audio)
+            * stream_info.end_time_millis
+            // 8000
         )
 
     def get_decryption_key(self, pssh: str) -> str:
-        try:
-            pssh = PSSH(pssh)
-            cdm_session = self.downloader.cdm.open()
-            challenge = self.downloader.cdm.get_license_challenge(cdm_session, pssh)
-            license = self.downloader.spotify_api.get_widevine_license_video(challenge)
-            self.downloader.cdm.parse_license(cdm_session, license)
-            decryption_key = next(
-                i
-                for i in self.downloader.cdm.get_keys(cdm_session)
-                if i.type == "CONTENT"
-            ).key.hex()
-        finally:
-            self.downloader.cdm.close(cdm_session)
-        return decryption_key
+        return self.downloader.get_decryption_key(
+            pssh,
+            self.downloader.spotify_api.get_widevine_license_video,
+        )
 
     def get_m3u8_path(self, track_id: str, type: str) -> Path:
-        return self.downloader.temp_path / f"{track_id}_{type}.m3u8"
+        return self.downloader.get_temp_path(track_id) / f"{track_id}_{type}.m3u8"
 
     def get_cover_path(self, final_path: Path) -> Path:
         return final_path.with_suffix(".jpg")
@@ -230,7 +287,56 @@ class DownloaderMusicVideo:
         elif self.download_mode == DownloadModeVideo.NM3U8DLRE:
             self.download_nm3u8dlre(m3u8_path, encrypted_path)
 
+    def download_video_audio(
+        self,
+        m3u8_path_video: Path,
+        encrypted_path_video: Path,
+        m3u8_path_audio: Path,
+        encrypted_path_audio: Path,
+    ) -> None:
+        if not self.concurrent_download:
+            self.download(m3u8_path_video, encrypted_path_video)
+            self.download(m3u8_path_audio, encrypted_path_audio)
+            return
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for future in [
+                executor.submit(self.download, m3u8_path_video, encrypted_path_video),
+                executor.submit(self.download, m3u8_path_audio, encrypted_path_audio),
+            ]:
+                future.result()
+
+    def download_native(
+        self,
+        stream_info: VideoStreamInfo,
+        encrypted_path_video: Path,
+        encrypted_path_audio: Path,
+    ) -> None:
+        self.downloader.http_downloader.download_segments(
+            {
+                encrypted_path_video: self.get_segment_urls(
+                    stream_info.base_url,
+                    stream_info.initialization_template_url,
+                    stream_info.segment_template_url,
+                    stream_info.end_time_millis,
+                    stream_info.segment_length,
+                    stream_info.profile_id_video,
+                    stream_info.file_type_video,
+                ),
+                encrypted_path_audio: self.get_segment_urls(
+                    stream_info.base_url,
+                    stream_info.initialization_template_url,
+                    stream_info.segment_template_url,
+                    stream_info.end_time_millis,
+                    stream_info.segment_length,
+                    stream_info.profile_id_audio,
+                    stream_info.file_type_audio,
+                ),
+            }
+        )
+
     def download_ytdlp(self, m3u8_path: Path, encrypted_path: Path) -> None:
+        from yt_dlp import YoutubeDL
+
         with YoutubeDL(
             {
                 "quiet": True,
@@ -277,7 +383,7 @@ class DownloaderMusicVideo:
         decrypted_path_audio: Path,
         remuxed_path: Path,
     ):
-        if self.downloader.remux_mode == RemuxMode.FFMPEG:
+        if self.downloader.remux_mode in (RemuxMode.FFMPEG, RemuxMode.NATIVE):
             self.remux_ffmpeg(
                 decryption_key,
                 encrypted_path_video,
@@ -4,12 +4,10 @@ import datetime
 import subprocess
 from pathlib import Path
 
-from pywidevine import PSSH
-from yt_dlp import YoutubeDL
-
 from .downloader import Downloader
 from .enums import DownloadModeSong, RemuxMode
 from .models import Lyrics
+from .mp4 import Mp4Decrypter, get_udta, write_decrypted_faststart
 
 
 class DownloaderSong:
@@ -28,21 +26,41 @@ class DownloaderSong:
         self.codec = "MP4_256" if self.premium_quality else "MP4_128"
 
     def get_decryption_key(self, pssh: str) -> str:
-        try:
-            pssh = PSSH(pssh)
-            cdm_session = self.downloader.cdm.open()
-            challenge = self.downloader.cdm.get_license_challenge(cdm_session, pssh)
-            license = self.downloader.spotify_api.get_widevine_license_music(challenge)
-            self.downloader.cdm.parse_license(cdm_session, license)
-            decryption_key = next(
-                i
-                for i in self.downloader.cdm.get_keys(cdm_session)
-                if i.type == "CONTENT"
-            ).key.hex()
-        finally:
-            self.downloader.cdm.close(cdm_session)
+        return self.downloader.get_decryption_key(
+            pssh,
+            self.downloader.spotify_api.get_widevine_license_music,
+        )
+
+    def get_decryption_key_from_file_id(self, file_id: str) -> str:
+        decryption_key = self.downloader.get_stored_decryption_key(file_id)
+        if decryption_key is None:
+            pssh = self.downloader.spotify_api.get_pssh(file_id)
+            decryption_key = self.get_decryption_key(pssh)
+            self.downloader.store_decryption_key(file_id, decryption_key)
         return decryption_key
 
+    def get_decryption_keys(
+        self,
+        psshs: list[str],
+        return_exceptions: bool = False,
+    ) -> list[str | Exception]:
+        return self.downloader.get_decryption_keys(
+            psshs,
+            self.downloader.spotify_api.get_widevine_license_music,
+            return_exceptions,
+        )
+
+    def get_decryption_keys_from_file_ids(
+        self,
+        file_ids: list[str],
+        return_exceptions: bool = False,
+    ) -> list[str | Exception]:
+        return self.downloader.map_cdm_pool(
+            self.get_decryption_key_from_file_id,
+            file_ids,
+            return_exceptions,
+        )
+
     def get_file_id(self, metadata_gid: dict) -> str:
         audio_files = metadata_gid.get("file")
         if audio_files is None:
@@ -117,8 +135,12 @@ class DownloaderSong:
             self.download_ytdlp(encrypted_path, stream_url)
         elif self.download_mode == DownloadModeSong.ARIA2C:
             self.download_aria2c(encrypted_path, stream_url)
+        elif self.download_mode == DownloadModeSong.NATIVE:
+            self.download_native(encrypted_path, stream_url)
 
     def download_ytdlp(self, encrypted_path: Path, stream_url: str) -> None:
+        from yt_dlp import YoutubeDL
+
         with YoutubeDL(
             {
                 "quiet": True,
@@ -151,12 +173,39 @@ class DownloaderSong:
         )
         print("\r", end="")
 
+    def download_native(self, encrypted_path: Path, stream_url: str) -> None:
+        self.downloader.http_downloader.download(stream_url, encrypted_path)
+
+    def download_stream(
+        self,
+        decryption_key: str,
+        stream_url: str,
+        final_path: Path,
+        tags: dict,
+        cover_url: str,
+    ) -> None:
+        part_path = final_path.with_name(final_path.name + ".part")
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with part_path.open("wb") as part_file:
+                mp4_decrypter = Mp4Decrypter(bytes.fromhex(decryption_key), part_file)
+                for chunk in self.downloader.http_downloader.iter_content(stream_url):
+                    mp4_decrypter.feed(chunk)
+                mp4_decrypter.write_moov(
+                    get_udta(self.downloader.get_mp4_tags(tags, cover_url))
+                )
+            part_path.replace(final_path)
+        finally:
+            part_path.unlink(missing_ok=True)
+
     def remux(
         self,
         encrypted_path: Path,
         decrypted_path: Path,
         remuxed_path: Path,
         decryption_key: str,
+        tags: dict = None,
+        cover_url: str = None,
     ):
         if self.downloader.remux_mode == RemuxMode.FFMPEG:
             self.remux_ffmpeg(decryption_key, encrypted_path, remuxed_path)
@@ -165,6 +214,14 @@ class DownloaderSong:
                 encrypted_path, decrypted_path, decryption_key
             )
             self.remux_mp4box(decrypted_path, remuxed_path)
+        elif self.downloader.remux_mode == RemuxMode.NATIVE:
+            self.remux_native(
+                decryption_key,
+                encrypted_path,
+                remuxed_path,
+                tags,
+                cover_url,
+            )
 
     def remux_mp4box(self, decrypted_path: Path, remuxed_path: Path):
         subprocess.run(
@@ -209,6 +266,27 @@ class DownloaderSong:
             **self.downloader.subprocess_additional_args,
         )
 
+    def remux_native(
+        self,
+        decryption_key: str,
+        encrypted_path: Path,
+        remuxed_path: Path,
+        tags: dict = None,
+        cover_url: str = None,
+    ) -> None:
+        udta = (
+            get_udta(self.downloader.get_mp4_tags(tags, cover_url))
+            if tags is not None
+            else None
+        )
+        with remuxed_path.open("wb") as remuxed_file:
+            write_decrypted_faststart(
+                encrypted_path.read_bytes(),
+                remuxed_file,
+                bytes.fromhex(decryption_key),
+                udta,
+            )
+
     def get_lyrics_synced_timestamp_lrc(self, time: int) -> str:
         lrc_timestamp = datetime.datetime.fromtimestamp(
             time / 1000.0, tz=datetime.timezone.utc
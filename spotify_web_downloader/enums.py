@@ -4,13 +4,32 @@ from enum import Enum
 class RemuxMode(Enum):
     FFMPEG = "ffmpeg"
     MP4BOX = "mp4box"
+    NATIVE = "native"
 
 
 class DownloadModeSong(Enum):
     YTDLP = "ytdlp"
     ARIA2C = "aria2c"
+    NATIVE = "native"
+    STREAM = "stream"
 
 
 class DownloadModeVideo(Enum):
     YTDLP = "ytdlp"
     NM3U8DLRE = "nm3u8dlre"
+    NATIVE = "native"
+
+
+class JobState(Enum):
+    RESOLVED = "resolved"
+    KEYED = "keyed"
+    DOWNLOADED = "downloaded"
+    REMUXED = "remuxed"
+    TAGGED = "tagged"
+    DONE = "done"
+
+
+class RetryAction(Enum):
+    STOP = "stop"
+    RETRY = "retry"
+    REFRESH_AUTH = "refresh_auth"
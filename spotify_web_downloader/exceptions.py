@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import requests
+
+
+class ResponseError(Exception):
+    def __init__(self, response: requests.Response):
+        self.response = response
+        self.status_code = response.status_code
+        super().__init__(
+            f"Request failed with status code {response.status_code}: {response.text}"
+        )
+
+
+class UnauthorizedError(ResponseError):
+    pass
+
+
+class NotFoundError(ResponseError):
+    pass
+
+
+class RateLimitError(ResponseError):
+    pass
+
+
+class ServerError(ResponseError):
+    pass
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import collections
+import itertools
+import shutil
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .enums import RetryAction
+from .exceptions import ResponseError
+from .retry_policy import RetryPolicy
+from .utils import check_response
+
+
+class HttpDownloader:
+    CHUNK_SIZE = 1024 * 256
+    MIN_SEGMENT_SIZE = 1024 * 1024
+    RETRY_BACKOFF_TIME = 1
+    TIMEOUT = 30
+    RETRY_EXCEPTIONS = (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+
+    def __init__(
+        self,
+        connections: int = 4,
+        max_retries: int = 3,
+        pool_size: int = 32,
+    ):
+        self.connections = connections
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.retry_policy = RetryPolicy(max_retries, self.RETRY_BACKOFF_TIME)
+        self._set_session()
+
+    def _set_session(self):
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=self.pool_size,
+                pool_maxsize=self.pool_size,
+            ),
+        )
+        self.session.mount(
+            "http://",
+            HTTPAdapter(
+                pool_connections=self.pool_size,
+                pool_maxsize=self.pool_size,
+            ),
+        )
+
+    def get_retry_wait_time(self, retry: int, exception: Exception) -> float | None:
+        if isinstance(exception, ResponseError):
+            action, wait_time = self.retry_policy.get_action(
+                retry,
+                exception.status_code,
+                exception.response.headers,
+            )
+        elif isinstance(exception, self.RETRY_EXCEPTIONS):
+            action, wait_time = self.retry_policy.get_action(retry)
+        else:
+            return None
+        return wait_time if action == RetryAction.RETRY else None
+
+    def get_content_length(self, url: str) -> int | None:
+        try:
+            response = self.session.head(
+                url,
+                allow_redirects=True,
+                timeout=self.TIMEOUT,
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            return None
+        if not response.ok or response.headers.get("Accept-Ranges") != "bytes":
+            return None
+        content_length = response.headers.get("Content-Length")
+        return int(content_length) if content_length is not None else None
+
+    def get_segment_ranges(self, content_length: int) -> list[tuple[int, int]]:
+        segment_count = max(
+            1,
+            min(self.connections, content_length // self.MIN_SEGMENT_SIZE),
+        )
+        segment_size = -(-content_length // segment_count)
+        return [
+            (start, min(start + segment_size, content_length) - 1)
+            for start in range(0, content_length, segment_size)
+        ]
+
+    def get_part_path(self, path: Path, segment_index: int) -> Path:
+        return path.with_name(f"{path.name}.part{segment_index}")
+
+    def download_segment(
+        self,
+        url: str,
+        part_path: Path,
+        start: int,
+        end: int,
+    ) -> None:
+        segment_length = end - start + 1
+        for retry in range(self.max_retries + 1):
+            part_size = part_path.stat().st_size if part_path.exists() else 0
+            if part_size == segment_length:
+                return
+            if part_size > segment_length:
+                part_path.unlink()
+                part_size = 0
+            try:
+                with self.session.get(
+                    url,
+                    headers={"Range": f"bytes={start + part_size}-{end}"},
+                    stream=True,
+                    timeout=self.TIMEOUT,
+                ) as response:
+                    check_response(response)
+                    if response.status_code != 206:
+                        raise Exception("Server ignored the requested byte range")
+                    with part_path.open("ab") as part_file:
+                        for chunk in response.iter_content(self.CHUNK_SIZE):
+                            part_file.write(chunk)
+            except Exception as e:
+                wait_time = self.get_retry_wait_time(retry, e)
+                if wait_time is None:
+                    raise
+                time.sleep(wait_time)
+        if part_path.stat().st_size != segment_length:
+            raise Exception(
+                f"Segment size mismatch for {part_path}: expected {segment_length} "
+                f"bytes, got {part_path.stat().st_size}"
+            )
+
+    def download_single(self, url: str, path: Path) -> None:
+        with self.session.get(url, stream=True, timeout=self.TIMEOUT) as response:
+            check_response(response)
+            content_length = response.headers.get("Content-Length")
+            with path.open("wb") as file:
+                for chunk in response.iter_content(self.CHUNK_SIZE):
+                    file.write(chunk)
+        if content_length is not None and path.stat().st_size != int(content_length):
+            raise Exception(
+                f"Size mismatch for {path}: expected {content_length} bytes, "
+                f"got {path.stat().st_size}"
+            )
+
+    def iter_content(self, url: str) -> typing.Generator[bytes, None, None]:
+        position = 0
+        for retry in range(self.max_retries + 1):
+            try:
+                with self.session.get(
+                    url,
+                    headers={"Range": f"bytes={position}-"} if position else None,
+                    stream=True,
+                    timeout=self.TIMEOUT,
+                ) as response:
+                    check_response(response)
+                    if position and response.status_code != 206:
+                        raise Exception("Server ignored the requested byte range")
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        position += len(chunk)
+                        yield chunk
+                return
+            except Exception as e:
+                wait_time = self.get_retry_wait_time(retry, e)
+                if wait_time is None:
+                    raise
+                time.sleep(wait_time)
+
+    def download(self, url: str, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content_length = self.get_content_length(url)
+        if not content_length:
+            self.download_single(url, path)
+            return
+        segment_ranges = self.get_segment_ranges(content_length)
+        part_paths = [
+            self.get_part_path(path, segment_index)
+            for segment_index in range(len(segment_ranges))
+        ]
+        with ThreadPoolExecutor(max_workers=len(segment_ranges)) as executor:
+            for future in [
+                executor.submit(self.download_segment, url, part_path, start, end)
+                for part_path, (start, end) in zip(part_paths, segment_ranges)
+            ]:
+                future.result()
+        with path.open("wb") as file:
+            for part_path in part_paths:
+                with part_path.open("rb") as part_file:
+                    shutil.copyfileobj(part_file, file)
+        for part_path in part_paths:
+            part_path.unlink()
+        if path.stat().st_size != content_length:
+            raise Exception(
+                f"Size mismatch for {path}: expected {content_length} bytes, "
+                f"got {path.stat().st_size}"
+            )
+
+    def get_segment(self, url: str) -> bytes:
+        for retry in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, timeout=self.TIMEOUT)
+                check_response(response)
+                return response.content
+            except Exception as e:
+                wait_time = self.get_retry_wait_time(retry, e)
+                if wait_time is None:
+                    raise
+                time.sleep(wait_time)
+
+    def write_segments(
+        self,
+        urls: list[str],
+        path: Path,
+        executor: ThreadPoolExecutor,
+    ) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        urls = iter(urls)
+        segment_futures = collections.deque(
+            executor.submit(self.get_segment, url)
+            for url in itertools.islice(urls, self.connections * 2)
+        )
+        with path.open("wb") as file:
+            while segment_futures:
+                file.write(segment_futures.popleft().result())
+                url = next(urls, None)
+                if url is not None:
+                    segment_futures.append(executor.submit(self.get_segment, url))
+
+    def download_segments(self, segment_urls: dict[Path, list[str]]) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self.connections * len(segment_urls)
+        ) as segment_executor, ThreadPoolExecutor(
+            max_workers=len(segment_urls)
+        ) as path_executor:
+            for future in [
+                path_executor.submit(
+                    self.write_segments,
+                    urls,
+                    path,
+                    segment_executor,
+                )
+                for path, urls in segment_urls.items()
+            ]:
+                future.result()
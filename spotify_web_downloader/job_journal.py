@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .enums import JobState
+from .models import Lyrics, TrackJob, VideoStreamInfo
+
+
+class JobJournal:
+    JOB_FIELDS = (
+        "metadata_gid",
+        "tags",
+        "cover_url",
+        "download",
+        "file_id",
+        "decryption_key",
+    )
+    JOB_PATH_FIELDS = (
+        "final_path",
+        "lrc_path",
+        "cover_path",
+        "remuxed_path",
+    )
+
+    def __init__(self, journal_path: Path):
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._set_connection()
+
+    def _set_connection(self):
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.journal_path,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "track_id TEXT PRIMARY KEY, "
+            "state TEXT NOT NULL, "
+            "job TEXT NOT NULL, "
+            "update_timestamp REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def has_state(job_state: JobState | None, state: JobState) -> bool:
+        if job_state is None:
+            return False
+        job_states = list(JobState)
+        return job_states.index(job_state) >= job_states.index(state)
+
+    def get_job_data(self, job: TrackJob) -> dict:
+        job_data = {field: getattr(job, field) for field in self.JOB_FIELDS}
+        for field in self.JOB_PATH_FIELDS:
+            path = getattr(job, field)
+            job_data[field] = str(path) if path is not None else None
+        job_data["lyrics"] = (
+            dataclasses.asdict(job.lyrics) if job.lyrics is not None else None
+        )
+        job_data["stream_info"] = (
+            dataclasses.asdict(job.stream_info) if job.stream_info is not None else None
+        )
+        return job_data
+
+    def get(self, track_id: str) -> tuple[JobState, dict] | None:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT state, job FROM jobs WHERE track_id = ?",
+                (track_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        state, job_data = row
+        return JobState(state), json.loads(job_data)
+
+    def set(self, track_id: str, state: JobState, job: TrackJob) -> None:
+        job_data = json.dumps(self.get_job_data(job))
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(track_id, state, job, update_timestamp) VALUES (?, ?, ?, ?)",
+                (track_id, state.value, job_data, time.time()),
+            )
+
+    def restore(self, job: TrackJob) -> JobState | None:
+        entry = self.get(job.track_metadata["id"])
+        if entry is None:
+            return None
+        state, job_data = entry
+        for field in self.JOB_FIELDS:
+            setattr(job, field, job_data[field])
+        for field in self.JOB_PATH_FIELDS:
+            setattr(
+                job,
+                field,
+                Path(job_data[field]) if job_data[field] is not None else None,
+            )
+        job.lyrics = (
+            Lyrics(**job_data["lyrics"]) if job_data["lyrics"] is not None else None
+        )
+        job.stream_info = (
+            VideoStreamInfo(**job_data["stream_info"])
+            if job_data["stream_info"] is not None
+            else None
+        )
+        return state
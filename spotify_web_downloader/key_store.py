@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class KeyStore:
+    def __init__(
+        self,
+        key_store_path: Path,
+        expiry: float = None,
+    ):
+        self.key_store_path = key_store_path
+        self.expiry = expiry
+        self._lock = threading.Lock()
+        self._set_connection()
+
+    def _set_connection(self):
+        self.key_store_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.key_store_path,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS keys ("
+            "kid TEXT PRIMARY KEY, "
+            "key TEXT NOT NULL, "
+            "expire_timestamp REAL)"
+        )
+        self.connection.execute(
+            "DELETE FROM keys WHERE expire_timestamp <= ?",
+            (time.time(),),
+        )
+
+    def get(self, kid: str) -> str | None:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT key, expire_timestamp FROM keys WHERE kid = ?",
+                (kid,),
+            ).fetchone()
+        if row is None:
+            return None
+        key, expire_timestamp = row
+        if expire_timestamp is not None and time.time() >= expire_timestamp:
+            return None
+        return key
+
+    def set(self, kid: str, key: str) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO keys (kid, key, expire_timestamp) "
+                "VALUES (?, ?, ?)",
+                (
+                    kid,
+                    key,
+                    time.time() + self.expiry if self.expiry is not None else None,
+                ),
+            )
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class LibraryIndex:
+    FILE_EXTENSIONS = (".m4a", ".m4v")
+
+    def __init__(self, library_index_path: Path, profile: str = None):
+        self.library_index_path = library_index_path
+        self.profile = profile
+        self._lock = threading.Lock()
+        self._set_connection()
+
+    def _set_connection(self):
+        self.library_index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.library_index_path,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            "track_id TEXT PRIMARY KEY, "
+            "isrc TEXT, "
+            "path TEXT NOT NULL, "
+            "has_synced_lyrics INTEGER, "
+            "profile TEXT)"
+        )
+        columns = {
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(tracks)").fetchall()
+        }
+        for column, column_type in (
+            ("has_synced_lyrics", "INTEGER"),
+            ("profile", "TEXT"),
+        ):
+            if column not in columns:
+                self.connection.execute(
+                    f"ALTER TABLE tracks ADD COLUMN {column} {column_type}"
+                )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS tracks_isrc ON tracks (isrc)"
+        )
+
+    def get(
+        self,
+        track_id: str,
+        isrc: str = None,
+        root_path: Path = None,
+    ) -> tuple[Path, bool | None] | None:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT track_id, path, has_synced_lyrics FROM tracks "
+                "WHERE (track_id = ? OR isrc = ?) AND profile IS ?",
+                (track_id, isrc, self.profile),
+            ).fetchall()
+        for row_track_id, path, has_synced_lyrics in sorted(
+            rows, key=lambda row: row[0] != track_id
+        ):
+            path = Path(path)
+            if root_path is not None and not self.is_relative_to(path, root_path):
+                continue
+            if path.exists():
+                return path, (
+                    bool(has_synced_lyrics) if has_synced_lyrics is not None else None
+                )
+            self.remove(row_track_id)
+        return None
+
+    def add(
+        self,
+        track_id: str,
+        isrc: str | None,
+        path: Path,
+        has_synced_lyrics: bool = None,
+    ) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO tracks "
+                "(track_id, isrc, path, has_synced_lyrics, profile) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    track_id,
+                    isrc,
+                    str(path.absolute()),
+                    has_synced_lyrics,
+                    self.profile,
+                ),
+            )
+
+    def remove(self, track_id: str) -> None:
+        with self._lock:
+            self.connection.execute(
+                "DELETE FROM tracks WHERE track_id = ?",
+                (track_id,),
+            )
+
+    @staticmethod
+    def get_profile(*settings) -> str:
+        return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def is_relative_to(path: Path, root_path: Path) -> bool:
+        try:
+            path.relative_to(root_path.absolute())
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def get_track_id_from_url(url: str) -> str:
+        return url.rstrip("/").split("/")[-1].split("?")[0]
+
+    def get_file_ids(self, path: Path) -> tuple[str | None, str | None]:
+        from mutagen.mp4 import MP4
+
+        tags = MP4(path).tags or {}
+        url = next(iter(tags.get("\xa9url", [])), None)
+        isrc = next(iter(tags.get("----:com.apple.iTunes:ISRC", [])), None)
+        return (
+            self.get_track_id_from_url(url) if url else None,
+            bytes(isrc).decode("utf-8") if isrc else None,
+        )
+
+    def rebuild(self, root_path: Path) -> int:
+        entries = []
+        for path in root_path.rglob("*"):
+            if path.suffix not in self.FILE_EXTENSIONS or not path.is_file():
+                continue
+            try:
+                track_id, isrc = self.get_file_ids(path)
+            except Exception:
+                continue
+            if track_id:
+                entries.append(
+                    (
+                        track_id,
+                        isrc,
+                        str(path.absolute()),
+                        True if path.with_suffix(".lrc").exists() else None,
+                        self.profile,
+                    )
+                )
+        with self._lock:
+            self.connection.execute("BEGIN")
+            self.connection.execute("DELETE FROM tracks")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO tracks "
+                "(track_id, isrc, path, has_synced_lyrics, profile) "
+                "VALUES (?, ?, ?, ?, ?)",
+                entries,
+            )
+            self.connection.execute("COMMIT")
+        return len(entries)
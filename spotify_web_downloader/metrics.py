@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class MetricRecord:
+    stage: str
+    duration: float = None
+    bytes: int = 0
+    outcome: str = "ok"
+    timestamp: float = None
+
+
+@dataclass
+class StageSummary:
+    stage: str
+    count: int
+    errors: int
+    total_duration: float
+    p50: float
+    p95: float
+    bytes: int
+
+    @property
+    def megabytes_per_second(self) -> float | None:
+        if not self.bytes or not self.total_duration:
+            return None
+        return self.bytes / 1024 / 1024 / self.total_duration
+
+
+class Metrics:
+    PROMETHEUS_PREFIX = "spotify_web_downloader"
+
+    def __init__(self, metrics_path: Path = None):
+        self.metrics_path = metrics_path
+        self.start_timestamp = time.time()
+        self._lock = threading.Lock()
+        self._records = collections.defaultdict(list)
+        self._set_metrics_file()
+
+    def _set_metrics_file(self):
+        if self.metrics_path is None:
+            self.metrics_file = None
+            return
+        self.metrics_path.parent.mkdir(parents=True, exist_ok=True)
+        self.metrics_file = self.metrics_path.open("a", encoding="utf-8")
+
+    def add(self, record: MetricRecord) -> None:
+        with self._lock:
+            self._records[record.stage].append(record)
+            if self.metrics_file is not None:
+                self.metrics_file.write(
+                    json.dumps(
+                        {
+                            "timestamp": record.timestamp,
+                            "stage": record.stage,
+                            "duration": record.duration,
+                            "bytes": record.bytes,
+                            "outcome": record.outcome,
+                        }
+                    )
+                    + "\n"
+                )
+                self.metrics_file.flush()
+
+    @contextlib.contextmanager
+    def measure(self, stage: str) -> typing.Generator[MetricRecord, None, None]:
+        record = MetricRecord(stage=stage, timestamp=time.time())
+        start_time = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.outcome = "error"
+            raise
+        finally:
+            record.duration = time.perf_counter() - start_time
+            self.add(record)
+
+    @staticmethod
+    def get_percentile(sorted_values: list[float], percentile: float) -> float:
+        return sorted_values[
+            max(0, math.ceil(percentile / 100 * len(sorted_values)) - 1)
+        ]
+
+    def get_summary(self) -> list[StageSummary]:
+        with self._lock:
+            records = {stage: list(records) for stage, records in self._records.items()}
+        summary = []
+        for stage, stage_records in sorted(records.items()):
+            durations = sorted(record.duration for record in stage_records)
+            summary.append(
+                StageSummary(
+                    stage=stage,
+                    count=len(stage_records),
+                    errors=sum(
+                        1 for record in stage_records if record.outcome == "error"
+                    ),
+                    total_duration=sum(durations),
+                    p50=self.get_percentile(durations, 50),
+                    p95=self.get_percentile(durations, 95),
+                    bytes=sum(record.bytes for record in stage_records),
+                )
+            )
+        return summary
+
+    def get_summary_lines(self) -> list[str]:
+        lines = [
+            f"{'Stage':<28} {'Count':>6} {'Errors':>6} {'p50 (s)':>9} "
+            f"{'p95 (s)':>9} {'Total (s)':>10} {'MB':>9} {'MB/s':>8}"
+        ]
+        for stage_summary in self.get_summary():
+            megabytes_per_second = stage_summary.megabytes_per_second
+            lines.append(
+                f"{stage_summary.stage:<28} {stage_summary.count:>6} "
+                f"{stage_summary.errors:>6} {stage_summary.p50:>9.3f} "
+                f"{stage_summary.p95:>9.3f} {stage_summary.total_duration:>10.2f} "
+                f"{stage_summary.bytes / 1024 / 1024:>9.1f} "
+                + (
+                    f"{megabytes_per_second:>8.2f}"
+                    if megabytes_per_second is not None
+                    else f"{'-':>8}"
+                )
+            )
+        lines.append(f"Elapsed: {time.time() - self.start_timestamp:.2f} s")
+        return lines
+
+    def get_prometheus_lines(self) -> list[str]:
+        prefix = self.PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Duration of each stage.",
+            f"# TYPE {prefix}_stage_duration_seconds summary",
+        ]
+        summary = self.get_summary()
+        for stage_summary in summary:
+            labels = f'stage="{stage_summary.stage}"'
+            lines.extend(
+                (
+                    f'{prefix}_stage_duration_seconds{{{labels},quantile="0.5"}} '
+                    f"{stage_summary.p50}",
+                    f'{prefix}_stage_duration_seconds{{{labels},quantile="0.95"}} '
+                    f"{stage_summary.p95}",
+                    f"{prefix}_stage_duration_seconds_sum{{{labels}}} "
+                    f"{stage_summary.total_duration}",
+                    f"{prefix}_stage_duration_seconds_count{{{labels}}} "
+                    f"{stage_summary.count}",
+                )
+            )
+        lines.extend(
+            (
+                f"# HELP {prefix}_stage_bytes_total Bytes processed by each stage.",
+                f"# TYPE {prefix}_stage_bytes_total counter",
+            )
+        )
+        lines.extend(
+            f'{prefix}_stage_bytes_total{{stage="{stage_summary.stage}"}} '
+            f"{stage_summary.bytes}"
+            for stage_summary in summary
+        )
+        lines.extend(
+            (
+                f"# HELP {prefix}_stage_errors_total Failed runs of each stage.",
+                f"# TYPE {prefix}_stage_errors_total counter",
+            )
+        )
+        lines.extend(
+            f'{prefix}_stage_errors_total{{stage="{stage_summary.stage}"}} '
+            f"{stage_summary.errors}"
+            for stage_summary in summary
+        )
+        return lines
+
+    def write_prometheus(self, prometheus_path: Path) -> None:
+        prometheus_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = prometheus_path.with_name(f"{prometheus_path.name}.tmp")
+        temp_path.write_text(
+            "\n".join(self.get_prometheus_lines()) + "\n",
+            encoding="utf-8",
+        )
+        os.replace(temp_path, prometheus_path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self.metrics_file is not None:
+                self.metrics_file.close()
+                self.metrics_file = None
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import typing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .enums import JobState
 
 
 @dataclass
@@ -18,7 +22,8 @@ class UrlInfo:
 @dataclass
 class DownloadQueue:
     playlist_metadata: dict = None
-    tracks_metadata: list[dict] = None
+    tracks_metadata: typing.Iterable[dict] = None
+    tracks_total: int = None
 
 
 @dataclass
@@ -33,9 +38,48 @@ class VideoStreamInfo:
     file_type_video: str = None
     file_type_audio: str = None
     pssh: str = None
+    bitrate_video: int = None
+    bitrate_audio: int = None
 
 
 @dataclass
 class VideoM3U8:
     video: str = None
     audio: str = None
+
+
+@dataclass
+class UrlJob:
+    index: int = None
+    url: str = None
+    url_info: UrlInfo = None
+    download_queue: DownloadQueue = None
+    track_ids: list[str] = None
+    jobs_pending: int = 0
+    error_count: int = 0
+    is_queued: bool = False
+    playlist_file_paths: set[Path] = field(default_factory=set)
+
+
+@dataclass
+class TrackJob:
+    index: int = None
+    tracks_total: int = None
+    track_metadata: dict = None
+    playlist_metadata: dict = None
+    queue_progress: str = None
+    metadata_gid: dict = None
+    lyrics: Lyrics = None
+    tags: dict = None
+    final_path: Path = None
+    indexed_path: Path = None
+    lrc_path: Path = None
+    cover_path: Path = None
+    cover_url: str = None
+    download: bool = False
+    file_id: str = None
+    stream_info: VideoStreamInfo = None
+    decryption_key: str = None
+    remuxed_path: Path = None
+    journal_state: JobState = None
+    url_job: UrlJob = None
@@ -0,0 +1,868 @@
+from __future__ import annotations
+
+import struct
+import typing
+from dataclasses import dataclass, field
+
+CONTAINER_BOX_TYPES = {
+    b"dinf",
+    b"edts",
+    b"mdia",
+    b"minf",
+    b"moof",
+    b"moov",
+    b"mvex",
+    b"schi",
+    b"sinf",
+    b"stbl",
+    b"traf",
+    b"trak",
+}
+AUDIO_SAMPLE_ENTRY_TYPES = {b"enca", b"mp4a", b"ac-3", b"ec-3", b"fLaC", b"Opus"}
+SAMPLE_TABLE_BOX_TYPES = {
+    b"co64",
+    b"ctts",
+    b"saio",
+    b"saiz",
+    b"sbgp",
+    b"sgpd",
+    b"stco",
+    b"stsc",
+    b"stss",
+    b"stsz",
+    b"stts",
+    b"stz2",
+}
+SENC_USER_TYPE = bytes.fromhex("a2394f525a9b4f14a2446c427c648df4")
+FTYP_M4A = b"M4A \x00\x00\x02\x00M4A mp42isom"
+
+
+@dataclass
+class Mp4Box:
+    type: bytes
+    payload: bytes = b""
+    children: list[Mp4Box] = None
+
+    def find(self, box_type: bytes) -> Mp4Box | None:
+        return next(
+            (child for child in self.children or [] if child.type == box_type),
+            None,
+        )
+
+    def find_path(self, *box_types: bytes) -> Mp4Box | None:
+        box = self
+        for box_type in box_types:
+            box = box.find(box_type)
+            if box is None:
+                return None
+        return box
+
+    def render(self) -> bytes:
+        body = self.payload + b"".join(child.render() for child in self.children or [])
+        if len(body) + 8 > 0xFFFFFFFF:
+            return struct.pack(">I4sQ", 1, self.type, len(body) + 16) + body
+        return struct.pack(">I4s", len(body) + 8, self.type) + body
+
+
+@dataclass
+class Mp4TrackInfo:
+    track_id: int
+    timescale: int
+    movie_timescale: int
+    default_sample_duration: int = 0
+    default_sample_size: int = 0
+    default_per_sample_iv_size: int = 0
+    default_constant_iv: bytes = None
+    default_is_protected: bool = False
+
+
+@dataclass
+class Mp4Sample:
+    offset: int
+    size: int
+    duration: int
+    composition_offset: int = 0
+    iv: bytes = None
+    subsamples: list[tuple[int, int]] = field(default_factory=list)
+
+
+def iter_boxes(
+    data: bytes,
+    start: int = 0,
+    end: int = None,
+) -> typing.Generator[tuple[bytes, int, int, int], None, None]:
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, offset + 8)
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise ValueError(f"Truncated MP4 box {box_type!r} at offset {offset}")
+        yield box_type, offset, header_size, size
+        offset += size
+
+
+def parse_box(data: bytes, box_type: bytes, start: int, end: int) -> Mp4Box:
+    if box_type in CONTAINER_BOX_TYPES:
+        return Mp4Box(box_type, b"", parse_boxes(data, start, end))
+    if box_type == b"stsd":
+        return Mp4Box(
+            box_type,
+            bytes(data[start : start + 8]),
+            [
+                parse_sample_entry(
+                    data,
+                    entry_type,
+                    entry_offset + entry_header_size,
+                    entry_offset + entry_size,
+                )
+                for entry_type, entry_offset, entry_header_size, entry_size in iter_boxes(
+                    data, start + 8, end
+                )
+            ],
+        )
+    return Mp4Box(box_type, bytes(data[start:end]))
+
+
+def parse_boxes(data: bytes, start: int, end: int) -> list[Mp4Box]:
+    return [
+        parse_box(data, box_type, offset + header_size, offset + size)
+        for box_type, offset, header_size, size in iter_boxes(data, start, end)
+    ]
+
+
+def parse_sample_entry(
+    data: bytes,
+    entry_type: bytes,
+    start: int,
+    end: int,
+) -> Mp4Box:
+    if entry_type not in AUDIO_SAMPLE_ENTRY_TYPES:
+        return Mp4Box(entry_type, bytes(data[start:end]))
+    (sound_version,) = struct.unpack_from(">H", data, start + 8)
+    fields_size = 28 + {1: 16, 2: 36}.get(sound_version, 0)
+    return Mp4Box(
+        entry_type,
+        bytes(data[start : start + fields_size]),
+        parse_boxes(data, start + fields_size, end),
+    )
+
+
+def get_full_box_header(box: Mp4Box) -> tuple[int, int]:
+    version_flags = struct.unpack_from(">I", box.payload)[0]
+    return version_flags >> 24, version_flags & 0xFFFFFF
+
+
+def get_track_info(moov: Mp4Box) -> Mp4TrackInfo:
+    traks = [child for child in moov.children if child.type == b"trak"]
+    if len(traks) != 1:
+        raise ValueError(f"Expected a single track, found {len(traks)}")
+    trak = traks[0]
+    mvhd = moov.find(b"mvhd")
+    mvhd_version, _ = get_full_box_header(mvhd)
+    (movie_timescale,) = struct.unpack_from(
+        ">I", mvhd.payload, 20 if mvhd_version == 1 else 12
+    )
+    tkhd = trak.find(b"tkhd")
+    tkhd_version, _ = get_full_box_header(tkhd)
+    (track_id,) = struct.unpack_from(
+        ">I", tkhd.payload, 20 if tkhd_version == 1 else 12
+    )
+    mdhd = trak.find_path(b"mdia", b"mdhd")
+    mdhd_version, _ = get_full_box_header(mdhd)
+    (timescale,) = struct.unpack_from(
+        ">I", mdhd.payload, 20 if mdhd_version == 1 else 12
+    )
+    track_info = Mp4TrackInfo(track_id, timescale, movie_timescale)
+    mvex = moov.find(b"mvex")
+    trex = next(
+        (
+            child
+            for child in (mvex.children if mvex is not None else [])
+            if child.type == b"trex"
+            and struct.unpack_from(">I", child.payload, 4)[0] == track_id
+        ),
+        None,
+    )
+    if trex is not None:
+        (
+            track_info.default_sample_duration,
+            track_info.default_sample_size,
+        ) = struct.unpack_from(">II", trex.payload, 12)
+    sample_entry = get_sample_entry(trak)
+    sinf = sample_entry.find(b"sinf") if sample_entry.children else None
+    if sinf is None:
+        return track_info
+    schm = sinf.find(b"schm")
+    if schm is not None and schm.payload[4:8] != b"cenc":
+        raise ValueError(
+            f"Unsupported protection scheme {schm.payload[4:8].decode('latin-1')}"
+        )
+    tenc = sinf.find_path(b"schi", b"tenc")
+    is_protected, per_sample_iv_size = struct.unpack_from(">BB", tenc.payload, 6)
+    track_info.default_is_protected = bool(is_protected)
+    track_info.default_per_sample_iv_size = per_sample_iv_size
+    if is_protected and per_sample_iv_size == 0:
+        constant_iv_size = tenc.payload[24]
+        track_info.default_constant_iv = tenc.payload[25 : 25 + constant_iv_size]
+    return track_info
+
+
+def get_sample_entry(trak: Mp4Box) -> Mp4Box:
+    stsd = trak.find_path(b"mdia", b"minf", b"stbl", b"stsd")
+    if stsd is None or not stsd.children:
+        raise ValueError("Track has no sample description")
+    return stsd.children[0]
+
+
+def parse_sample_encryption(
+    payload: bytes,
+    offset: int,
+    sample_count: int,
+    per_sample_iv_size: int,
+    has_subsamples: bool,
+) -> list[tuple[bytes, list[tuple[int, int]]]]:
+    sample_encryption = []
+    for _ in range(sample_count):
+        iv = bytes(payload[offset : offset + per_sample_iv_size])
+        offset += per_sample_iv_size
+        subsamples = []
+        if has_subsamples:
+            (subsample_count,) = struct.unpack_from(">H", payload, offset)
+            offset += 2
+            for _ in range(subsample_count):
+                subsamples.append(struct.unpack_from(">HI", payload, offset))
+                offset += 6
+        sample_encryption.append((iv, subsamples))
+    return sample_encryption
+
+
+def get_traf_sample_encryption(
+    data: bytes,
+    base_data_offset: int,
+    traf: Mp4Box,
+    sample_count: int,
+    track_info: Mp4TrackInfo,
+    data_start: int = 0,
+) -> list[tuple[bytes, list[tuple[int, int]]]] | None:
+    senc = traf.find(b"senc") or next(
+        (
+            Mp4Box(b"senc", child.payload[16:])
+            for child in traf.children
+            if child.type == b"uuid" and child.payload[:16] == SENC_USER_TYPE
+        ),
+        None,
+    )
+    if senc is not None:
+        _, flags = get_full_box_header(senc)
+        (senc_sample_count,) = struct.unpack_from(">I", senc.payload, 4)
+        return parse_sample_encryption(
+            senc.payload,
+            8,
+            min(senc_sample_count, sample_count),
+            track_info.default_per_sample_iv_size,
+            bool(flags & 0x2),
+        )
+    saiz = traf.find(b"saiz")
+    saio = traf.find(b"saio")
+    if saiz is None or saio is None:
+        return None
+    _, saiz_flags = get_full_box_header(saiz)
+    saiz_offset = 12 if saiz_flags & 0x1 else 4
+    default_sample_info_size, saiz_sample_count = struct.unpack_from(
+        ">BI", saiz.payload, saiz_offset
+    )
+    sample_info_sizes = (
+        [default_sample_info_size]
+        if default_sample_info_size
+        else saiz.payload[saiz_offset + 5 : saiz_offset + 5 + saiz_sample_count]
+    )
+    saio_version, saio_flags = get_full_box_header(saio)
+    saio_offset = 12 if saio_flags & 0x1 else 4
+    (aux_info_offset,) = struct.unpack_from(
+        ">Q" if saio_version == 1 else ">I", saio.payload, saio_offset + 4
+    )
+    return parse_sample_encryption(
+        data,
+        base_data_offset + aux_info_offset - data_start,
+        min(saiz_sample_count, sample_count),
+        track_info.default_per_sample_iv_size,
+        any(
+            sample_info_size > track_info.default_per_sample_iv_size
+            for sample_info_size in sample_info_sizes
+        ),
+    )
+
+
+def get_fragment_samples(
+    data: bytes,
+    moof_offset: int,
+    moof: Mp4Box,
+    track_info: Mp4TrackInfo,
+    data_start: int = 0,
+) -> list[Mp4Sample]:
+    samples = []
+    for traf in moof.children:
+        if traf.type != b"traf":
+            continue
+        tfhd = traf.find(b"tfhd")
+        _, tfhd_flags = get_full_box_header(tfhd)
+        (track_id,) = struct.unpack_from(">I", tfhd.payload, 4)
+        if track_id != track_info.track_id:
+            continue
+        tfhd_offset = 8
+        base_data_offset = moof_offset
+        if tfhd_flags & 0x1:
+            (base_data_offset,) = struct.unpack_from(">Q", tfhd.payload, tfhd_offset)
+            tfhd_offset += 8
+        if tfhd_flags & 0x2:
+            tfhd_offset += 4
+        default_sample_duration = track_info.default_sample_duration
+        if tfhd_flags & 0x8:
+            (default_sample_duration,) = struct.unpack_from(
+                ">I", tfhd.payload, tfhd_offset
+            )
+            tfhd_offset += 4
+        default_sample_size = track_info.default_sample_size
+        if tfhd_flags & 0x10:
+            (default_sample_size,) = struct.unpack_from(">I", tfhd.payload, tfhd_offset)
+        traf_samples = []
+        data_offset = base_data_offset
+        for trun in traf.children:
+            if trun.type != b"trun":
+                continue
+            trun_version, trun_flags = get_full_box_header(trun)
+            (sample_count,) = struct.unpack_from(">I", trun.payload, 4)
+            trun_offset = 8
+            if trun_flags & 0x1:
+                (trun_data_offset,) = struct.unpack_from(
+                    ">i", trun.payload, trun_offset
+                )
+                data_offset = base_data_offset + trun_data_offset
+                trun_offset += 4
+            if trun_flags & 0x4:
+                trun_offset += 4
+            for _ in range(sample_count):
+                sample = Mp4Sample(
+                    data_offset,
+                    default_sample_size,
+                    default_sample_duration,
+                )
+                if trun_flags & 0x100:
+                    (sample.duration,) = struct.unpack_from(
+                        ">I", trun.payload, trun_offset
+                    )
+                    trun_offset += 4
+                if trun_flags & 0x200:
+                    (sample.size,) = struct.unpack_from(">I", trun.payload, trun_offset)
+                    trun_offset += 4
+                if trun_flags & 0x400:
+                    trun_offset += 4
+                if trun_flags & 0x800:
+                    (sample.composition_offset,) = struct.unpack_from(
+                        ">i" if trun_version == 1 else ">I",
+                        trun.payload,
+                        trun_offset,
+                    )
+                    trun_offset += 4
+                data_offset += sample.size
+                traf_samples.append(sample)
+        if track_info.default_is_protected:
+            sample_encryption = get_traf_sample_encryption(
+                data,
+                base_data_offset,
+                traf,
+                len(traf_samples),
+                track_info,
+                data_start,
+            )
+            if sample_encryption is None:
+                raise ValueError("Encrypted fragment has no sample encryption info")
+            for sample, (iv, subsamples) in zip(traf_samples, sample_encryption):
+                sample.iv = iv or track_info.default_constant_iv
+                sample.subsamples = subsamples
+        samples.extend(traf_samples)
+    return samples
+
+
+def decrypt_sample(sample_data: bytes, key: bytes, sample: Mp4Sample) -> bytes:
+    if sample.iv is None:
+        return bytes(sample_data)
+    from Crypto.Cipher import AES
+
+    cipher = AES.new(
+        key,
+        AES.MODE_CTR,
+        nonce=b"",
+        initial_value=sample.iv.ljust(16, b"\x00"),
+    )
+    if not sample.subsamples:
+        return cipher.decrypt(sample_data)
+    decrypted_sample = bytearray()
+    offset = 0
+    for clear_size, protected_size in sample.subsamples:
+        decrypted_sample += sample_data[offset : offset + clear_size]
+        offset += clear_size
+        decrypted_sample += cipher.decrypt(
+            sample_data[offset : offset + protected_size]
+        )
+        offset += protected_size
+    decrypted_sample += sample_data[offset:]
+    return bytes(decrypted_sample)
+
+
+def get_decrypted_sample_entry(sample_entry: Mp4Box) -> Mp4Box:
+    sinf = sample_entry.find(b"sinf") if sample_entry.children else None
+    if sinf is None:
+        return sample_entry
+    return Mp4Box(
+        sinf.find(b"frma").payload[:4],
+        sample_entry.payload,
+        [child for child in sample_entry.children if child.type != b"sinf"],
+    )
+
+
+def get_duration_box(box: Mp4Box, duration: int, duration_offsets: tuple[int, int]):
+    version, _ = get_full_box_header(box)
+    payload = bytearray(box.payload)
+    if version == 1:
+        struct.pack_into(">Q", payload, duration_offsets[1], duration)
+    else:
+        struct.pack_into(">I", payload, duration_offsets[0], min(duration, 0xFFFFFFFF))
+    return Mp4Box(box.type, bytes(payload), box.children)
+
+
+def get_edts(edts: Mp4Box, movie_duration: int, track_info: Mp4TrackInfo) -> Mp4Box:
+    elst = edts.find(b"elst")
+    if elst is None:
+        return edts
+    version, _ = get_full_box_header(elst)
+    entry_format = ">QqHH" if version == 1 else ">IiHH"
+    entry_size = struct.calcsize(entry_format)
+    (entry_count,) = struct.unpack_from(">I", elst.payload, 4)
+    payload = bytearray(elst.payload)
+    for entry_index in range(entry_count):
+        entry_offset = 8 + entry_index * entry_size
+        segment_duration, media_time, rate_integer, rate_fraction = struct.unpack_from(
+            entry_format, payload, entry_offset
+        )
+        if segment_duration == 0 and media_time >= 0:
+            segment_duration = max(
+                0,
+                movie_duration
+                - media_time * track_info.movie_timescale // track_info.timescale,
+            )
+            struct.pack_into(
+                entry_format,
+                payload,
+                entry_offset,
+                segment_duration,
+                media_time,
+                rate_integer,
+                rate_fraction,
+            )
+    return Mp4Box(
+        b"edts",
+        children=[
+            Mp4Box(b"elst", bytes(payload)) if child.type == b"elst" else child
+            for child in edts.children
+        ],
+    )
+
+
+def get_run_length_entries(values: typing.Iterable) -> list[list]:
+    entries = []
+    for value in values:
+        if entries and entries[-1][1] == value:
+            entries[-1][0] += 1
+        else:
+            entries.append([1, value])
+    return entries
+
+
+def get_sample_table_boxes(
+    chunks: list[list[Mp4Sample]],
+    chunk_offsets: list[int],
+) -> list[Mp4Box]:
+    samples = [sample for chunk in chunks for sample in chunk]
+    stts_entries = get_run_length_entries(sample.duration for sample in samples)
+    sample_table_boxes = [
+        Mp4Box(
+            b"stts",
+            struct.pack(">II", 0, len(stts_entries))
+            + b"".join(struct.pack(">II", *entry) for entry in stts_entries),
+        )
+    ]
+    if any(sample.composition_offset for sample in samples):
+        ctts_entries = get_run_length_entries(
+            sample.composition_offset for sample in samples
+        )
+        sample_table_boxes.append(
+            Mp4Box(
+                b"ctts",
+                struct.pack(">II", 1 << 24, len(ctts_entries))
+                + b"".join(struct.pack(">Ii", *entry) for entry in ctts_entries),
+            )
+        )
+    stsc_entries = []
+    for chunk_index, chunk in enumerate(chunks, 1):
+        if not stsc_entries or stsc_entries[-1][1] != len(chunk):
+            stsc_entries.append((chunk_index, len(chunk)))
+    sample_table_boxes.append(
+        Mp4Box(
+            b"stsc",
+            struct.pack(">II", 0, len(stsc_entries))
+            + b"".join(
+                struct.pack(">III", first_chunk, samples_per_chunk, 1)
+                for first_chunk, samples_per_chunk in stsc_entries
+            ),
+        )
+    )
+    sample_table_boxes.append(
+        Mp4Box(
+            b"stsz",
+            struct.pack(">III", 0, 0, len(samples))
+            + struct.pack(f">{len(samples)}I", *(sample.size for sample in samples)),
+        )
+    )
+    if chunk_offsets and chunk_offsets[-1] > 0xFFFFFFFF:
+        sample_table_boxes.append(
+            Mp4Box(
+                b"co64",
+                struct.pack(">II", 0, len(chunk_offsets))
+                + struct.pack(f">{len(chunk_offsets)}Q", *chunk_offsets),
+            )
+        )
+    else:
+        sample_table_boxes.append(
+            Mp4Box(
+                b"stco",
+                struct.pack(">II", 0, len(chunk_offsets))
+                + struct.pack(f">{len(chunk_offsets)}I", *chunk_offsets),
+            )
+        )
+    return sample_table_boxes
+
+
+def get_faststart_moov(
+    moov: Mp4Box,
+    track_info: Mp4TrackInfo,
+    chunks: list[list[Mp4Sample]],
+    chunk_offsets: list[int],
+    udta: Mp4Box | None,
+) -> Mp4Box:
+    duration = sum(sample.duration for chunk in chunks for sample in chunk)
+    movie_duration = duration * track_info.movie_timescale // track_info.timescale
+    trak = moov.find(b"trak")
+    mdia = trak.find(b"mdia")
+    minf = mdia.find(b"minf")
+    stbl = minf.find(b"stbl")
+    stsd = stbl.find(b"stsd")
+    stbl = Mp4Box(
+        b"stbl",
+        children=[
+            Mp4Box(
+                b"stsd",
+                stsd.payload,
+                [get_decrypted_sample_entry(entry) for entry in stsd.children],
+            ),
+            *(
+                child
+                for child in stbl.children
+                if child.type not in SAMPLE_TABLE_BOX_TYPES and child.type != b"stsd"
+            ),
+            *get_sample_table_boxes(chunks, chunk_offsets),
+        ],
+    )
+    minf = Mp4Box(
+        b"minf",
+        children=[stbl if child.type == b"stbl" else child for child in minf.children],
+    )
+    mdia = Mp4Box(
+        b"mdia",
+        children=[
+            (
+                get_duration_box(child, duration, (16, 24))
+                if child.type == b"mdhd"
+                else minf if child.type == b"minf" else child
+            )
+            for child in mdia.children
+        ],
+    )
+    trak = Mp4Box(
+        b"trak",
+        children=[
+            (
+                get_duration_box(child, movie_duration, (20, 28))
+                if child.type == b"tkhd"
+                else (
+                    mdia
+                    if child.type == b"mdia"
+                    else (
+                        get_edts(child, movie_duration, track_info)
+                        if child.type == b"edts"
+                        else child
+                    )
+                )
+            )
+            for child in trak.children
+        ],
+    )
+    return Mp4Box(
+        b"moov",
+        children=[
+            (
+                get_duration_box(child, movie_duration, (16, 24))
+                if child.type == b"mvhd"
+                else trak if child.type == b"trak" else child
+            )
+            for child in moov.children
+            if child.type not in (b"mvex", b"pssh", b"udta")
+        ]
+        + ([udta] if udta is not None else []),
+    )
+
+
+class Mp4Decrypter:
+    def __init__(self, key: bytes, output: typing.BinaryIO = None):
+        self.key = key
+        self.output = output
+        self.moov = None
+        self.track_info = None
+        self.chunks = []
+        self.chunks_data = []
+        self.chunk_offsets = []
+        self._mdat_offset = None
+        self._mdat_size = 0
+        self._buffer = bytearray()
+        self._buffer_offset = 0
+        self._position = 0
+        self._moof = None
+
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) - self._position >= 8:
+            size, box_type = struct.unpack_from(">I4s", self._buffer, self._position)
+            header_size = 8
+            if size == 1:
+                if len(self._buffer) - self._position < 16:
+                    break
+                (size,) = struct.unpack_from(">Q", self._buffer, self._position + 8)
+                header_size = 16
+            if size < header_size:
+                raise ValueError(
+                    f"Invalid MP4 box {box_type!r} at offset "
+                    f"{self._buffer_offset + self._position}"
+                )
+            if len(self._buffer) - self._position < size:
+                break
+            start = self._position + header_size
+            end = self._position + size
+            if box_type == b"moov":
+                self.moov = parse_box(self._buffer, box_type, start, end)
+                self.track_info = get_track_info(self.moov)
+            elif box_type == b"moof":
+                self._moof = (
+                    self._position,
+                    parse_box(self._buffer, box_type, start, end),
+                )
+            elif box_type == b"mdat" and self._moof is not None:
+                self._add_fragment()
+            self._position = end
+            if self._moof is None:
+                del self._buffer[: self._position]
+                self._buffer_offset += self._position
+                self._position = 0
+
+    def _add_fragment(self):
+        if self.track_info is None:
+            raise ValueError("MP4 fragment found before the moov box")
+        moof_position, moof = self._moof
+        samples = get_fragment_samples(
+            self._buffer,
+            self._buffer_offset + moof_position,
+            moof,
+            self.track_info,
+            self._buffer_offset,
+        )
+        self._moof = None
+        if not samples:
+            return
+        self.chunks.append(samples)
+        chunk_data = b"".join(
+            decrypt_sample(
+                self._buffer[
+                    sample.offset
+                    - self._buffer_offset : sample.offset
+                    - self._buffer_offset
+                    + sample.size
+                ],
+                self.key,
+                sample,
+            )
+            for sample in samples
+        )
+        if self.output is None:
+            self.chunks_data.append(chunk_data)
+            return
+        if self._mdat_offset is None:
+            self.output.write(Mp4Box(b"ftyp", FTYP_M4A).render())
+            self._mdat_offset = self.output.tell()
+            self.output.write(struct.pack(">I4sQ", 1, b"mdat", 0))
+        self.chunk_offsets.append(self._mdat_offset + 16 + self._mdat_size)
+        self.output.write(chunk_data)
+        self._mdat_size += len(chunk_data)
+
+    def _check_complete(self) -> None:
+        if self.moov is None:
+            raise ValueError("MP4 has no moov box")
+        if self._moof is not None or self._buffer:
+            raise ValueError("MP4 is truncated")
+        if not self.chunks:
+            raise ValueError("MP4 is not fragmented")
+
+    def write_moov(self, udta: Mp4Box | None = None) -> None:
+        if self.output is None:
+            raise ValueError("MP4 samples were not written to an output")
+        self._check_complete()
+        mdat_end = self.output.tell()
+        self.output.seek(self._mdat_offset + 8)
+        self.output.write(struct.pack(">Q", self._mdat_size + 16))
+        self.output.seek(mdat_end)
+        self.output.write(self._get_faststart_moov(self.chunk_offsets, udta))
+
+    def write_faststart(
+        self,
+        output: typing.BinaryIO,
+        udta: Mp4Box | None = None,
+    ) -> None:
+        if self.output is not None:
+            raise ValueError("MP4 samples were already written to an output")
+        self._check_complete()
+        mdat_size = sum(len(chunk_data) for chunk_data in self.chunks_data)
+        mdat_header = (
+            struct.pack(">I4sQ", 1, b"mdat", mdat_size + 16)
+            if mdat_size + 8 > 0xFFFFFFFF
+            else struct.pack(">I4s", mdat_size + 8, b"mdat")
+        )
+        ftyp = Mp4Box(b"ftyp", FTYP_M4A).render()
+        moov_size = len(self._get_faststart_moov([0] * len(self.chunks), udta))
+        for _ in range(2):
+            chunk_offsets = []
+            chunk_offset = len(ftyp) + moov_size + len(mdat_header)
+            for chunk_data in self.chunks_data:
+                chunk_offsets.append(chunk_offset)
+                chunk_offset += len(chunk_data)
+            faststart_moov = self._get_faststart_moov(chunk_offsets, udta)
+            if len(faststart_moov) == moov_size:
+                break
+            moov_size = len(faststart_moov)
+        output.write(ftyp)
+        output.write(faststart_moov)
+        output.write(mdat_header)
+        for chunk_data in self.chunks_data:
+            output.write(chunk_data)
+
+    def _get_faststart_moov(self, chunk_offsets: list[int], udta: Mp4Box | None):
+        return get_faststart_moov(
+            self.moov,
+            self.track_info,
+            self.chunks,
+            chunk_offsets,
+            udta,
+        ).render()
+
+
+def write_decrypted_faststart(
+    data: bytes,
+    output: typing.BinaryIO,
+    key: bytes,
+    udta: Mp4Box | None = None,
+) -> None:
+    mp4_decrypter = Mp4Decrypter(key)
+    mp4_decrypter.feed(data)
+    mp4_decrypter.write_faststart(output, udta)
+
+
+def get_ilst_data_box(data_type: int, value: bytes) -> Mp4Box:
+    return Mp4Box(b"data", struct.pack(">II", data_type, 0) + value)
+
+
+def get_ilst_item(name: str, values: list) -> Mp4Box:
+    if name.startswith("----:"):
+        _, mean, item_name = name.split(":", 2)
+        return Mp4Box(
+            b"----",
+            children=[
+                Mp4Box(b"mean", b"\x00\x00\x00\x00" + mean.encode("utf-8")),
+                Mp4Box(b"name", b"\x00\x00\x00\x00" + item_name.encode("utf-8")),
+                *(
+                    get_ilst_data_box(getattr(value, "dataformat", 1), bytes(value))
+                    for value in values
+                ),
+            ],
+        )
+    box_type = name.encode("latin-1")
+    if name in ("trkn", "disk"):
+        number, total = values[0]
+        data_boxes = [
+            get_ilst_data_box(
+                0,
+                struct.pack(">HHH", 0, number, total)
+                + (b"\x00\x00" if name == "trkn" else b""),
+            )
+        ]
+    elif name == "covr":
+        data_boxes = [
+            get_ilst_data_box(getattr(value, "imageformat", 13), bytes(value))
+            for value in values
+        ]
+    elif isinstance(values, bool):
+        data_boxes = [get_ilst_data_box(21, struct.pack(">B", values))]
+    elif isinstance(values[0], int):
+        data_boxes = [
+            get_ilst_data_box(
+                21,
+                (
+                    struct.pack(">b", value)
+                    if -128 <= value < 128
+                    else struct.pack(">i", value)
+                ),
+            )
+            for value in values
+        ]
+    else:
+        data_boxes = [
+            get_ilst_data_box(1, str(value).encode("utf-8")) for value in values
+        ]
+    return Mp4Box(box_type, children=data_boxes)
+
+
+def get_udta(mp4_tags: dict) -> Mp4Box:
+    return Mp4Box(
+        b"udta",
+        children=[
+            Mp4Box(
+                b"meta",
+                b"\x00\x00\x00\x00",
+                [
+                    Mp4Box(
+                        b"hdlr",
+                        struct.pack(">II4s", 0, 0, b"mdir") + b"appl" + b"\x00" * 9,
+                    ),
+                    Mp4Box(
+                        b"ilst",
+                        children=[
+                            get_ilst_item(name, values)
+                            for name, values in mp4_tags.items()
+                        ],
+                    ),
+                ],
+            )
+        ],
+    )
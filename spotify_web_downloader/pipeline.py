@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage:
+    def __init__(
+        self,
+        func: typing.Callable[[typing.Any], typing.Any],
+        workers: int = 1,
+        queue_size: int = None,
+        batch_size: int = None,
+    ):
+        self.func = func
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue_size = (
+            queue_size if queue_size is not None else workers * (batch_size or 1)
+        )
+
+
+class Pipeline:
+    _SENTINEL = object()
+    QUEUE_POLL_INTERVAL = 0.1
+
+    def __init__(
+        self,
+        stages: list[PipelineStage],
+        on_error: typing.Callable[[typing.Any, Exception], None] = None,
+        on_finish: typing.Callable[[typing.Any], None] = None,
+    ):
+        self.stages = stages
+        self.on_error = on_error
+        self.on_finish = on_finish
+        self._stop_event = threading.Event()
+
+    def run(self, items: typing.Iterable) -> None:
+        self._stop_event = threading.Event()
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        threads = [
+            [
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(
+                        stage,
+                        queues[stage_index],
+                        (
+                            queues[stage_index + 1]
+                            if stage_index + 1 < len(self.stages)
+                            else None
+                        ),
+                    ),
+                    daemon=True,
+                )
+                for _ in range(stage.workers)
+            ]
+            for stage_index, stage in enumerate(self.stages)
+        ]
+        for stage_threads in threads:
+            for thread in stage_threads:
+                thread.start()
+        try:
+            for item in items:
+                self._put(queues[0], item)
+            for stage_index, stage in enumerate(self.stages):
+                for _ in range(stage.workers):
+                    self._put(queues[stage_index], self._SENTINEL)
+                for thread in threads[stage_index]:
+                    thread.join()
+        except BaseException:
+            self._stop_event.set()
+            for stage_threads in threads:
+                for thread in stage_threads:
+                    thread.join()
+            raise
+
+    def _get(self, input_queue: queue.Queue) -> typing.Any:
+        while not self._stop_event.is_set():
+            try:
+                return input_queue.get(timeout=self.QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        return self._SENTINEL
+
+    def _put(self, output_queue: queue.Queue, item: typing.Any) -> None:
+        while not self._stop_event.is_set():
+            try:
+                output_queue.put(item, timeout=self.QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def _run_stage(
+        self,
+        stage: PipelineStage,
+        input_queue: queue.Queue,
+        output_queue: queue.Queue | None,
+    ) -> None:
+        while True:
+            item = self._get(input_queue)
+            if item is self._SENTINEL:
+                return
+            if stage.batch_size is None:
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    result = e
+                self._handle_result(item, result, output_queue)
+                continue
+            items = [item]
+            is_done = False
+            while len(items) < stage.batch_size:
+                try:
+                    item = input_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._SENTINEL:
+                    is_done = True
+                    break
+                items.append(item)
+            try:
+                results = stage.func(items)
+            except Exception as e:
+                results = [e] * len(items)
+            for item, result in zip(items, results):
+                self._handle_result(item, result, output_queue)
+            if is_done:
+                return
+
+    def _handle_result(
+        self,
+        item: typing.Any,
+        result: typing.Any,
+        output_queue: queue.Queue | None,
+    ) -> None:
+        if isinstance(result, Exception):
+            self._call_callback(self.on_error, item, result)
+            result = None
+        if result is not None and output_queue is not None:
+            self._put(output_queue, result)
+        else:
+            self._call_callback(self.on_finish, item)
+
+    @staticmethod
+    def _call_callback(callback: typing.Callable | None, *args) -> None:
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception("Pipeline callback failed")
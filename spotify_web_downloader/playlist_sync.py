@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class PlaylistSync:
+    def __init__(self, playlist_sync_path: Path):
+        self.playlist_sync_path = playlist_sync_path
+        self._lock = threading.Lock()
+        self._set_connection()
+
+    def _set_connection(self):
+        self.playlist_sync_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.playlist_sync_path,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS playlists ("
+            "playlist_id TEXT PRIMARY KEY, "
+            "snapshot_id TEXT NOT NULL, "
+            "track_ids TEXT NOT NULL, "
+            "update_timestamp REAL NOT NULL)"
+        )
+
+    def get(self, playlist_id: str) -> tuple[str, list[str]] | None:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT snapshot_id, track_ids FROM playlists WHERE playlist_id = ?",
+                (playlist_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        snapshot_id, track_ids = row
+        return snapshot_id, json.loads(track_ids)
+
+    def set(self, playlist_id: str, snapshot_id: str, track_ids: list[str]) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO playlists "
+                "(playlist_id, snapshot_id, track_ids, update_timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (playlist_id, snapshot_id, json.dumps(track_ids), time.time()),
+            )
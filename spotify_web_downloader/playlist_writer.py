@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class PlaylistWriter:
+    FLUSH_INTERVAL = 10
+    EXTM3U_HEADER = "#EXTM3U"
+    EXTINF_PREFIX = "#EXTINF:"
+
+    def __init__(
+        self,
+        playlist_file_path: Path,
+        output_path: Path,
+        extended: bool = False,
+    ):
+        self.playlist_file_path = playlist_file_path
+        self.output_path = output_path
+        self.extended = extended
+        self._lock = threading.Lock()
+        self.entries = self.read_entries() if playlist_file_path.exists() else []
+        self.is_dirty = False
+        self.flush_timestamp = time.time()
+
+    def read_entries(self) -> list[tuple[str | None, str] | None]:
+        entries = []
+        extinf = None
+        with self.playlist_file_path.open("r", encoding="utf8") as playlist_file:
+            for line in playlist_file:
+                line = line.rstrip("\n")
+                if line == self.EXTM3U_HEADER:
+                    continue
+                if line.startswith(self.EXTINF_PREFIX):
+                    extinf = line
+                    continue
+                entries.append((extinf, line) if line.strip() else None)
+                extinf = None
+        return entries
+
+    def get_relative_path(self, final_path: Path) -> str:
+        playlist_file_path_parent_parts_len = len(self.playlist_file_path.parent.parts)
+        output_path_parts_len = len(self.output_path.parts)
+        return Path(
+            ("../" * (playlist_file_path_parent_parts_len - output_path_parts_len)),
+            *final_path.parts[output_path_parts_len:],
+        ).as_posix()
+
+    def get_extinf(self, duration: int | None, title: str | None) -> str:
+        return (
+            f"{self.EXTINF_PREFIX}{duration if duration is not None else -1},"
+            f"{title or ''}"
+        )
+
+    def has_entry(self, playlist_track: int) -> bool:
+        with self._lock:
+            return (
+                playlist_track <= len(self.entries)
+                and self.entries[playlist_track - 1] is not None
+            )
+
+    def set_entry(
+        self,
+        playlist_track: int,
+        final_path: Path,
+        duration: int = None,
+        title: str = None,
+    ) -> None:
+        entry = (
+            self.get_extinf(duration, title),
+            self.get_relative_path(final_path),
+        )
+        with self._lock:
+            if len(self.entries) < playlist_track:
+                self.entries.extend(
+                    None for _ in range(playlist_track - len(self.entries))
+                )
+            self.entries[playlist_track - 1] = entry
+            self.is_dirty = True
+        if time.time() - self.flush_timestamp >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def reorder(self, track_ids_old: list[str], track_ids_new: list[str]) -> None:
+        with self._lock:
+            entries_by_track_id = {
+                track_id: entry
+                for track_id, entry in zip(track_ids_old, self.entries)
+                if entry is not None
+            }
+            self.entries = [
+                entries_by_track_id.get(track_id) for track_id in track_ids_new
+            ]
+            self.is_dirty = True
+
+    def get_lines(self) -> list[str]:
+        lines = [self.EXTM3U_HEADER] if self.extended else []
+        for entry in self.entries:
+            if entry is None:
+                lines.append("")
+                continue
+            extinf, path = entry
+            if self.extended and extinf is not None:
+                lines.append(extinf)
+            lines.append(path)
+        return lines
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self.is_dirty:
+                return
+            self.playlist_file_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.playlist_file_path.with_name(
+                f"{self.playlist_file_path.name}.tmp"
+            )
+            with temp_path.open("w", encoding="utf8") as playlist_file:
+                playlist_file.writelines(f"{line}\n" for line in self.get_lines())
+            os.replace(temp_path, self.playlist_file_path)
+            self.is_dirty = False
+            self.flush_timestamp = time.time()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import types
+import typing
+from pathlib import Path
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = []
+
+    def _get_profile(self) -> cProfile.Profile:
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = cProfile.Profile()
+            self._local.profile = profile
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def enable(self) -> None:
+        try:
+            self._get_profile().enable()
+        except ValueError:
+            # Python 3.12+ only allows one active profiler, which already sees
+            # every thread
+            pass
+
+    def disable(self) -> None:
+        self._get_profile().disable()
+
+    def wrap(self, func: typing.Callable) -> typing.Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.disable()
+
+        return wrapper
+
+    def get_stats(self) -> pstats.Stats | None:
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = None
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+
+    def get_stats_lines(self, count: int = 20) -> list[str]:
+        stats = self.get_stats()
+        if stats is None:
+            return []
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(count)
+        return stream.getvalue().strip().splitlines()
+
+    def dump(self, profile_path: Path) -> None:
+        stats = self.get_stats()
+        if stats is None:
+            return
+        profile_path.parent.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(profile_path)
+
+
+class Tracer:
+    def __init__(self):
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events = []
+        self._thread_ids = set()
+        self._start_time = time.perf_counter()
+
+    def get_timestamp(self) -> float:
+        return (time.perf_counter() - self._start_time) * 1_000_000
+
+    def add_span(
+        self,
+        name: str,
+        category: str,
+        start_timestamp: float,
+        end_timestamp: float,
+    ) -> None:
+        thread = threading.current_thread()
+        with self._lock:
+            if thread.ident not in self._thread_ids:
+                self._thread_ids.add(thread.ident)
+                self._events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self.pid,
+                        "tid": thread.ident,
+                        "args": {"name": thread.name},
+                    }
+                )
+            self._events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": start_timestamp,
+                    "dur": end_timestamp - start_timestamp,
+                    "pid": self.pid,
+                    "tid": thread.ident,
+                }
+            )
+
+    def wrap(
+        self,
+        func: typing.Callable,
+        name: str,
+        category: str,
+    ) -> typing.Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_timestamp = self.get_timestamp()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_span(name, category, start_timestamp, self.get_timestamp())
+
+        return wrapper
+
+    def instrument(self, obj: typing.Any) -> None:
+        category = type(obj).__name__
+        for name in dir(type(obj)):
+            if name.startswith("_") or not isinstance(
+                inspect.getattr_static(obj, name),
+                (types.FunctionType, staticmethod),
+            ):
+                continue
+            setattr(
+                obj,
+                name,
+                self.wrap(getattr(obj, name), f"{category}.{name}", category),
+            )
+
+    def write(self, trace_path: Path) -> None:
+        with self._lock:
+            events = list(self._events)
+        trace_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = trace_path.with_name(f"{trace_path.name}.tmp")
+        temp_path.write_text(
+            json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}),
+            encoding="utf-8",
+        )
+        os.replace(temp_path, trace_path)
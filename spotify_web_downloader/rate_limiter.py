@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        requests_per_second: float,
+        burst: int = 1,
+    ):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._timestamp = time.monotonic()
+        self._pause_timestamp = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, pause_time: float):
+        with self._lock:
+            self._pause_timestamp = max(
+                self._pause_timestamp,
+                time.monotonic() + pause_time,
+            )
+
+    def _reserve(self) -> tuple[float, bool]:
+        with self._lock:
+            timestamp_now = time.monotonic()
+            pause_wait_time = self._pause_timestamp - timestamp_now
+            if pause_wait_time > 0:
+                return pause_wait_time, False
+            self._tokens = min(
+                self.burst,
+                self._tokens
+                + (timestamp_now - self._timestamp) * self.requests_per_second,
+            )
+            self._timestamp = timestamp_now
+            self._tokens -= 1
+            return -self._tokens / self.requests_per_second, True
+
+    def acquire(self):
+        while True:
+            wait_time, is_reserved = self._reserve()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            if is_reserved:
+                return
+
+    async def acquire_async(self):
+        while True:
+            wait_time, is_reserved = self._reserve()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            if is_reserved:
+                return
+
+
+def get_url_rate_limiters(
+    budgets: dict[str, tuple[float, int]],
+    url_budgets: dict[str, str],
+) -> dict[str, RateLimiter]:
+    rate_limiters = {
+        budget: RateLimiter(requests_per_second, burst)
+        for budget, (requests_per_second, burst) in budgets.items()
+    }
+    return dict(
+        sorted(
+            (
+                (url_prefix, rate_limiters[budget])
+                for url_prefix, budget in url_budgets.items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+    )
+
+
+def get_url_rate_limiter(
+    url_rate_limiters: dict[str, RateLimiter],
+    url: str,
+) -> RateLimiter | None:
+    return next(
+        (
+            rate_limiter
+            for url_prefix, rate_limiter in url_rate_limiters.items()
+            if url.startswith(url_prefix)
+        ),
+        None,
+    )
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(
+        self,
+        rate_limiter: RateLimiter | None = None,
+        url_rate_limiters: dict[str, RateLimiter] = None,
+        **kwargs,
+    ):
+        self.rate_limiter = rate_limiter
+        self.url_rate_limiters = dict(
+            sorted(
+                (url_rate_limiters or {}).items(),
+                key=lambda item: len(item[0]),
+                reverse=True,
+            )
+        )
+        super().__init__(**kwargs)
+
+    def get_url_rate_limiter(self, url: str) -> RateLimiter | None:
+        return get_url_rate_limiter(self.url_rate_limiters, url)
+
+    def send(self, request, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        url_rate_limiter = self.get_url_rate_limiter(request.url)
+        if url_rate_limiter is not None:
+            url_rate_limiter.acquire()
+        return super().send(request, **kwargs)
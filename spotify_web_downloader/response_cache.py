@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import collections
+import functools
+import inspect
+import json
+import sqlite3
+import threading
+import time
+import typing
+from pathlib import Path
+
+MISSING = object()
+
+
+class ResponseCache:
+    DEFAULT_TTLS = {
+        "gid_metadata": 7 * 24 * 60 * 60,
+        "album": 30 * 24 * 60 * 60,
+        "track_credits": 30 * 24 * 60 * 60,
+        "lyrics": 30 * 24 * 60 * 60,
+    }
+
+    def __init__(
+        self,
+        ttls: dict[str, float] = None,
+        max_entries: int = 100000,
+    ):
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get_expire_timestamp(self, endpoint: str) -> float | None:
+        ttl = self.ttls.get(endpoint)
+        return time.time() + ttl if ttl is not None else None
+
+    def get(self, endpoint: str, key: str) -> typing.Any:
+        raise NotImplementedError
+
+    def set(self, endpoint: str, key: str, value: typing.Any) -> None:
+        raise NotImplementedError
+
+
+class MemoryResponseCache(ResponseCache):
+    def __init__(
+        self,
+        ttls: dict[str, float] = None,
+        max_entries: int = 1024,
+    ):
+        super().__init__(ttls, max_entries)
+        self._entries = collections.OrderedDict()
+
+    def get(self, endpoint: str, key: str) -> typing.Any:
+        with self._lock:
+            entry = self._entries.get((endpoint, key))
+            if entry is None:
+                return MISSING
+            value, expire_timestamp = entry
+            if expire_timestamp is not None and time.time() >= expire_timestamp:
+                del self._entries[(endpoint, key)]
+                return MISSING
+            self._entries.move_to_end((endpoint, key))
+        return json.loads(value)
+
+    def set(self, endpoint: str, key: str, value: typing.Any) -> None:
+        value = json.dumps(value)
+        with self._lock:
+            self._entries[(endpoint, key)] = (
+                value,
+                self.get_expire_timestamp(endpoint),
+            )
+            self._entries.move_to_end((endpoint, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SqliteResponseCache(ResponseCache):
+    EVICTION_INTERVAL = 100
+
+    def __init__(
+        self,
+        cache_path: Path,
+        ttls: dict[str, float] = None,
+        max_entries: int = 100000,
+    ):
+        super().__init__(ttls, max_entries)
+        self.cache_path = cache_path
+        self._writes = 0
+        self._set_connection()
+
+    def _set_connection(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.cache_path,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "endpoint TEXT NOT NULL, "
+            "key TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "expire_timestamp REAL, "
+            "access_timestamp REAL NOT NULL, "
+            "PRIMARY KEY (endpoint, key))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_access_timestamp "
+            "ON responses (access_timestamp)"
+        )
+        self._evict()
+
+    def _evict(self):
+        self.connection.execute(
+            "DELETE FROM responses WHERE expire_timestamp <= ?",
+            (time.time(),),
+        )
+        self.connection.execute(
+            "DELETE FROM responses WHERE rowid IN ("
+            "SELECT rowid FROM responses ORDER BY access_timestamp DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def get(self, endpoint: str, key: str) -> typing.Any:
+        timestamp_now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value, expire_timestamp FROM responses "
+                "WHERE endpoint = ? AND key = ?",
+                (endpoint, key),
+            ).fetchone()
+            if row is None:
+                return MISSING
+            value, expire_timestamp = row
+            if expire_timestamp is not None and timestamp_now >= expire_timestamp:
+                self.connection.execute(
+                    "DELETE FROM responses WHERE endpoint = ? AND key = ?",
+                    (endpoint, key),
+                )
+                return MISSING
+            self.connection.execute(
+                "UPDATE responses SET access_timestamp = ? "
+                "WHERE endpoint = ? AND key = ?",
+                (timestamp_now, endpoint, key),
+            )
+        return json.loads(value)
+
+    def set(self, endpoint: str, key: str, value: typing.Any) -> None:
+        value = json.dumps(value)
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(endpoint, key, value, expire_timestamp, access_timestamp) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    endpoint,
+                    key,
+                    value,
+                    self.get_expire_timestamp(endpoint),
+                    time.time(),
+                ),
+            )
+            self._writes += 1
+            if self._writes % self.EVICTION_INTERVAL == 0:
+                self._evict()
+
+
+def get_response_cache_key(args: typing.Iterable) -> str:
+    return json.dumps(list(args))
+
+
+def cached_response(endpoint: str) -> typing.Callable:
+    def decorator(func: typing.Callable) -> typing.Callable:
+        func_sig = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.response_cache is None:
+                return func(self, *args, **kwargs)
+            bound_args = func_sig.bind(self, *args, **kwargs)
+            bound_args.apply_defaults()
+            key = get_response_cache_key(list(bound_args.arguments.values())[1:])
+            value = self.response_cache.get(endpoint, key)
+            if value is MISSING:
+                value = func(self, *args, **kwargs)
+                self.response_cache.set(endpoint, key, value)
+            return value
+
+        return wrapper
+
+    return decorator
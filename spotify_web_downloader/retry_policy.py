@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import email.utils
+import random
+import time
+import typing
+
+from .enums import RetryAction
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff_time: float = 0.5,
+        max_backoff_time: float = 30,
+        status_codes: tuple[int, ...] = (429, 500, 502, 503, 504),
+    ):
+        self.max_retries = max_retries
+        self.backoff_time = backoff_time
+        self.max_backoff_time = max_backoff_time
+        self.status_codes = status_codes
+
+    def get_backoff_time(self, retry: int) -> float:
+        backoff_time = min(self.max_backoff_time, self.backoff_time * 2**retry)
+        return backoff_time / 2 + random.uniform(0, backoff_time / 2)
+
+    @staticmethod
+    def get_retry_after(headers: typing.Mapping[str, str]) -> float | None:
+        retry_after = headers.get("Retry-After")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(
+                0.0,
+                email.utils.parsedate_to_datetime(retry_after).timestamp()
+                - time.time(),
+            )
+        except (TypeError, ValueError):
+            return None
+
+    def get_action(
+        self,
+        retry: int,
+        status_code: int = None,
+        headers: typing.Mapping[str, str] = None,
+        can_refresh_auth: bool = False,
+    ) -> tuple[RetryAction, float]:
+        if status_code is None:
+            if retry == self.max_retries:
+                return RetryAction.STOP, 0.0
+            return RetryAction.RETRY, self.get_backoff_time(retry)
+        if status_code == 401 and can_refresh_auth:
+            return RetryAction.REFRESH_AUTH, 0.0
+        if status_code not in self.status_codes or retry == self.max_retries:
+            return RetryAction.STOP, 0.0
+        retry_after = self.get_retry_after(headers or {})
+        return RetryAction.RETRY, (
+            retry_after if retry_after is not None else self.get_backoff_time(retry)
+        )
@@ -1,16 +1,39 @@
 from __future__ import annotations
 
-import functools
+import asyncio
+import collections
+import hashlib
+import itertools
 import json
 import re
 import time
 import typing
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from http.cookiejar import MozillaCookieJar
 from pathlib import Path
 
 import base62
 import requests
 
+from .enums import RetryAction
+from .exceptions import NotFoundError
+from .metrics import Metrics
+from .rate_limiter import (
+    RateLimitedAdapter,
+    RateLimiter,
+    get_url_rate_limiter,
+    get_url_rate_limiters,
+)
+from .response_cache import (
+    MISSING,
+    MemoryResponseCache,
+    ResponseCache,
+    cached_response,
+    get_response_cache_key,
+)
+from .retry_policy import RetryPolicy
+from .token_manager import TokenManager
 from .utils import check_response
 
 
@@ -31,72 +54,229 @@ class SpotifyApi:
         "{file_id}?version=10000000&product=9&platform=39&alt=json"
     )
     METADATA_API_URL = "https://api.spotify.com/v1/{type}/{track_id}"
+    METADATA_BATCH_API_URL = "https://api.spotify.com/v1/{type}"
     PATHFINDER_API_URL = "https://api-partner.spotify.com/pathfinder/v1/query"
     TRACK_CREDITS_API_URL = "https://spclient.wg.spotify.com/track-credits-view/v0/experimental/{track_id}/credits"
-    EXTEND_TRACK_COLLECTION_WAIT_TIME = 0.5
+    EXTEND_TRACK_COLLECTION_MAX_WORKERS = 8
+    MAX_RETRIES = 5
+    RETRY_BACKOFF_TIME = 0.5
+    RETRY_MAX_BACKOFF_TIME = 30
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    TIMEOUT = 30
+    RATE_LIMIT_BUDGETS = {
+        "metadata": (10, 10),
+        "spclient": (20, 20),
+        "pathfinder": (5, 5),
+        "license": (5, 5),
+        "seektable": (20, 20),
+    }
+    RATE_LIMIT_URL_BUDGETS = {
+        "https://api.spotify.com/": "metadata",
+        "https://spclient.wg.spotify.com/": "spclient",
+        "https://gue1-spclient.spotify.com/": "spclient",
+        "https://gue1-spclient.spotify.com/widevine-license/": "license",
+        "https://api-partner.spotify.com/": "pathfinder",
+        "https://seektables.scdn.co/": "seektable",
+    }
+    REQUEST_STAGES = {
+        "https://open.spotify.com/": "api.home_page",
+        "https://spclient.wg.spotify.com/metadata/": "api.gid_metadata",
+        "https://spclient.wg.spotify.com/color-lyrics/": "api.lyrics",
+        "https://spclient.wg.spotify.com/track-credits-view/": "api.track_credits",
+        "https://gue1-spclient.spotify.com/manifests/": "api.video_manifest",
+        "https://gue1-spclient.spotify.com/widevine-license/": "api.widevine_license",
+        "https://gue1-spclient.spotify.com/storage-resolve/": "api.stream_url",
+        "https://api.spotify.com/": "api.metadata",
+        "https://api-partner.spotify.com/pathfinder/": "api.pathfinder",
+        "https://seektables.scdn.co/": "api.pssh",
+    }
+    CONNECTION_POOL_SIZE = 32
+    TRACKS_BATCH_SIZE = 50
+    ALBUMS_BATCH_SIZE = 20
+    GID_METADATA_PREFETCH_BATCH_SIZE = 200
+    HEADERS = {
+        "accept": "application/json",
+        "accept-language": "en-US",
+        "content-type": "application/json",
+        "origin": SPOTIFY_HOME_PAGE_URL,
+        "priority": "u=1, i",
+        "referer": SPOTIFY_HOME_PAGE_URL,
+        "sec-ch-ua": '"Not)A;Brand";v="99", "Google Chrome";v="127", "Chromium";v="127"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": '"Windows"',
+        "sec-fetch-dest": "empty",
+        "sec-fetch-mode": "cors",
+        "sec-fetch-site": "same-site",
+        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36",
+        "spotify-app-version": CLIENT_VERSION,
+        "app-platform": "WebPlayer",
+    }
 
     def __init__(
         self,
         cookies_path: Path | None = Path("./cookies.txt"),
+        requests_per_second: float = None,
+        response_cache: ResponseCache = None,
+        token_path: Path = None,
+        metrics: Metrics = None,
     ):
         self.cookies_path = cookies_path
+        self.requests_per_second = requests_per_second
+        self.response_cache = (
+            response_cache if response_cache is not None else MemoryResponseCache()
+        )
+        self.token_path = token_path
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._set_retry_policy()
+        self._set_rate_limiters()
         self._set_session()
 
+    def _set_retry_policy(self):
+        self.retry_policy = RetryPolicy(
+            self.MAX_RETRIES,
+            self.RETRY_BACKOFF_TIME,
+            self.RETRY_MAX_BACKOFF_TIME,
+            self.RETRY_STATUS_CODES,
+        )
+
+    def _set_rate_limiters(self):
+        self.rate_limiter = (
+            RateLimiter(self.requests_per_second) if self.requests_per_second else None
+        )
+        self.url_rate_limiters = get_url_rate_limiters(
+            self.RATE_LIMIT_BUDGETS,
+            self.RATE_LIMIT_URL_BUDGETS,
+        )
+
     def _set_session(self):
         self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            RateLimitedAdapter(
+                self.rate_limiter,
+                self.url_rate_limiters,
+                pool_connections=self.CONNECTION_POOL_SIZE,
+                pool_maxsize=self.CONNECTION_POOL_SIZE,
+            ),
+        )
         if self.cookies_path:
             cookies = MozillaCookieJar(self.cookies_path)
             cookies.load(ignore_discard=True, ignore_expires=True)
             self.session.cookies.update(cookies)
-        self.session.headers.update(
-            {
-                "accept": "application/json",
-                "accept-language": "en-US",
-                "content-type": "application/json",
-                "origin": self.SPOTIFY_HOME_PAGE_URL,
-                "priority": "u=1, i",
-                "referer": self.SPOTIFY_HOME_PAGE_URL,
-                "sec-ch-ua": '"Not)A;Brand";v="99", "Google Chrome";v="127", "Chromium";v="127"',
-                "sec-ch-ua-mobile": "?0",
-                "sec-ch-ua-platform": '"Windows"',
-                "sec-fetch-dest": "empty",
-                "sec-fetch-mode": "cors",
-                "sec-fetch-site": "same-site",
-                "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36",
-                "spotify-app-version": self.CLIENT_VERSION,
-                "app-platform": "WebPlayer",
-            }
-        )
+        self.session.headers.update(self.HEADERS)
         self._set_session_auth()
 
-    def _set_session_auth(self):
-        home_page = self.get_home_page()
-        self.session_info = json.loads(
+    @staticmethod
+    def parse_home_page(home_page: str) -> tuple[dict, dict]:
+        session_info = json.loads(
             re.search(
                 r'<script id="session" data-testid="session" type="application/json">(.+?)</script>',
                 home_page,
             ).group(1)
         )
-        self.config_info = json.loads(
+        config_info = json.loads(
             re.search(
                 r'<script id="config" data-testid="config" type="application/json">(.+?)</script>',
                 home_page,
             ).group(1)
         )
-        self.session.headers.update(
-            {
-                "Authorization": f"Bearer {self.session_info['accessToken']}",
-            }
+        return session_info, config_info
+
+    def get_session_info(self) -> tuple[dict, dict]:
+        return self.parse_home_page(self.get_home_page())
+
+    def get_cookies_digest(self) -> str | None:
+        sp_dc = self.session.cookies.get("sp_dc")
+        return hashlib.sha256(sp_dc.encode("utf-8")).hexdigest() if sp_dc else None
+
+    def _set_session_auth(self):
+        self.token_manager = TokenManager(
+            self.get_session_info,
+            self.token_path,
+            self.get_cookies_digest(),
         )
 
-    def _refresh_session_auth(self):
-        timestamp_session_expire = int(
-            self.session_info["accessTokenExpirationTimestampMs"]
+    @property
+    def session_info(self) -> dict:
+        self.token_manager.get_access_token()
+        return self.token_manager.session_info
+
+    @property
+    def config_info(self) -> dict:
+        return self.token_manager.get_config_info()
+
+    def get_request_stage(self, url: str) -> str:
+        return next(
+            (
+                stage
+                for url_prefix, stage in self.REQUEST_STAGES.items()
+                if url.startswith(url_prefix)
+            ),
+            "api.other",
         )
-        timestamp_now = time.time() * 1000
-        if timestamp_now < timestamp_session_expire:
-            return
-        self._set_session_auth()
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        refresh_session_auth: bool = True,
+        **kwargs,
+    ) -> requests.Response:
+        with self.metrics.measure(self.get_request_stage(url)) as metric_record:
+            response = self._send_request(method, url, refresh_session_auth, **kwargs)
+            metric_record.bytes = len(response.content)
+        return response
+
+    def _send_request(
+        self,
+        method: str,
+        url: str,
+        refresh_session_auth: bool = True,
+        **kwargs,
+    ) -> requests.Response:
+        is_access_token_refreshed = False
+        for retry in range(self.retry_policy.max_retries + 1):
+            if refresh_session_auth:
+                access_token = self.token_manager.get_access_token()
+                kwargs["headers"] = {
+                    **kwargs.get("headers", {}),
+                    "Authorization": f"Bearer {access_token}",
+                }
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    timeout=self.TIMEOUT,
+                    **kwargs,
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                retry_action, retry_time = self.retry_policy.get_action(retry)
+                if retry_action == RetryAction.STOP:
+                    raise
+                time.sleep(retry_time)
+                continue
+            retry_action, retry_time = self.retry_policy.get_action(
+                retry,
+                response.status_code,
+                response.headers,
+                refresh_session_auth and not is_access_token_refreshed,
+            )
+            if retry_action == RetryAction.STOP:
+                break
+            if retry_action == RetryAction.REFRESH_AUTH:
+                self.token_manager.refresh(expired_access_token=access_token)
+                is_access_token_refreshed = True
+                continue
+            if response.status_code == 429:
+                self.pause_url_rate_limiter(url, retry_time)
+            time.sleep(retry_time)
+        check_response(response)
+        return response
+
+    def pause_url_rate_limiter(self, url: str, pause_time: float) -> None:
+        url_rate_limiter = get_url_rate_limiter(self.url_rate_limiters, url)
+        if url_rate_limiter is not None:
+            url_rate_limiter.pause(pause_time)
 
     @staticmethod
     def track_id_to_gid(track_id: str) -> str:
@@ -106,87 +286,197 @@ class SpotifyApi:
     def gid_to_track_id(gid: str) -> str:
         return base62.encode(int(gid, 16), charset=base62.CHARSET_INVERTED).zfill(22)
 
+    @cached_response("gid_metadata")
     def get_gid_metadata(self, gid: str) -> dict:
-        self._refresh_session_auth()
-        response = self.session.get(self.GID_METADATA_API_URL.format(gid=gid))
-        check_response(response)
+        response = self._request("GET", self.GID_METADATA_API_URL.format(gid=gid))
         return response.json()
 
+    def prefetch_gid_metadata(self, gids: list[str]) -> None:
+        gids = [
+            gid
+            for gid in dict.fromkeys(gids)
+            if self.response_cache.get("gid_metadata", get_response_cache_key([gid]))
+            is MISSING
+        ]
+        if gids:
+            asyncio.run(self._prefetch_gid_metadata(gids))
+
+    async def _prefetch_gid_metadata(self, gids: list[str]) -> None:
+        from .spotify_api_async import AsyncSpotifyApi
+
+        async with AsyncSpotifyApi.from_spotify_api(self) as async_spotify_api:
+            gids_metadata = await asyncio.gather(
+                *(async_spotify_api.get_gid_metadata(gid) for gid in gids),
+                return_exceptions=True,
+            )
+        for gid, gid_metadata in zip(gids, gids_metadata):
+            if not isinstance(gid_metadata, Exception):
+                self.response_cache.set(
+                    "gid_metadata",
+                    get_response_cache_key([gid]),
+                    gid_metadata,
+                )
+
     def get_video_manifest(self, gid: str) -> dict:
-        self._refresh_session_auth()
-        response = self.session.get(self.VIDEO_MANIFEST_API_URL.format(gid=gid))
-        check_response(response)
+        response = self._request("GET", self.VIDEO_MANIFEST_API_URL.format(gid=gid))
         return response.json()
 
     def get_widevine_license_music(self, challenge: bytes) -> bytes:
-        self._refresh_session_auth()
-        response = self.session.post(
+        response = self._request(
+            "POST",
             self.WIDEVINE_LICENSE_API_URL.format(type="audio"),
-            challenge,
+            data=challenge,
         )
-        check_response(response)
         return response.content
 
     def get_widevine_license_video(self, challenge: bytes) -> bytes:
-        self._refresh_session_auth()
-        response = self.session.post(
+        response = self._request(
+            "POST",
             self.WIDEVINE_LICENSE_API_URL.format(type="video"),
-            challenge,
+            data=challenge,
         )
-        check_response(response)
         return response.content
 
+    @cached_response("lyrics")
     def get_lyrics(self, track_id: str) -> dict | None:
-        self._refresh_session_auth()
-        response = self.session.get(self.LYRICS_API_URL.format(track_id=track_id))
-        if response.status_code == 404:
+        try:
+            response = self._request(
+                "GET",
+                self.LYRICS_API_URL.format(track_id=track_id),
+            )
+        except NotFoundError:
             return None
-        check_response(response)
         return response.json()
 
     def get_pssh(self, file_id: str) -> str:
-        response = requests.get(self.PSSH_API_URL.format(file_id=file_id))
-        check_response(response)
+        response = self._request(
+            "GET",
+            self.PSSH_API_URL.format(file_id=file_id),
+            refresh_session_auth=False,
+        )
         return response.json()["pssh"]
 
     def get_stream_url(self, file_id: str) -> str:
-        self._refresh_session_auth()
-        response = self.session.get(self.STREAM_URL_API_URL.format(file_id=file_id))
-        check_response(response)
+        response = self._request("GET", self.STREAM_URL_API_URL.format(file_id=file_id))
         return response.json()["cdnurl"][0]
 
     def get_track(self, track_id: str) -> dict:
-        self._refresh_session_auth()
-        response = self.session.get(
-            self.METADATA_API_URL.format(type="tracks", track_id=track_id)
+        response = self._request(
+            "GET", self.METADATA_API_URL.format(type="tracks", track_id=track_id)
         )
-        check_response(response)
+        return response.json()
+
+    def get_metadata_batch(
+        self,
+        type: str,
+        ids: list[str],
+        batch_size: int,
+    ) -> list[dict | None]:
+        metadata_batch = []
+        for batch_index in range(0, len(ids), batch_size):
+            response = self._request(
+                "GET",
+                self.METADATA_BATCH_API_URL.format(type=type),
+                params={"ids": ",".join(ids[batch_index : batch_index + batch_size])},
+            )
+            metadata_batch.extend(response.json()[type])
+        return metadata_batch
+
+    def get_tracks(self, track_ids: list[str]) -> list[dict | None]:
+        return self.get_metadata_batch("tracks", track_ids, self.TRACKS_BATCH_SIZE)
+
+    def get_albums(
+        self,
+        album_ids: list[str],
+        extend: bool = True,
+    ) -> list[dict | None]:
+        albums = self.get_metadata_batch("albums", album_ids, self.ALBUMS_BATCH_SIZE)
+        for album_id, album in zip(album_ids, albums):
+            if album is None:
+                continue
+            if extend:
+                album["tracks"]["items"].extend(
+                    [
+                        item
+                        for extended_collection in self.extend_track_collection(album)
+                        for item in extended_collection["items"]
+                    ]
+                )
+            self.response_cache.set(
+                "album",
+                get_response_cache_key([album_id, extend]),
+                album,
+            )
+        return albums
+
+    @staticmethod
+    def get_track_collection_page_urls(track_collection: dict) -> list[str]:
+        tracks = track_collection["tracks"]
+        if tracks["next"] is None:
+            return []
+        next_url = urllib.parse.urlsplit(tracks["next"])
+        next_url_query = dict(urllib.parse.parse_qsl(next_url.query))
+        return [
+            next_url._replace(
+                query=urllib.parse.urlencode(
+                    {
+                        **next_url_query,
+                        "offset": offset,
+                        "limit": tracks["limit"],
+                    }
+                )
+            ).geturl()
+            for offset in range(
+                tracks["offset"] + tracks["limit"],
+                tracks["total"],
+                tracks["limit"],
+            )
+        ]
+
+    def get_track_collection_page(self, url: str) -> dict:
+        response = self._request("GET", url)
         return response.json()
 
     def extend_track_collection(
         self,
         track_collection: dict,
     ) -> typing.Generator[dict, None, None]:
-        next_url = track_collection["tracks"]["next"]
-        while next_url is not None:
-            response = self.session.get(next_url)
-            check_response(response)
-            extended_collection = response.json()
-            yield extended_collection
-            next_url = extended_collection["next"]
-            time.sleep(self.EXTEND_TRACK_COLLECTION_WAIT_TIME)
-
-    @functools.lru_cache()
+        page_urls = iter(self.get_track_collection_page_urls(track_collection))
+        with ThreadPoolExecutor(
+            max_workers=self.EXTEND_TRACK_COLLECTION_MAX_WORKERS
+        ) as executor:
+            page_futures = collections.deque(
+                executor.submit(self.get_track_collection_page, page_url)
+                for page_url in itertools.islice(
+                    page_urls, self.EXTEND_TRACK_COLLECTION_MAX_WORKERS
+                )
+            )
+            while page_futures:
+                extended_collection = page_futures.popleft().result()
+                page_url = next(page_urls, None)
+                if page_url is not None:
+                    page_futures.append(
+                        executor.submit(self.get_track_collection_page, page_url)
+                    )
+                yield extended_collection
+
+    def get_track_collection_items(
+        self,
+        track_collection: dict,
+    ) -> typing.Generator[dict, None, None]:
+        yield from track_collection["tracks"]["items"]
+        for extended_collection in self.extend_track_collection(track_collection):
+            yield from extended_collection["items"]
+
+    @cached_response("album")
     def get_album(
         self,
         album_id: str,
         extend: bool = True,
     ) -> dict:
-        self._refresh_session_auth()
-        response = self.session.get(
-            self.METADATA_API_URL.format(type="albums", track_id=album_id)
+        response = self._request(
+            "GET", self.METADATA_API_URL.format(type="albums", track_id=album_id)
         )
-        check_response(response)
         album = response.json()
         if extend:
             album["tracks"]["items"].extend(
@@ -203,11 +493,9 @@ class SpotifyApi:
         playlist_id: str,
         extend: bool = True,
     ) -> dict:
-        self._refresh_session_auth()
-        response = self.session.get(
-            self.METADATA_API_URL.format(type="playlists", track_id=playlist_id)
+        response = self._request(
+            "GET", self.METADATA_API_URL.format(type="playlists", track_id=playlist_id)
         )
-        check_response(response)
         playlist = response.json()
         if extend:
             playlist["tracks"]["items"].extend(
@@ -219,9 +507,17 @@ class SpotifyApi:
             )
         return playlist
 
+    def get_playlist_snapshot_id(self, playlist_id: str) -> str:
+        response = self._request(
+            "GET",
+            self.METADATA_API_URL.format(type="playlists", track_id=playlist_id),
+            params={"fields": "snapshot_id"},
+        )
+        return response.json()["snapshot_id"]
+
     def get_now_playing_view(self, track_id: str, artist_id: str) -> dict:
-        self._refresh_session_auth()
-        response = self.session.get(
+        response = self._request(
+            "GET",
             self.PATHFINDER_API_URL,
             params={
                 "operationName": "queryNpvArtist",
@@ -243,20 +539,19 @@ class SpotifyApi:
                 ),
             },
         )
-        check_response(response)
         return response.json()
 
+    @cached_response("track_credits")
     def get_track_credits(self, track_id: str) -> dict:
-        self._refresh_session_auth()
-        response = self.session.get(
-            self.TRACK_CREDITS_API_URL.format(track_id=track_id)
+        response = self._request(
+            "GET", self.TRACK_CREDITS_API_URL.format(track_id=track_id)
         )
-        check_response(response)
         return response.json()
 
     def get_home_page(self) -> str:
-        response = self.session.get(
+        response = self._request(
+            "GET",
             SpotifyApi.SPOTIFY_HOME_PAGE_URL,
+            refresh_session_auth=False,
         )
-        check_response(response)
         return response.text
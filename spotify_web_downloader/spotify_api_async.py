@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import time
+import typing
+from http.cookiejar import MozillaCookieJar
+from pathlib import Path
+
+from .enums import RetryAction
+from .exceptions import NotFoundError
+from .metrics import Metrics
+from .rate_limiter import RateLimiter, get_url_rate_limiter, get_url_rate_limiters
+from .retry_policy import RetryPolicy
+from .spotify_api import SpotifyApi
+from .token_manager import TokenManager
+from .utils import _raise_response_exception
+
+if typing.TYPE_CHECKING:
+    import httpx
+
+
+def check_response(response: httpx.Response):
+    if response.is_error:
+        _raise_response_exception(response)
+
+
+class AsyncSpotifyApi:
+    MAX_CONNECTIONS = 4
+    TIMEOUT = SpotifyApi.TIMEOUT
+
+    track_id_to_gid = staticmethod(SpotifyApi.track_id_to_gid)
+    gid_to_track_id = staticmethod(SpotifyApi.gid_to_track_id)
+    get_request_stage = SpotifyApi.get_request_stage
+    pause_url_rate_limiter = SpotifyApi.pause_url_rate_limiter
+    REQUEST_STAGES = SpotifyApi.REQUEST_STAGES
+
+    def __init__(
+        self,
+        cookies_path: Path | None = Path("./cookies.txt"),
+        max_connections: int = MAX_CONNECTIONS,
+        http2: bool = True,
+        requests_per_second: float = None,
+        metrics: Metrics = None,
+        token_manager: TokenManager = None,
+    ):
+        self.cookies_path = cookies_path
+        self.max_connections = max_connections
+        self.http2 = http2
+        self.requests_per_second = requests_per_second
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.token_manager = token_manager
+        self.session_info = None
+        self.config_info = None
+        self._session_auth_lock = None
+        self.retry_policy = RetryPolicy(
+            SpotifyApi.MAX_RETRIES,
+            SpotifyApi.RETRY_BACKOFF_TIME,
+            SpotifyApi.RETRY_MAX_BACKOFF_TIME,
+            SpotifyApi.RETRY_STATUS_CODES,
+        )
+        self._set_rate_limiters()
+        self._set_session()
+
+    @classmethod
+    def from_spotify_api(
+        cls,
+        spotify_api: SpotifyApi,
+        **kwargs,
+    ) -> AsyncSpotifyApi:
+        async_spotify_api = cls(
+            spotify_api.cookies_path,
+            metrics=spotify_api.metrics,
+            token_manager=spotify_api.token_manager,
+            **kwargs,
+        )
+        async_spotify_api.retry_policy = spotify_api.retry_policy
+        async_spotify_api.rate_limiter = spotify_api.rate_limiter
+        async_spotify_api.url_rate_limiters = spotify_api.url_rate_limiters
+        return async_spotify_api
+
+    def _set_rate_limiters(self):
+        self.rate_limiter = (
+            RateLimiter(self.requests_per_second) if self.requests_per_second else None
+        )
+        self.url_rate_limiters = get_url_rate_limiters(
+            SpotifyApi.RATE_LIMIT_BUDGETS,
+            SpotifyApi.RATE_LIMIT_URL_BUDGETS,
+        )
+
+    def _set_session(self):
+        import httpx
+
+        cookies = None
+        if self.cookies_path:
+            cookies = MozillaCookieJar(self.cookies_path)
+            cookies.load(ignore_discard=True, ignore_expires=True)
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        self.session = httpx.AsyncClient(
+            http2=self.http2,
+            limits=limits,
+            cookies=cookies,
+            headers=SpotifyApi.HEADERS,
+            timeout=None,
+        )
+        self.session_anonymous = httpx.AsyncClient(
+            http2=self.http2,
+            limits=limits,
+            timeout=None,
+        )
+
+    async def __aenter__(self) -> AsyncSpotifyApi:
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self.session.aclose()
+        await self.session_anonymous.aclose()
+
+    async def _set_session_auth(self):
+        home_page = await self.get_home_page()
+        self.session_info, self.config_info = SpotifyApi.parse_home_page(home_page)
+
+    def _is_session_auth_expired(self, expired_access_token: str = None) -> bool:
+        if self.session_info is None:
+            return True
+        if (
+            expired_access_token is not None
+            and self.session_info["accessToken"] == expired_access_token
+        ):
+            return True
+        timestamp_session_expire = int(
+            self.session_info["accessTokenExpirationTimestampMs"]
+        )
+        timestamp_now = time.time() * 1000
+        return timestamp_now >= timestamp_session_expire
+
+    async def _refresh_session_auth(self, expired_access_token: str = None):
+        if not self._is_session_auth_expired(expired_access_token):
+            return
+        if self._session_auth_lock is None:
+            self._session_auth_lock = asyncio.Lock()
+        async with self._session_auth_lock:
+            if self._is_session_auth_expired(expired_access_token):
+                await self._set_session_auth()
+
+    async def _get_access_token(self, expired_access_token: str = None) -> str:
+        if self.token_manager is None:
+            await self._refresh_session_auth(expired_access_token)
+            return self.session_info["accessToken"]
+        loop = asyncio.get_running_loop()
+        if expired_access_token is not None:
+            await loop.run_in_executor(
+                None,
+                functools.partial(
+                    self.token_manager.refresh,
+                    expired_access_token=expired_access_token,
+                ),
+            )
+        return await loop.run_in_executor(None, self.token_manager.get_access_token)
+
+    async def _acquire_rate_limiters(self, url: str) -> None:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async()
+        url_rate_limiter = get_url_rate_limiter(self.url_rate_limiters, url)
+        if url_rate_limiter is not None:
+            await url_rate_limiter.acquire_async()
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        refresh_session_auth: bool = True,
+        session: httpx.AsyncClient = None,
+        **kwargs,
+    ) -> httpx.Response:
+        with self.metrics.measure(self.get_request_stage(url)) as metric_record:
+            response = await self._send_request(
+                method,
+                url,
+                refresh_session_auth,
+                session if session is not None else self.session,
+                **kwargs,
+            )
+            metric_record.bytes = len(response.content)
+        return response
+
+    async def _send_request(
+        self,
+        method: str,
+        url: str,
+        refresh_session_auth: bool,
+        session: httpx.AsyncClient,
+        **kwargs,
+    ) -> httpx.Response:
+        import httpx
+
+        is_access_token_refreshed = False
+        for retry in range(self.retry_policy.max_retries + 1):
+            if refresh_session_auth:
+                access_token = await self._get_access_token()
+                kwargs["headers"] = {
+                    **kwargs.get("headers", {}),
+                    "Authorization": f"Bearer {access_token}",
+                }
+            await self._acquire_rate_limiters(url)
+            try:
+                response = await session.request(
+                    method,
+                    url,
+                    timeout=self.TIMEOUT,
+                    **kwargs,
+                )
+            except httpx.TransportError:
+                retry_action, retry_time = self.retry_policy.get_action(retry)
+                if retry_action == RetryAction.STOP:
+                    raise
+                await asyncio.sleep(retry_time)
+                continue
+            retry_action, retry_time = self.retry_policy.get_action(
+                retry,
+                response.status_code,
+                response.headers,
+                refresh_session_auth and not is_access_token_refreshed,
+            )
+            if retry_action == RetryAction.STOP:
+                break
+            if retry_action == RetryAction.REFRESH_AUTH:
+                await self._get_access_token(access_token)
+                is_access_token_refreshed = True
+                continue
+            if response.status_code == 429:
+                self.pause_url_rate_limiter(url, retry_time)
+            await asyncio.sleep(retry_time)
+        check_response(response)
+        return response
+
+    async def get_gid_metadata(self, gid: str) -> dict:
+        response = await self._request(
+            "GET", SpotifyApi.GID_METADATA_API_URL.format(gid=gid)
+        )
+        return response.json()
+
+    async def get_video_manifest(self, gid: str) -> dict:
+        response = await self._request(
+            "GET", SpotifyApi.VIDEO_MANIFEST_API_URL.format(gid=gid)
+        )
+        return response.json()
+
+    async def get_widevine_license_music(self, challenge: bytes) -> bytes:
+        response = await self._request(
+            "POST",
+            SpotifyApi.WIDEVINE_LICENSE_API_URL.format(type="audio"),
+            content=challenge,
+        )
+        return response.content
+
+    async def get_widevine_license_video(self, challenge: bytes) -> bytes:
+        response = await self._request(
+            "POST",
+            SpotifyApi.WIDEVINE_LICENSE_API_URL.format(type="video"),
+            content=challenge,
+        )
+        return response.content
+
+    async def get_lyrics(self, track_id: str) -> dict | None:
+        try:
+            response = await self._request(
+                "GET",
+                SpotifyApi.LYRICS_API_URL.format(track_id=track_id),
+            )
+        except NotFoundError:
+            return None
+        return response.json()
+
+    async def get_pssh(self, file_id: str) -> str:
+        response = await self._request(
+            "GET",
+            SpotifyApi.PSSH_API_URL.format(file_id=file_id),
+            refresh_session_auth=False,
+            session=self.session_anonymous,
+        )
+        return response.json()["pssh"]
+
+    async def get_stream_url(self, file_id: str) -> str:
+        response = await self._request(
+            "GET", SpotifyApi.STREAM_URL_API_URL.format(file_id=file_id)
+        )
+        return response.json()["cdnurl"][0]
+
+    async def get_track(self, track_id: str) -> dict:
+        response = await self._request(
+            "GET", SpotifyApi.METADATA_API_URL.format(type="tracks", track_id=track_id)
+        )
+        return response.json()
+
+    async def get_track_collection_page(self, url: str) -> dict:
+        response = await self._request("GET", url)
+        return response.json()
+
+    async def extend_track_collection(
+        self,
+        track_collection: dict,
+    ) -> typing.AsyncGenerator[dict, None]:
+        page_tasks = [
+            asyncio.ensure_future(self.get_track_collection_page(page_url))
+            for page_url in SpotifyApi.get_track_collection_page_urls(track_collection)
+        ]
+        try:
+            for page_task in page_tasks:
+                yield await page_task
+        finally:
+            for page_task in page_tasks:
+                page_task.cancel()
+
+    async def get_album(
+        self,
+        album_id: str,
+        extend: bool = True,
+    ) -> dict:
+        response = await self._request(
+            "GET", SpotifyApi.METADATA_API_URL.format(type="albums", track_id=album_id)
+        )
+        album = response.json()
+        if extend:
+            async for extended_collection in self.extend_track_collection(album):
+                album["tracks"]["items"].extend(extended_collection["items"])
+        return album
+
+    async def get_playlist(
+        self,
+        playlist_id: str,
+        extend: bool = True,
+    ) -> dict:
+        response = await self._request(
+            "GET",
+            SpotifyApi.METADATA_API_URL.format(type="playlists", track_id=playlist_id),
+        )
+        playlist = response.json()
+        if extend:
+            async for extended_collection in self.extend_track_collection(playlist):
+                playlist["tracks"]["items"].extend(extended_collection["items"])
+        return playlist
+
+    async def get_now_playing_view(self, track_id: str, artist_id: str) -> dict:
+        response = await self._request(
+            "GET",
+            SpotifyApi.PATHFINDER_API_URL,
+            params={
+                "operationName": "queryNpvArtist",
+                "variables": json.dumps(
+                    {
+                        "artistUri": f"spotify:artist:{artist_id}",
+                        "trackUri": f"spotify:track:{track_id}",
+                        "enableCredits": True,
+                        "enableRelatedVideos": True,
+                    }
+                ),
+                "extensions": json.dumps(
+                    {
+                        "persistedQuery": {
+                            "version": 1,
+                            "sha256Hash": "4ec4ae302c609a517cab6b8868f601cd3457c751c570ab12e988723cc036284f",
+                        }
+                    }
+                ),
+            },
+        )
+        return response.json()
+
+    async def get_track_credits(self, track_id: str) -> dict:
+        response = await self._request(
+            "GET", SpotifyApi.TRACK_CREDITS_API_URL.format(track_id=track_id)
+        )
+        return response.json()
+
+    async def get_home_page(self) -> str:
+        response = await self._request(
+            "GET",
+            SpotifyApi.SPOTIFY_HOME_PAGE_URL,
+            refresh_session_auth=False,
+        )
+        return response.text
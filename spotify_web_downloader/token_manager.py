@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import typing
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class TokenManager:
+    REFRESH_MARGIN = 5 * 60
+    RETRY_INTERVAL = 30
+
+    def __init__(
+        self,
+        get_session_info: typing.Callable[[], tuple[dict, dict]],
+        token_path: Path = None,
+        cookies_digest: str = None,
+    ):
+        self.get_session_info = get_session_info
+        self.token_path = token_path
+        self.cookies_digest = cookies_digest
+        self.session_info = None
+        self.config_info = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self._is_started = False
+        self._load()
+
+    def _load(self):
+        if self.token_path is None or not self.token_path.exists():
+            return
+        try:
+            token = json.loads(self.token_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if token.get("cookies_digest") != self.cookies_digest:
+            return
+        self.session_info = token["session_info"]
+        self.config_info = token["config_info"]
+
+    def _save(self):
+        if self.token_path is None:
+            return
+        self.token_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.token_path.with_name(f"{self.token_path.name}.tmp")
+        file_descriptor = os.open(
+            temp_path,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            0o600,
+        )
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as token_file:
+            json.dump(
+                {
+                    "cookies_digest": self.cookies_digest,
+                    "session_info": self.session_info,
+                    "config_info": self.config_info,
+                },
+                token_file,
+            )
+        os.replace(temp_path, self.token_path)
+
+    def get_expire_timestamp(self) -> float:
+        return int(self.session_info["accessTokenExpirationTimestampMs"]) / 1000
+
+    def is_expired(self, margin: float = 0) -> bool:
+        return (
+            self.session_info is None
+            or time.time() + margin >= self.get_expire_timestamp()
+        )
+
+    def get_access_token(self) -> str:
+        self.start()
+        if self.is_expired():
+            self.refresh()
+        return self.session_info["accessToken"]
+
+    def get_config_info(self) -> dict:
+        self.start()
+        if self.config_info is None:
+            self.refresh()
+        return self.config_info
+
+    def refresh(self, margin: float = 0, expired_access_token: str = None) -> None:
+        with self._lock:
+            if not self.is_expired(margin) and (
+                expired_access_token is None
+                or self.session_info["accessToken"] != expired_access_token
+            ):
+                return
+            self.session_info, self.config_info = self.get_session_info()
+            self._save()
+        self.schedule()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh(self.REFRESH_MARGIN)
+        except Exception:
+            logger.debug("Background token refresh failed", exc_info=True)
+            self.schedule(self.RETRY_INTERVAL)
+
+    def schedule(self, delay: float = None) -> None:
+        if delay is None:
+            delay = max(
+                self.RETRY_INTERVAL,
+                self.get_expire_timestamp() - self.REFRESH_MARGIN - time.time(),
+            )
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._refresh_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._is_started:
+                return
+            self._is_started = True
+        if self.is_expired(self.REFRESH_MARGIN):
+            self.refresh(self.REFRESH_MARGIN)
+        else:
+            self.schedule()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
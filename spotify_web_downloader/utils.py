@@ -2,6 +2,14 @@ from __future__ import annotations
 
 import requests
 
+from .exceptions import (
+    NotFoundError,
+    RateLimitError,
+    ResponseError,
+    ServerError,
+    UnauthorizedError,
+)
+
 
 def check_response(response: requests.Response):
     try:
@@ -11,6 +19,12 @@ def check_response(response: requests.Response):
 
 
 def _raise_response_exception(response: requests.Response):
-    raise Exception(
-        f"Request failed with status code {response.status_code}: {response.text}"
-    )
+    if response.status_code == 401:
+        raise UnauthorizedError(response)
+    if response.status_code == 404:
+        raise NotFoundError(response)
+    if response.status_code == 429:
+        raise RateLimitError(response)
+    if response.status_code >= 500:
+        raise ServerError(response)
+    raise ResponseError(response)
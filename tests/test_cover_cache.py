@@ -0,0 +1,51 @@
+from spotify_web_downloader.cover_cache import CoverCache
+
+
+def get_cover_cache(tmp_path, max_disk_bytes):
+    cover_cache = CoverCache(
+        tmp_path / "covers",
+        max_memory_bytes=0,
+        max_disk_bytes=max_disk_bytes,
+    )
+    cover_cache.download = lambda url: url.encode("utf-8") * 100
+    return cover_cache
+
+
+def test_disk_store_evicts_least_recently_accessed_covers(tmp_path):
+    cover_cache = get_cover_cache(tmp_path, 250)
+    cover_cache.get("a")
+    cover_cache.get("b")
+    cover_cache.get("a")
+    cover_cache.get("c")
+    assert cover_cache.get_path("a") is not None
+    assert cover_cache.get_path("b") is None
+    assert cover_cache.get_path("c") is not None
+    assert sorted(path.name for path in (tmp_path / "covers").rglob("*.jpg")) == sorted(
+        cover_cache.get_content_path(cover_cache.get_path(url).stem).name
+        for url in ("a", "c")
+    )
+
+
+def test_disk_store_keeps_newest_cover_over_limit(tmp_path):
+    cover_cache = get_cover_cache(tmp_path, 50)
+    cover_path = tmp_path / "out" / "Cover.jpg"
+    cover_cache.save(cover_path, "a")
+    assert cover_path.read_bytes() == b"a" * 100
+    assert cover_cache.get_path("a") is not None
+    cover_cache.get("b")
+    assert cover_cache.get_path("a") is None
+    assert cover_path.read_bytes() == b"a" * 100
+
+
+def test_existing_entries_are_sized_on_migration(tmp_path):
+    cover_cache = get_cover_cache(tmp_path, 1000)
+    cover_cache.get("a")
+    cover_cache.connection.execute("UPDATE covers SET size = NULL, accessed = NULL")
+    cover_cache.connection.close()
+    cover_cache = get_cover_cache(tmp_path, 150)
+    assert cover_cache.connection.execute("SELECT size FROM covers").fetchall() == [
+        (100,)
+    ]
+    cover_cache.get("b")
+    assert cover_cache.get_path("a") is None
+    assert cover_cache.get_path("b") is not None
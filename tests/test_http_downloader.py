@@ -0,0 +1,86 @@
+import io
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+from spotify_web_downloader.exceptions import NotFoundError
+from spotify_web_downloader.http_downloader import HttpDownloader
+from spotify_web_downloader.retry_policy import RetryPolicy
+
+URL = "https://audio.example.com/segment"
+
+
+def get_http_downloader(monkeypatch, responses: list) -> HttpDownloader:
+    requests_sent = []
+
+    def send(self, request, **kwargs):
+        requests_sent.append(request)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        status_code, headers, content = response
+        raw = HTTPResponse(
+            io.BytesIO(content),
+            headers={"Content-Length": str(len(content)), **headers},
+            status=status_code,
+            preload_content=False,
+        )
+        return self.build_response(request, raw)
+
+    monkeypatch.setattr(HTTPAdapter, "send", send)
+    http_downloader = HttpDownloader()
+    http_downloader.retry_policy = RetryPolicy(max_retries=3, backoff_time=0)
+    http_downloader.requests_sent = requests_sent
+    return http_downloader
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        requests.ConnectionError(),
+        requests.Timeout(),
+        requests.exceptions.ChunkedEncodingError(),
+        (429, {"Retry-After": "0"}, b""),
+        (503, {}, b""),
+    ],
+)
+def test_get_segment_retries_transient_failures(monkeypatch, failure):
+    http_downloader = get_http_downloader(
+        monkeypatch,
+        [failure, failure, (200, {}, b"segment")],
+    )
+    assert http_downloader.get_segment(URL) == b"segment"
+    assert len(http_downloader.requests_sent) == 3
+
+
+def test_get_segment_does_not_retry_client_errors(monkeypatch):
+    http_downloader = get_http_downloader(monkeypatch, [(404, {}, b"")])
+    with pytest.raises(NotFoundError):
+        http_downloader.get_segment(URL)
+    assert len(http_downloader.requests_sent) == 1
+
+
+def test_get_segment_gives_up_after_max_retries(monkeypatch):
+    http_downloader = get_http_downloader(
+        monkeypatch,
+        [requests.exceptions.ChunkedEncodingError()] * 4,
+    )
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        http_downloader.get_segment(URL)
+    assert len(http_downloader.requests_sent) == 4
+
+
+def test_download_segment_retries_rate_limit(monkeypatch, tmp_path):
+    http_downloader = get_http_downloader(
+        monkeypatch,
+        [(429, {"Retry-After": "0"}, b""), (206, {}, b"0123456789")],
+    )
+    part_path = tmp_path / "track.part0"
+    http_downloader.download_segment(URL, part_path, 10, 19)
+    assert part_path.read_bytes() == b"0123456789"
+    assert [request.headers["Range"] for request in http_downloader.requests_sent] == [
+        "bytes=10-19",
+        "bytes=10-19",
+    ]
@@ -0,0 +1,56 @@
+import sqlite3
+
+from spotify_web_downloader.library_index import LibraryIndex
+
+
+def test_entries_from_other_profiles_are_misses(tmp_path):
+    track_path = tmp_path / "Artist" / "Album" / "01 Track.m4a"
+    track_path.parent.mkdir(parents=True)
+    track_path.touch()
+    library_index_path = tmp_path / "library.db"
+    profile = LibraryIndex.get_profile("{album_artist}/{album}", False)
+    LibraryIndex(library_index_path, profile).add("track_id", "isrc", track_path, True)
+    assert LibraryIndex(library_index_path, profile).get(
+        "track_id", None, tmp_path
+    ) == (track_path.absolute(), True)
+    assert LibraryIndex(library_index_path, profile).get(
+        "other_track_id", "isrc", tmp_path
+    ) == (track_path.absolute(), True)
+    for other_profile in (
+        LibraryIndex.get_profile("{album}", False),
+        LibraryIndex.get_profile("{album_artist}/{album}", True),
+    ):
+        assert (
+            LibraryIndex(library_index_path, other_profile).get(
+                "track_id", "isrc", tmp_path
+            )
+            is None
+        )
+    assert LibraryIndex(library_index_path, profile).get(
+        "track_id", None, tmp_path
+    ) == (track_path.absolute(), True)
+
+
+def test_entries_without_profile_are_misses_after_migration(tmp_path):
+    track_path = tmp_path / "01 Track.m4a"
+    track_path.touch()
+    library_index_path = tmp_path / "library.db"
+    connection = sqlite3.connect(library_index_path)
+    connection.execute(
+        "CREATE TABLE tracks (track_id TEXT PRIMARY KEY, isrc TEXT, path TEXT NOT NULL)"
+    )
+    connection.execute(
+        "INSERT INTO tracks VALUES (?, ?, ?)",
+        ("track_id", "isrc", str(track_path.absolute())),
+    )
+    connection.commit()
+    connection.close()
+    library_index = LibraryIndex(
+        library_index_path, LibraryIndex.get_profile("{title}", False)
+    )
+    assert library_index.get("track_id", "isrc", tmp_path) is None
+    library_index.add("track_id", "isrc", track_path)
+    assert library_index.get("track_id", "isrc", tmp_path) == (
+        track_path.absolute(),
+        None,
+    )
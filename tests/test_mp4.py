@@ -0,0 +1,458 @@
+from __future__ import annotations
+
+import io
+import random
+import struct
+
+import pytest
+
+from spotify_web_downloader.mp4 import (
+    Mp4Box,
+    Mp4Decrypter,
+    get_udta,
+    iter_boxes,
+    parse_boxes,
+    write_decrypted_faststart,
+)
+
+AES = pytest.importorskip("Crypto.Cipher.AES")
+
+
+def get_random_bytes(size: int) -> bytes:
+    return random.getrandbits(size * 8).to_bytes(size, "big")
+
+
+KEY = bytes.fromhex("00112233445566778899aabbccddeeff")
+TIMESCALE = 44100
+SAMPLE_DURATION = 1024
+
+
+def full_box(box_type: bytes, payload: bytes, version: int = 0, flags: int = 0):
+    return Mp4Box(box_type, struct.pack(">I", version << 24 | flags) + payload)
+
+
+def get_esds() -> Mp4Box:
+    decoder_specific_info = b"\x05\x02\x12\x10"
+    decoder_config = (
+        b"\x04"
+        + bytes([13 + len(decoder_specific_info)])
+        + b"\x40\x15\x00\x00\x00"
+        + struct.pack(">II", 128000, 128000)
+        + decoder_specific_info
+    )
+    es_descriptor_body = b"\x00\x01\x00" + decoder_config + b"\x06\x01\x02"
+    return full_box(
+        b"esds",
+        b"\x03" + bytes([len(es_descriptor_body)]) + es_descriptor_body,
+    )
+
+
+def get_moov(is_encrypted: bool, per_sample_iv_size: int) -> Mp4Box:
+    sample_entry_payload = (
+        bytes(6)
+        + struct.pack(">H", 1)
+        + bytes(8)
+        + struct.pack(">HHHHI", 2, 16, 0, 0, TIMESCALE << 16)
+    )
+    sample_entry_children = [get_esds()]
+    sample_entry_type = b"mp4a"
+    if is_encrypted:
+        sample_entry_type = b"enca"
+        sample_entry_children.append(
+            Mp4Box(
+                b"sinf",
+                children=[
+                    Mp4Box(b"frma", b"mp4a"),
+                    full_box(b"schm", struct.pack(">4sI", b"cenc", 0x10000)),
+                    Mp4Box(
+                        b"schi",
+                        children=[
+                            full_box(
+                                b"tenc",
+                                struct.pack(">BBBB", 0, 0, 1, per_sample_iv_size)
+                                + bytes(16),
+                            )
+                        ],
+                    ),
+                ],
+            )
+        )
+    empty_table = struct.pack(">I", 0)
+    return Mp4Box(
+        b"moov",
+        children=[
+            full_box(
+                b"mvhd",
+                struct.pack(">IIII", 0, 0, 1000, 0) + bytes(76) + struct.pack(">I", 2),
+            ),
+            Mp4Box(
+                b"trak",
+                children=[
+                    full_box(
+                        b"tkhd",
+                        struct.pack(">IIIII", 0, 0, 1, 0, 0) + bytes(60),
+                        flags=3,
+                    ),
+                    Mp4Box(
+                        b"mdia",
+                        children=[
+                            full_box(
+                                b"mdhd",
+                                struct.pack(">IIIIHH", 0, 0, TIMESCALE, 0, 0x55C4, 0),
+                            ),
+                            full_box(
+                                b"hdlr",
+                                struct.pack(">I4s", 0, b"soun") + bytes(12) + b"\x00",
+                            ),
+                            Mp4Box(
+                                b"minf",
+                                children=[
+                                    full_box(b"smhd", bytes(4)),
+                                    Mp4Box(
+                                        b"dinf",
+                                        children=[
+                                            full_box(
+                                                b"dref",
+                                                struct.pack(">I", 1)
+                                                + full_box(
+                                                    b"url ", b"", flags=1
+                                                ).render(),
+                                            )
+                                        ],
+                                    ),
+                                    Mp4Box(
+                                        b"stbl",
+                                        children=[
+                                            Mp4Box(
+                                                b"stsd",
+                                                struct.pack(">II", 0, 1),
+                                                [
+                                                    Mp4Box(
+                                                        sample_entry_type,
+                                                        sample_entry_payload,
+                                                        sample_entry_children,
+                                                    )
+                                                ],
+                                            ),
+                                            full_box(b"stts", empty_table),
+                                            full_box(b"stsc", empty_table),
+                                            full_box(b"stsz", bytes(4) + empty_table),
+                                            full_box(b"stco", empty_table),
+                                        ],
+                                    ),
+                                ],
+                            ),
+                        ],
+                    ),
+                ],
+            ),
+            Mp4Box(
+                b"mvex",
+                children=[
+                    full_box(
+                        b"trex", struct.pack(">IIIII", 1, 1, SAMPLE_DURATION, 0, 0)
+                    )
+                ],
+            ),
+        ],
+    )
+
+
+def encrypt_sample(
+    sample: bytes,
+    iv: bytes,
+    subsamples: list[tuple[int, int]],
+) -> bytes:
+    cipher = AES.new(KEY, AES.MODE_CTR, nonce=b"", initial_value=iv.ljust(16, b"\x00"))
+    if not subsamples:
+        return cipher.encrypt(sample)
+    encrypted_sample = b""
+    offset = 0
+    for clear_size, protected_size in subsamples:
+        encrypted_sample += sample[offset : offset + clear_size]
+        offset += clear_size
+        encrypted_sample += cipher.encrypt(sample[offset : offset + protected_size])
+        offset += protected_size
+    return encrypted_sample
+
+
+def get_fragment(
+    sequence_number: int,
+    samples: list[bytes],
+    is_encrypted: bool,
+    per_sample_iv_size: int,
+    use_subsamples: bool,
+    use_saio: bool,
+) -> bytes:
+    ivs = [get_random_bytes(per_sample_iv_size) for _ in samples]
+    sample_subsamples = [
+        (
+            [(min(5, len(sample)), len(sample) - min(5, len(sample)))]
+            if use_subsamples
+            else []
+        )
+        for sample in samples
+    ]
+    mdat_payload = b"".join(
+        (encrypt_sample(sample, iv, subsamples) if is_encrypted else sample)
+        for sample, iv, subsamples in zip(samples, ivs, sample_subsamples)
+    )
+    sample_encryption = b"".join(
+        iv
+        + (
+            struct.pack(">H", len(subsamples))
+            + b"".join(struct.pack(">HI", *subsample) for subsample in subsamples)
+            if use_subsamples
+            else b""
+        )
+        for iv, subsamples in zip(ivs, sample_subsamples)
+    )
+
+    def get_moof(data_offset: int, aux_info_offset: int) -> Mp4Box:
+        traf_children = [
+            full_box(b"tfhd", struct.pack(">I", 1), flags=0x20000),
+            full_box(b"tfdt", struct.pack(">I", 0)),
+            full_box(
+                b"trun",
+                struct.pack(">Ii", len(samples), data_offset)
+                + b"".join(
+                    struct.pack(">II", SAMPLE_DURATION, len(sample))
+                    for sample in samples
+                ),
+                flags=0x301,
+            ),
+        ]
+        if is_encrypted and use_saio:
+            sample_info_size = len(sample_encryption) // len(samples)
+            traf_children += [
+                full_box(
+                    b"saiz",
+                    struct.pack(">BI", sample_info_size, len(samples)),
+                ),
+                full_box(b"saio", struct.pack(">II", 1, aux_info_offset)),
+                Mp4Box(b"free", sample_encryption),
+            ]
+        elif is_encrypted:
+            traf_children.append(
+                full_box(
+                    b"senc",
+                    struct.pack(">I", len(samples)) + sample_encryption,
+                    flags=0x2 if use_subsamples else 0,
+                )
+            )
+        return Mp4Box(
+            b"moof",
+            children=[
+                full_box(b"mfhd", struct.pack(">I", sequence_number)),
+                Mp4Box(b"traf", children=traf_children),
+            ],
+        )
+
+    moof = get_moof(0, 0).render()
+    aux_info_offset = moof.find(sample_encryption) if sample_encryption else 0
+    moof = get_moof(len(moof) + 8, aux_info_offset).render()
+    return moof + Mp4Box(b"mdat", mdat_payload).render()
+
+
+def get_fragmented_mp4(
+    fragments: list[list[bytes]],
+    is_encrypted: bool = True,
+    per_sample_iv_size: int = 8,
+    use_subsamples: bool = False,
+    use_saio: bool = False,
+) -> bytes:
+    moov = get_moov(is_encrypted, per_sample_iv_size)
+    return (
+        Mp4Box(b"ftyp", b"iso6\x00\x00\x00\x00iso6dash").render()
+        + moov.render()
+        + b"".join(
+            get_fragment(
+                sequence_number,
+                samples,
+                is_encrypted,
+                per_sample_iv_size,
+                use_subsamples,
+                use_saio,
+            )
+            for sequence_number, samples in enumerate(fragments, start=1)
+        )
+    )
+
+
+def get_fragments(fragment_count: int = 3, samples_per_fragment: int = 4):
+    return [
+        [get_random_bytes(random.randint(20, 400)) for _ in range(samples_per_fragment)]
+        for _ in range(fragment_count)
+    ]
+
+
+def get_top_level_boxes(data: bytes) -> dict[bytes, Mp4Box]:
+    return {box.type: box for box in parse_boxes(data, 0, len(data))}
+
+
+def get_table_entries(box: Mp4Box, entry_format: str, offset: int = 4) -> list:
+    (entry_count,) = struct.unpack_from(">I", box.payload, offset)
+    entry_size = struct.calcsize(entry_format)
+    return [
+        struct.unpack_from(entry_format, box.payload, offset + 4 + index * entry_size)
+        for index in range(entry_count)
+    ]
+
+
+def read_faststart_samples(data: bytes) -> list[bytes]:
+    stbl = get_top_level_boxes(data)[b"moov"].find_path(
+        b"trak", b"mdia", b"minf", b"stbl"
+    )
+    chunk_offsets = [
+        offset for (offset,) in get_table_entries(stbl.find(b"stco"), ">I")
+    ]
+    stsc_entries = get_table_entries(stbl.find(b"stsc"), ">III")
+    sample_sizes = [size for (size,) in get_table_entries(stbl.find(b"stsz"), ">I", 8)]
+    samples = []
+    for chunk_index, chunk_offset in enumerate(chunk_offsets, start=1):
+        samples_per_chunk = next(
+            samples_per_chunk
+            for first_chunk, samples_per_chunk, _ in reversed(stsc_entries)
+            if first_chunk <= chunk_index
+        )
+        for _ in range(samples_per_chunk):
+            sample_size = sample_sizes[len(samples)]
+            samples.append(data[chunk_offset : chunk_offset + sample_size])
+            chunk_offset += sample_size
+    return samples
+
+
+@pytest.fixture(autouse=True)
+def seed_random():
+    random.seed(0)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"per_sample_iv_size": 16},
+        {"use_subsamples": True},
+        {"use_saio": True},
+        {"use_saio": True, "use_subsamples": True},
+        {"is_encrypted": False},
+    ],
+)
+def test_fragmented_to_faststart_round_trip(options):
+    fragments = get_fragments()
+    output = io.BytesIO()
+    write_decrypted_faststart(get_fragmented_mp4(fragments, **options), output, KEY)
+    data = output.getvalue()
+    assert [box_type for box_type, *_ in iter_boxes(data)] == [
+        b"ftyp",
+        b"moov",
+        b"mdat",
+    ]
+    assert read_faststart_samples(data) == [
+        sample for samples in fragments for sample in samples
+    ]
+    moov = get_top_level_boxes(data)[b"moov"]
+    assert moov.find(b"mvex") is None
+    stbl = moov.find_path(b"trak", b"mdia", b"minf", b"stbl")
+    sample_entry = stbl.find(b"stsd").children[0]
+    assert sample_entry.type == b"mp4a"
+    assert sample_entry.find(b"sinf") is None
+    assert get_table_entries(stbl.find(b"stts"), ">II") == [(12, SAMPLE_DURATION)]
+    (duration,) = struct.unpack_from(">I", moov.find(b"mvhd").payload, 16)
+    assert duration == 12 * SAMPLE_DURATION * 1000 // TIMESCALE
+
+
+def test_feeding_in_chunks_matches_single_feed():
+    data = get_fragmented_mp4(get_fragments(), use_subsamples=True)
+    expected_output = io.BytesIO()
+    write_decrypted_faststart(data, expected_output, KEY)
+    for chunk_size in (1, 7, 100, 4096):
+        mp4_decrypter = Mp4Decrypter(KEY)
+        for offset in range(0, len(data), chunk_size):
+            mp4_decrypter.feed(data[offset : offset + chunk_size])
+        output = io.BytesIO()
+        mp4_decrypter.write_faststart(output)
+        assert output.getvalue() == expected_output.getvalue()
+
+
+def test_streamed_output_round_trips_with_moov_at_end(tmp_path):
+    mutagen_mp4 = pytest.importorskip("mutagen.mp4")
+    fragments = get_fragments()
+    data = get_fragmented_mp4(fragments, use_subsamples=True)
+    path = tmp_path / "streamed.m4a"
+    with path.open("wb") as output:
+        mp4_decrypter = Mp4Decrypter(KEY, output)
+        for offset in range(0, len(data), 100):
+            mp4_decrypter.feed(data[offset : offset + 100])
+        assert mp4_decrypter.chunks_data == []
+        mp4_decrypter.write_moov(get_udta({"\xa9nam": ["Title"]}))
+    streamed_data = path.read_bytes()
+    boxes = list(iter_boxes(streamed_data))
+    assert [box_type for box_type, *_ in boxes] == [b"ftyp", b"mdat", b"moov"]
+    assert boxes[1][2:] == (
+        16,
+        16 + sum(len(sample) for samples in fragments for sample in samples),
+    )
+    assert read_faststart_samples(streamed_data) == [
+        sample for samples in fragments for sample in samples
+    ]
+    assert mutagen_mp4.MP4(path).tags["\xa9nam"] == ["Title"]
+
+
+def test_truncated_input_is_rejected():
+    data = get_fragmented_mp4(get_fragments())
+    mp4_decrypter = Mp4Decrypter(KEY)
+    mp4_decrypter.feed(data[:-10])
+    with pytest.raises(ValueError, match="truncated"):
+        mp4_decrypter.write_faststart(io.BytesIO())
+    mp4_decrypter = Mp4Decrypter(KEY, io.BytesIO())
+    mp4_decrypter.feed(data[:-10])
+    with pytest.raises(ValueError, match="truncated"):
+        mp4_decrypter.write_moov()
+
+
+def test_wrong_key_does_not_round_trip():
+    fragments = get_fragments()
+    output = io.BytesIO()
+    write_decrypted_faststart(get_fragmented_mp4(fragments), output, bytes(16))
+    assert read_faststart_samples(output.getvalue()) != [
+        sample for samples in fragments for sample in samples
+    ]
+
+
+def test_udta_tags_are_readable(tmp_path):
+    mutagen_mp4 = pytest.importorskip("mutagen.mp4")
+    cover = b"\xff\xd8\xff\xe0" + get_random_bytes(64)
+    tags = {
+        "\xa9nam": ["Title é"],
+        "\xa9ART": ["Artist"],
+        "\xa9lyr": ["line 1\nline 2"],
+        "trkn": [(3, 12)],
+        "disk": [(1, 2)],
+        "cpil": False,
+        "rtng": [1],
+        "----:com.apple.iTunes:ISRC": [mutagen_mp4.MP4FreeForm(b"USABC1234567")],
+        "covr": [
+            mutagen_mp4.MP4Cover(cover, imageformat=mutagen_mp4.MP4Cover.FORMAT_JPEG)
+        ],
+    }
+    path = tmp_path / "tagged.m4a"
+    with path.open("wb") as output:
+        write_decrypted_faststart(
+            get_fragmented_mp4(get_fragments()),
+            output,
+            KEY,
+            get_udta(tags),
+        )
+    mp4 = mutagen_mp4.MP4(path)
+    assert mp4.tags["\xa9nam"] == ["Title é"]
+    assert mp4.tags["\xa9ART"] == ["Artist"]
+    assert mp4.tags["\xa9lyr"] == ["line 1\nline 2"]
+    assert mp4.tags["trkn"] == [(3, 12)]
+    assert mp4.tags["disk"] == [(1, 2)]
+    assert mp4.tags["cpil"] is False
+    assert mp4.tags["rtng"] == [1]
+    assert bytes(mp4.tags["----:com.apple.iTunes:ISRC"][0]) == b"USABC1234567"
+    assert bytes(mp4.tags["covr"][0]) == cover
+    assert mp4.tags["covr"][0].imageformat == mutagen_mp4.MP4Cover.FORMAT_JPEG
+    assert mp4.info.length == pytest.approx(12 * SAMPLE_DURATION / TIMESCALE)
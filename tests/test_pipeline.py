@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from spotify_web_downloader.pipeline import Pipeline, PipelineStage
+
+
+def test_items_pass_through_every_stage():
+    finished = []
+    errors = []
+    pipeline = Pipeline(
+        [
+            PipelineStage(lambda item: item * 2, 2),
+            PipelineStage(
+                lambda items: [
+                    ValueError(item) if item == 6 else item + 1 for item in items
+                ],
+                2,
+                batch_size=4,
+            ),
+            PipelineStage(lambda item: item, 2),
+        ],
+        on_error=lambda item, e: errors.append(item),
+        on_finish=finished.append,
+    )
+    pipeline.run(range(10))
+    assert errors == [6]
+    assert sorted(finished) == [1, 3, 5, 6, 9, 11, 13, 15, 17, 19]
+
+
+def test_interrupt_stops_without_draining_queued_items():
+    started = []
+    lock = threading.Lock()
+
+    def process(item):
+        with lock:
+            started.append(item)
+        time.sleep(0.05)
+        return item
+
+    def get_items():
+        yield from range(8)
+        while len(started) < 1:
+            time.sleep(0.01)
+        raise KeyboardInterrupt
+
+    pipeline = Pipeline(
+        [
+            PipelineStage(process, 1, queue_size=8),
+            PipelineStage(process, 1, queue_size=8),
+        ]
+    )
+    start_time = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.run(get_items())
+    assert time.monotonic() - start_time < 0.5
+    assert len(started) < 4
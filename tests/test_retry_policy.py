@@ -0,0 +1,43 @@
+from spotify_web_downloader.enums import RetryAction
+from spotify_web_downloader.retry_policy import RetryPolicy
+
+
+def test_transport_error_retries_until_max_retries():
+    retry_policy = RetryPolicy(max_retries=2, backoff_time=1)
+    assert retry_policy.get_action(0)[0] == RetryAction.RETRY
+    assert retry_policy.get_action(1)[0] == RetryAction.RETRY
+    assert retry_policy.get_action(2) == (RetryAction.STOP, 0.0)
+
+
+def test_backoff_time_is_jittered_and_capped():
+    retry_policy = RetryPolicy(backoff_time=1, max_backoff_time=4)
+    for retry in range(10):
+        backoff_time = retry_policy.get_backoff_time(retry)
+        cap = min(4, 2**retry)
+        assert cap / 2 <= backoff_time <= cap
+
+
+def test_unauthorized_refreshes_auth_only_when_allowed():
+    retry_policy = RetryPolicy()
+    assert retry_policy.get_action(0, 401, {}, True) == (RetryAction.REFRESH_AUTH, 0.0)
+    assert retry_policy.get_action(0, 401, {}, False) == (RetryAction.STOP, 0.0)
+
+
+def test_retry_status_codes_honour_retry_after():
+    retry_policy = RetryPolicy(max_retries=3)
+    assert retry_policy.get_action(0, 429, {"Retry-After": "7"}) == (
+        RetryAction.RETRY,
+        7.0,
+    )
+    assert retry_policy.get_action(3, 503, {}) == (RetryAction.STOP, 0.0)
+    assert retry_policy.get_action(0, 404, {}) == (RetryAction.STOP, 0.0)
+
+
+def test_get_retry_after_parses_http_dates():
+    assert RetryPolicy.get_retry_after({}) is None
+    assert RetryPolicy.get_retry_after({"Retry-After": "-3"}) == 0.0
+    assert RetryPolicy.get_retry_after({"Retry-After": "invalid"}) is None
+    assert (
+        RetryPolicy.get_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        == 0.0
+    )
@@ -0,0 +1,186 @@
+import asyncio
+import time
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from spotify_web_downloader.exceptions import NotFoundError, UnauthorizedError
+from spotify_web_downloader.rate_limiter import RateLimiter
+from spotify_web_downloader.retry_policy import RetryPolicy
+from spotify_web_downloader.spotify_api import SpotifyApi
+
+GID = "0" * 32
+
+
+class FakeTokenManager:
+    def __init__(self):
+        self.access_token = "token-1"
+        self.refresh_count = 0
+
+    def get_access_token(self) -> str:
+        return self.access_token
+
+    def refresh(self, expired_access_token: str = None) -> None:
+        if expired_access_token == self.access_token:
+            self.refresh_count += 1
+            self.access_token = f"token-{self.refresh_count + 1}"
+
+
+def get_spotify_api(monkeypatch, responses: list) -> SpotifyApi:
+    requests_sent = []
+
+    def send(self, request, **kwargs):
+        requests_sent.append(request)
+        status_code, headers = responses.pop(0)
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers.update(headers)
+        response._content = b'{"name": "track"}'
+        response.url = request.url
+        response.request = request
+        return response
+
+    monkeypatch.setattr(HTTPAdapter, "send", send)
+    spotify_api = SpotifyApi(cookies_path=None)
+    spotify_api.token_manager = FakeTokenManager()
+    spotify_api.retry_policy = RetryPolicy(max_retries=3, backoff_time=0)
+    spotify_api.requests_sent = requests_sent
+    return spotify_api
+
+
+def test_sync_refreshes_token_once_on_unauthorized(monkeypatch):
+    spotify_api = get_spotify_api(monkeypatch, [(401, {}), (200, {})])
+    assert spotify_api.get_video_manifest(GID) == {"name": "track"}
+    assert spotify_api.token_manager.refresh_count == 1
+    assert [
+        request.headers["Authorization"] for request in spotify_api.requests_sent
+    ] == ["Bearer token-1", "Bearer token-2"]
+
+
+def test_sync_pauses_host_budget_on_rate_limit(monkeypatch):
+    spotify_api = get_spotify_api(
+        monkeypatch,
+        [(429, {"Retry-After": "0.2"}), (200, {})],
+    )
+    start_time = time.monotonic()
+    spotify_api.get_video_manifest(GID)
+    assert time.monotonic() - start_time >= 0.2
+    rate_limiter = spotify_api.url_rate_limiters["https://gue1-spclient.spotify.com/"]
+    assert rate_limiter._pause_timestamp > 0
+
+
+def test_sync_raises_typed_errors(monkeypatch):
+    spotify_api = get_spotify_api(monkeypatch, [(404, {}), (401, {}), (401, {})])
+    with pytest.raises(NotFoundError):
+        spotify_api.get_video_manifest(GID)
+    with pytest.raises(UnauthorizedError):
+        spotify_api.get_video_manifest(GID)
+
+
+def get_async_spotify_api(handler):
+    httpx = pytest.importorskip("httpx")
+    from spotify_web_downloader.spotify_api_async import AsyncSpotifyApi
+
+    async_spotify_api = AsyncSpotifyApi(
+        cookies_path=None,
+        http2=False,
+        token_manager=FakeTokenManager(),
+    )
+    async_spotify_api.retry_policy = RetryPolicy(max_retries=3, backoff_time=0)
+    async_spotify_api.session = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    )
+    return async_spotify_api
+
+
+def test_async_shares_retry_policy_and_token_refresh():
+    httpx = pytest.importorskip("httpx")
+    requests_sent = []
+
+    def handler(request):
+        requests_sent.append(request)
+        if len(requests_sent) == 1:
+            raise httpx.ConnectError("connection reset", request=request)
+        if len(requests_sent) == 2:
+            return httpx.Response(401)
+        if len(requests_sent) == 3:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"name": "track"})
+
+    async def run():
+        async with get_async_spotify_api(handler) as async_spotify_api:
+            return (
+                await async_spotify_api.get_gid_metadata(GID),
+                async_spotify_api.token_manager.refresh_count,
+            )
+
+    assert asyncio.run(run()) == ({"name": "track"}, 1)
+    assert [request.headers["Authorization"] for request in requests_sent] == [
+        "Bearer token-1",
+        "Bearer token-1",
+        "Bearer token-2",
+        "Bearer token-2",
+    ]
+
+
+def test_async_applies_host_budgets():
+    httpx = pytest.importorskip("httpx")
+
+    def handler(request):
+        return httpx.Response(200, json={})
+
+    async def run():
+        async with get_async_spotify_api(handler) as async_spotify_api:
+            async_spotify_api.url_rate_limiters = {
+                "https://spclient.wg.spotify.com/": RateLimiter(20, 1)
+            }
+            start_time = time.monotonic()
+            await asyncio.gather(
+                *(async_spotify_api.get_gid_metadata(GID) for _ in range(5))
+            )
+            return time.monotonic() - start_time
+
+    assert asyncio.run(run()) >= 0.18
+
+
+def test_async_lyrics_not_found_returns_none():
+    httpx = pytest.importorskip("httpx")
+
+    async def run():
+        async with get_async_spotify_api(
+            lambda request: httpx.Response(404)
+        ) as async_spotify_api:
+            return await async_spotify_api.get_lyrics("0" * 22)
+
+    assert asyncio.run(run()) is None
+
+
+def test_prefetch_gid_metadata_fills_response_cache(monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    from spotify_web_downloader.spotify_api_async import AsyncSpotifyApi
+
+    requests_sent = []
+
+    def handler(request):
+        requests_sent.append(request)
+        return httpx.Response(200, json={"gid": request.url.path.split("/")[-1]})
+
+    def set_session(self):
+        self.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.session_anonymous = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+
+    monkeypatch.setattr(AsyncSpotifyApi, "_set_session", set_session)
+    spotify_api = SpotifyApi(cookies_path=None)
+    spotify_api.token_manager = FakeTokenManager()
+    spotify_api.prefetch_gid_metadata([GID, GID])
+    spotify_api.prefetch_gid_metadata([GID])
+    assert len(requests_sent) == 1
+    monkeypatch.setattr(
+        SpotifyApi,
+        "_request",
+        lambda *args, **kwargs: pytest.fail("GID metadata was not prefetched"),
+    )
+    assert spotify_api.get_gid_metadata(GID) == {"gid": GID}